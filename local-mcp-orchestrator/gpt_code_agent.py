@@ -2,14 +2,16 @@
 from __future__ import annotations
 
 import os
+import sys
 import json
-from typing import Any, Optional
+from typing import Any, Dict, Iterator, Optional
 import argparse
 
-from tools import web_search_run, code_exec_run, tests_run, plan_patch_run, apply_patch_run, ripgrep_search, lsp_python_pyright, impact_scan_run
+from tools import web_search_run, code_exec_run, py_session_run, tests_run, jobs_run, plan_patch_run, apply_patch_run, plan_edits_run, ripgrep_search, lsp_python_pyright, lsp_tiered_check, impact_scan_run
 from tools.fs_ops import read_file, write_file, append_file, delete_path, list_dir, make_dirs
 from tools.shell_exec import run as shell_run
 from tools.gemini_cli import run as gemini_run
+from tools.index.imports import dependents_report
 from utils.mcp_client import ask_via_mcp
 
 
@@ -17,6 +19,8 @@ MODEL_PATH = \
     "/Users/saiteku/.lmstudio/models/lmstudio-community/gpt-oss-20b-GGUF/gpt-oss-20b-MXFP4.gguf"
 
 _NATIVE_LLAMA = None  # cache for direct chat
+# largest file the fallback `edit` command sends to the model (prompt and diff share n_ctx=4096)
+EDIT_MAX_CHARS = 8000
 
 
 def _try_build_langchain_agent() -> Optional[Any]:
@@ -63,6 +67,9 @@ def _try_build_langchain_agent() -> Optional[Any]:
     def t_pyexec(input: str) -> str:
         return code_exec_run(input, timeout=12)
 
+    def t_pysession(input: str) -> str:
+        return py_session_run(input, timeout=30)
+
     def t_fs_read(input: str) -> str:
         return read_file(input)
 
@@ -99,27 +106,97 @@ def _try_build_langchain_agent() -> Optional[Any]:
         return shell_run(input, timeout=20)
 
     def t_tests(input: str) -> str:
-        kind = (input or "auto").strip() or "auto"
-        return tests_run(kind, timeout=90)
+        text = (input or "").strip()
+        if text.startswith("{"):
+            try:
+                args = json.loads(text)
+            except json.JSONDecodeError as e:
+                return json.dumps({"error": f"invalid JSON: {e}"})
+            return tests_run(args.get("kind", "auto"), timeout=90, mode=args.get("mode", "affected"),
+                             resident=args.get("resident"))
+        if text in {"affected", "full"}:
+            return tests_run("auto", timeout=90, mode=text)
+        return tests_run(text or "auto", timeout=90)
+
+    def t_job_start(input: str) -> str:
+        return jobs_run("start", input)
+
+    def t_job_poll(input: str) -> str:
+        return jobs_run("poll", input)
+
+    def t_job_tail(input: str) -> str:
+        return jobs_run("tail", input)
+
+    def t_job_wait(input: str) -> str:
+        return jobs_run("wait", input)
+
+    def t_job_cancel(input: str) -> str:
+        return jobs_run("cancel", input)
 
     def t_plan_patch(input: str) -> str:
         return plan_patch_run(input)
 
+    def t_plan_edits(input: str) -> str:
+        return plan_edits_run(input)
+
     def t_apply_patch(input: str) -> str:
         return apply_patch_run(input)
 
     def t_rg(input: str) -> str:
         import json as _json
-        return _json.dumps(ripgrep_search(input), ensure_ascii=False)
+        text = (input or "").strip()
+        if text.startswith("{"):
+            # JSON form: {query?, limit?, cursor?} to page through truncated results
+            try:
+                obj = _json.loads(text)
+            except Exception as e:
+                return f"[Search.Ripgrep] bad input: {e}"
+            res = ripgrep_search(obj.get("query") or "", limit=int(obj.get("limit", 200) or 200), cursor=obj.get("cursor"))
+        else:
+            res = ripgrep_search(text)
+        return _json.dumps(res, ensure_ascii=False)
+
+    def t_impact(input: str) -> str:
+        # Accept a JSON payload or a bare query; default to the compact format
+        text = (input or "").strip()
+        payload: dict = {}
+        if text.startswith("{"):
+            try:
+                payload = json.loads(text)
+            except Exception as e:
+                return f"[Impact.Scan] bad input: {e}"
+        else:
+            payload = {"query": text}
+        payload.setdefault("format", "compact")
+        return impact_scan_run(json.dumps(payload))
+
+    def t_deps(input: str) -> str:
+        return json.dumps(dependents_report((input or "").strip()), ensure_ascii=False)
 
     def t_pyright(input: str) -> str:
         import json as _json
         root = (input or ".").strip() or "."
         return _json.dumps(lsp_python_pyright(root), ensure_ascii=False)
 
+    def t_check(input: str) -> str:
+        import json as _json
+        text = (input or "").strip()
+        if text.startswith("{"):
+            try:
+                obj = _json.loads(text)
+            except Exception as e:
+                return f"[LSP.Check] bad input: {e}"
+            paths = obj.get("paths")
+            mode = obj.get("pyright") or "auto"
+        else:
+            paths = [p for p in text.replace(",", " ").split() if p] or None
+            mode = "auto"
+        return _json.dumps(lsp_tiered_check(paths, pyright=mode), ensure_ascii=False)
+
     tools: list[Tool] = []
     tools.append(StructuredTool.from_function(func=t_websearch, name="WebSearch", description="Search the web for up-to-date info. Input: query string.", args_schema=StrInput))
     tools.append(StructuredTool.from_function(func=t_pyexec, name="PyExec", description="Execute short Python code and return output. Input: code string.", args_schema=StrInput))
+    tools.append(StructuredTool.from_function(func=t_pysession, name="PyExec.Session", description="Run Python in a named persistent session whose variables/imports survive between calls (REPL-style: a trailing expression is printed). Input: code string (session 'default') or JSON {code, session?, timeout?, mem_mb?} / {action: reset|close|interrupt|list, session?}. A timeout interrupts the call but keeps the state.", args_schema=StrInput))
     tools.append(StructuredTool.from_function(func=t_fs_read, name="FS.Read", description="Read a text file. Input: relative path from project root as string.", args_schema=StrInput))
     tools.append(StructuredTool.from_function(func=t_fs_write, name="FS.Write", description="Write/overwrite a text file. Input: JSON string {path, content}.", args_schema=StrInput))
     tools.append(StructuredTool.from_function(func=t_fs_append, name="FS.Append", description="Append text to a file. Input: JSON string {path, content}.", args_schema=StrInput))
@@ -127,11 +204,20 @@ def _try_build_langchain_agent() -> Optional[Any]:
     tools.append(StructuredTool.from_function(func=t_fs_list, name="FS.List", description="List files in a directory. Input: path string or '.'", args_schema=StrInput))
     tools.append(StructuredTool.from_function(func=t_fs_mkdir, name="FS.Mkdir", description="Create directories (parents ok). Input: path string.", args_schema=StrInput))
     tools.append(StructuredTool.from_function(func=t_shell, name="Shell", description="Run a shell command in the project root. Input: full command string.", args_schema=StrInput))
-    tools.append(StructuredTool.from_function(func=t_tests, name="Tests.Run", description="Run tests: input 'auto'|'pytest'|'unittest' (default auto).", args_schema=StrInput))
-    tools.append(StructuredTool.from_function(func=t_plan_patch, name="Edit.PlanPatch", description="Plan a patch as unified diff. Input JSON: {path, new_content, context?}" , args_schema=StrInput))
-    tools.append(StructuredTool.from_function(func=t_apply_patch, name="Edit.ApplyPatch", description="Apply a unified diff to the workspace. Input: diff text.", args_schema=StrInput))
-    tools.append(StructuredTool.from_function(func=t_rg, name="Search.Ripgrep", description="Search code via ripgrep. Input: query string.", args_schema=StrInput))
+    tools.append(StructuredTool.from_function(func=t_tests, name="Tests.Run", description="Run tests affected by changes since the last green run (falls back to the full suite when unsure). Input: 'auto'|'pytest'|'unittest', 'full' to run everything, or JSON {kind?, mode?: affected|full, resident?: bool}. Output: counts, per-test failures with traceback excerpts, slowest tests, and a selection report (changed files, selected and skipped tests); previously failing tests run first. Affected unittest runs reuse a warm process that reloads only changed modules.", args_schema=StrInput))
+    tools.append(StructuredTool.from_function(func=t_job_start, name="Jobs.Start", description="Start a long command or the test suite in the background and return its job id at once (keep working meanwhile). Input: command string, or JSON {cmd} / {tests: auto|pytest|unittest}, optional timeout (s, default 1800).", args_schema=StrInput))
+    tools.append(StructuredTool.from_function(func=t_job_poll, name="Jobs.Poll", description="Status of a background job (with output / test summary once finished). Input: job id, or empty to list all jobs.", args_schema=StrInput))
+    tools.append(StructuredTool.from_function(func=t_job_tail, name="Jobs.Tail", description="Last lines of a background job's output, also while it runs. Input: job id or JSON {id, lines?=50}.", args_schema=StrInput))
+    tools.append(StructuredTool.from_function(func=t_job_wait, name="Jobs.Wait", description="Wait for a background job to finish and return its result. Input: job id or JSON {id, timeout?=60}; the job keeps running if the wait times out.", args_schema=StrInput))
+    tools.append(StructuredTool.from_function(func=t_job_cancel, name="Jobs.Cancel", description="Cancel a background job (kills its process group). Input: job id.", args_schema=StrInput))
+    tools.append(StructuredTool.from_function(func=t_plan_patch, name="Edit.PlanPatch", description="Plan a patch as unified diff. Input JSON: {path, new_content, context?}, or {files: [{path, new_content}, ...]} to plan several files at once (returns one diff + base_hashes for Edit.ApplyPatch)." , args_schema=StrInput))
+    tools.append(StructuredTool.from_function(func=t_plan_edits, name="Edit.PlanEdits", description="Plan a patch from small edits instead of the whole file (same output as Edit.PlanPatch). Input JSON: {path, edits: [{op: replace_lines, start, end, text} | {op: search_replace, search, replace, all?} | {op: insert_after, anchor|line, text}], context?}. Line numbers refer to the current file.", args_schema=StrInput))
+    tools.append(StructuredTool.from_function(func=t_apply_patch, name="Edit.ApplyPatch", description="Apply a unified diff (one or more files, all-or-nothing) to the workspace. Input: diff text or JSON {diff, base_hash?, path?, base_hashes?}.", args_schema=StrInput))
+    tools.append(StructuredTool.from_function(func=t_rg, name="Search.Ripgrep", description="Search code via ripgrep. Input: query string, or JSON {query, limit?} / {cursor} to fetch the next page.", args_schema=StrInput))
+    tools.append(StructuredTool.from_function(func=t_impact, name="Impact.Scan", description="Find where a symbol/text is used, as compact per-file snippets. Input: query string or JSON {query, mode?(literal|regex|word|symbol), kinds?, context?, limit?, token_budget?, format?} / {cursor} for the next page.", args_schema=StrInput))
+    tools.append(StructuredTool.from_function(func=t_deps, name="Index.Dependents", description="Who imports a module, transitively, nearest first. Input: path (src/calc.py) or module name (src.calc).", args_schema=StrInput))
     tools.append(StructuredTool.from_function(func=t_pyright, name="LSP.Pyright", description="Python diagnostics via pyright. Input: project root path or '.'", args_schema=StrInput))
+    tools.append(StructuredTool.from_function(func=t_check, name="LSP.Check", description="Fast Python check after edits: syntax + undefined names in milliseconds, then pyright only if that passes. Input: paths (space/comma separated; empty = changed files) or JSON {paths?, pyright?: auto|always|never}.", args_schema=StrInput))
     tools.append(StructuredTool.from_function(func=lambda input: gemini_run(input, timeout=40), name="Gemini", description="Query the Gemini CLI for web research. Input: query string.", args_schema=StrInput))
     tools.append(StructuredTool.from_function(func=lambda input: ask_via_mcp(input) or "[mcp] no response", name="MCP.Query", description="Send a prompt to the configured MCP server and return its response.", args_schema=StrInput))
     tools.append(StructuredTool.from_function(func=t_fs_list_all, name="FS.ListAll", description="List all files recursively relative to project root, one per line. Input: path or '.'", args_schema=StrInput))
@@ -167,6 +253,49 @@ def _try_build_langchain_agent() -> Optional[Any]:
         return None
 
 
+def _echo_output(stream: str, text: str) -> None:
+    """Show command output as it arrives (on_output callback for shell_run)."""
+    out = sys.stderr if stream == "stderr" else sys.stdout
+    out.write(text)
+    out.flush()
+
+
+def _llama_text(stream: Iterator[Dict[str, Any]]) -> Iterator[str]:
+    """Text of a llama_cpp `stream=True` completion, echoed as it arrives.
+
+    Closing this generator (stream_apply.consume does so on the first hunk
+    that does not match) closes the completion, which stops generation.
+    """
+    try:
+        for part in stream:
+            text = (part.get("choices") or [{}])[0].get("text") or ""
+            if text:
+                _echo_output("stdout", text)
+                yield text
+    finally:
+        close = getattr(stream, "close", None)
+        if close is not None:
+            close()
+
+
+def _stream_edit(llama: Any, path: str, instruction: str) -> str:
+    """Let the model write a diff for `path` and apply it while it is generated."""
+    from tools.edit.stream_apply import consume
+    text = read_file(path)
+    if text.startswith("[fs.read] "):
+        return text
+    if len(text) > EDIT_MAX_CHARS:
+        return f"[edit] {path} is too large for the model context ({len(text)} > {EDIT_MAX_CHARS} chars)"
+    prompt = (
+        "SYSTEM: You edit files. Reply with only a unified diff: --- and +++ lines with the path, "
+        "then @@ hunks with 3 lines of context. No explanation.\n"
+        f"USER: File {path}:\n{text}\nChange: {instruction}\nASSISTANT:\n"
+    )
+    stream = llama(prompt, max_tokens=1024, temperature=0.2, stop=["\nUSER:"], stream=True)
+    out = consume(_llama_text(stream))
+    return "\n" + out
+
+
 def _fallback_cli() -> int:
     print("[gpt_code_agent:fallback] Starting minimal CLI. Type 'help' for commands. 'exit' to quit.")
     # Optional local llama for chat if available
@@ -193,6 +322,7 @@ def _fallback_cli() -> int:
         "  rm <path>              - delete file or empty dir\n"
         "  mkdir <path>           - make directories\n"
         "  sh <command>           - run shell command in project root\n"
+        "  edit <path> <change>   - model writes a diff, applied as it streams (needs llama_cpp)\n"
         "  impact <query>         - quick impact scan summary\n"
         "  help                   - show this help\n"
     )
@@ -263,7 +393,17 @@ def _fallback_cli() -> int:
             elif line.startswith("mkdir "):
                 print(make_dirs(line[6:].strip()))
             elif line.startswith("sh "):
-                print(shell_run(line[3:].strip(), timeout=20))
+                # output is shown live; afterwards only the status line (the capture is for tools)
+                res = shell_run(line[3:].strip(), timeout=20, on_output=_echo_output)
+                print(res.split("\n", 1)[0])
+            elif line.startswith("edit "):
+                parts = line[5:].strip().split(None, 1)
+                if _llama is None:
+                    print("[edit] needs llama_cpp")
+                elif len(parts) < 2:
+                    print("usage: edit <path> <change>")
+                else:
+                    print(_stream_edit(_llama, parts[0], parts[1]))
             elif line.startswith("impact "):
                 q = line[len("impact "):].strip()
                 payload = {"query": q, "limit": 100, "mode": "literal", "context": 2}
@@ -413,15 +553,35 @@ def main() -> int:
     p_impact = sub.add_parser("impact", help="Run impact_scan directly (no LLM)")
     p_impact.add_argument("query")
     p_impact.add_argument("--limit", type=int, default=100)
-    p_impact.add_argument("--mode", choices=["literal", "regex", "word"], default="literal")
+    p_impact.add_argument("--mode", choices=["literal", "regex", "word", "symbol"], default="literal", help="symbol: AST index of .py definitions/imports/calls")
     p_impact.add_argument("--context", type=int, default=2)
     p_impact.add_argument("--pythonVersion")
     p_impact.add_argument("--venvPath")
     p_impact.add_argument("--venv")
+    p_impact.add_argument("--format", choices=["json", "compact"], default="json", help="compact: merged per-file snippets")
+    p_impact.add_argument("--budget", type=int, default=2000, help="approx. token budget for compact snippets")
+    p_impact.add_argument("--no-graph", action="store_true", help="skip import-graph blast radius")
     p_impact.add_argument("--json", action="store_true", help="machine-readable output")
 
+    # Reverse import lookup (no LLM)
+    p_deps = sub.add_parser("deps", help="List modules that import a file/module (transitively)")
+    p_deps.add_argument("target", help="workspace path or dotted module name")
+    p_deps.add_argument("--depth", type=int, default=None)
+    p_deps.add_argument("--json", action="store_true", help="machine-readable output")
+
     args = parser.parse_args()
 
+    if args.cmd == "deps":
+        import json as _json
+        data = dependents_report(args.target, max_depth=args.depth)
+        if args.json or data.get("error"):
+            print(_json.dumps(data, ensure_ascii=False, indent=2))
+            return 0 if not data.get("error") else 1
+        print(f"Dependents of {data['target']}:")
+        for it in data["dependents"]:
+            print(f"  - {it['path']}  (distance={it['distance']}, via={it['via']}, centrality={it['centrality']})")
+        return 0
+
     # Handle impact alias before initializing agent/LLM
     if args.cmd == "impact":
         import json as _json
@@ -432,6 +592,9 @@ def main() -> int:
             "mode": args.mode,
             "context": args.context,
             "pyright": pry or None,
+            "format": args.format,
+            "token_budget": args.budget,
+            "graph": not args.no_graph,
         }
         res_text = impact_scan_run(_json.dumps(payload))
         try:
@@ -447,6 +610,17 @@ def main() -> int:
         print("Top files:")
         for it in ranked[:10]:
             print(f"  - {it.get('path')}  (score={it.get('score')})")
+        radius = data.get("blast_radius") or []
+        if radius:
+            print("\nDependents (import graph):")
+            for it in radius[:10]:
+                print(f"  - {it.get('path')}  (distance={it.get('distance')}, via={it.get('via')})")
+        compact = data.get("compact") or {}
+        for f in compact.get("files") or []:
+            print(f"\n== {f.get('path')} ({f.get('hits')})")
+            print(f.get("snippet", ""))
+        if compact.get("truncated"):
+            print(f"\n(token budget reached; {compact.get('omitted_hits')} hit(s) omitted)")
         if sugg:
             print("\nSuggestions:")
             for s in sugg[:5]:
@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""Compare plan_patch diff engines: difflib.unified_diff vs tools.edit.fastdiff.
+
+Usage: python3 scripts/bench_diff.py [--runs 3] [--skip-difflib-over 1000000]
+For synthetic files from 1 KB up to MAX_BYTES (2 MB) and three edit shapes
+(a few scattered line edits, one edit in a highly repetitive file, a block
+moved across the file) prints the best wall time of each engine, whether
+the outputs are byte-identical, whether the fast diff applies back, and the
+size of both diffs (difflib's autojunk heuristic inflates some of them).
+"""
+from __future__ import annotations
+
+import argparse
+import difflib
+import random
+import sys
+import time
+from pathlib import Path
+
+ROOT_DIR = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT_DIR))
+
+from tools.edit.apply_patch import _apply_hunks_to_text, parse_unified_diff  # noqa: E402
+from tools.edit.fastdiff import unified_diff_text  # noqa: E402
+from tools.edit.plan_patch import MAX_BYTES  # noqa: E402
+
+SIZES = [1_000, 16_000, 128_000, 1_000_000, MAX_BYTES]
+
+
+def _source(size: int, rng: random.Random) -> list[str]:
+    lines: list[str] = []
+    n = 0
+    while sum(map(len, lines)) < size:
+        n += 1
+        lines += [
+            f"def handler_{n}(request, ctx):\n",
+            f"    value = request.get('k{rng.randrange(50)}')\n",
+            "    if value is None:\n",
+            "        return None\n",
+            f"    return ctx.apply(value, {n})\n",
+            "\n",
+        ]
+    return lines
+
+
+def _repetitive(size: int) -> list[str]:
+    return ["    pass\n", "\n"] * (size // 10)
+
+
+def _edits(lines: list[str], rng: random.Random, shape: str) -> list[str]:
+    out = list(lines)
+    if shape == "moved":
+        k = len(out) // 3
+        block = out[k:k + 30]
+        del out[k:k + 30]
+        out[2 * len(out) // 3:2 * len(out) // 3] = block
+        return out
+    for _ in range(1 if shape == "repetitive" else 5):
+        k = rng.randrange(len(out))
+        out[k] = f"    changed_{k} = True\n"
+    return out
+
+
+def _best(fn, runs: int) -> tuple[float, str]:
+    best = float("inf")
+    out = ""
+    for _ in range(runs):
+        t0 = time.perf_counter()
+        out = fn()
+        best = min(best, time.perf_counter() - t0)
+    return best * 1000, out
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--runs", type=int, default=3)
+    ap.add_argument("--skip-difflib-over", type=int, default=0, help="skip difflib above this size (seconds per call at 2 MB)")
+    args = ap.parse_args()
+    rng = random.Random(0)
+    print(f"{'size':>9} {'shape':<11} {'difflib':>12} {'fastdiff':>12} {'speedup':>8}  identical applies  diff lines (difflib/fast)")
+    for size in SIZES:
+        for shape in ("scattered", "repetitive", "moved"):
+            old_lines = _repetitive(size) if shape == "repetitive" else _source(size, rng)
+            new_lines = _edits(old_lines, rng, shape)
+            a, b = "".join(old_lines), "".join(new_lines)
+            t_fast, fast = _best(lambda: unified_diff_text(a, b, "a/f.py", "b/f.py"), args.runs)
+            (fd,) = parse_unified_diff(fast)
+            applies = "".join(_apply_hunks_to_text(a.splitlines(True), fd.hunks, fd.headers)[0]) == b
+            if args.skip_difflib_over and size > args.skip_difflib_over:
+                print(f"{size:>9} {shape:<11} {'skipped':>12} {t_fast:>9.1f} ms {'':>8}  {'-':<9} {str(applies):<8} -/{fast.count(chr(10))}")
+                continue
+            t_ref, ref = _best(lambda: "".join(difflib.unified_diff(
+                a.splitlines(True), b.splitlines(True), fromfile="a/f.py", tofile="b/f.py")), args.runs)
+            print(f"{size:>9} {shape:<11} {t_ref:>9.1f} ms {t_fast:>9.1f} ms {t_ref / max(t_fast, 1e-6):>7.1f}x  "
+                  f"{str(ref == fast):<9} {str(applies):<8} {ref.count(chr(10))}/{fast.count(chr(10))}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+"""Compare PyExec latency: a new `python3 -c` per snippet vs the warm fork server.
+
+Usage: python3 scripts/bench_pyexec.py [--runs 20]
+For a few typical snippets prints the median and p95 wall time of
+tools.code_exec.run() with the pool disabled (GPT_CODE_PYEXEC_POOL=0) and
+enabled, plus the one-off cost of starting the template.
+"""
+from __future__ import annotations
+
+import argparse
+import os
+import statistics
+import sys
+import time
+from pathlib import Path
+
+ROOT_DIR = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT_DIR))
+
+from tools import pyexec_pool  # noqa: E402
+from tools.code_exec import run  # noqa: E402
+
+SNIPPETS = {
+    "print": "print('hello')",
+    "stdlib": "import json, re, collections\nprint(json.dumps(collections.Counter(re.findall(r'\\w', 'abcab'))))",
+    "workspace": "from src.calc import divide\nprint(divide(6, 3))",
+    "unittest": "import unittest\nprint(unittest.TestCase.__name__)",
+}
+
+
+def _times(code: str, runs: int) -> list[float]:
+    out = []
+    for _ in range(runs):
+        t0 = time.perf_counter()
+        run(code)
+        out.append((time.perf_counter() - t0) * 1000)
+    return out
+
+
+def _fmt(ts: list[float]) -> str:
+    p95 = sorted(ts)[max(0, int(len(ts) * 0.95) - 1)]
+    return f"{statistics.median(ts):7.1f} / {p95:7.1f} ms"
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--runs", type=int, default=20)
+    args = ap.parse_args()
+    t0 = time.perf_counter()
+    if pyexec_pool.get_server() is None:
+        print("fork server unavailable on this platform")
+        return 1
+    print(f"template start: {(time.perf_counter() - t0) * 1000:.1f} ms (once per session / src change)")
+    print(f"{'snippet':<10} {'python3 -c (med/p95)':>22} {'fork server (med/p95)':>22} {'speedup':>8}")
+    for name, code in SNIPPETS.items():
+        os.environ["GPT_CODE_PYEXEC_POOL"] = "0"
+        cold = _times(code, args.runs)
+        os.environ["GPT_CODE_PYEXEC_POOL"] = "1"
+        warm = _times(code, args.runs)
+        print(f"{name:<10} {_fmt(cold):>22} {_fmt(warm):>22} {statistics.median(cold) / statistics.median(warm):7.1f}x")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
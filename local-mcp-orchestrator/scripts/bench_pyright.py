@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""Compare pyright latency: cold CLI per call vs the persistent language server.
+
+Usage: python3 scripts/bench_pyright.py [--runs 3] [files...]
+Prints wall time per call for the CLI, the server's first (cold) call,
+repeat calls on an unchanged tree, and a call after touching one file.
+"""
+from __future__ import annotations
+
+import argparse
+import os
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+ROOT_DIR = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT_DIR))
+
+from tools.index.workspace import iter_files  # noqa: E402
+from tools.lsp.pyright_server import PyrightServer, installed  # noqa: E402
+
+
+def _ms(t0: float) -> str:
+    return f"{(time.perf_counter() - t0) * 1000:8.1f} ms"
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--runs", type=int, default=3)
+    ap.add_argument("files", nargs="*")
+    args = ap.parse_args()
+    files = args.files or list(iter_files(ROOT_DIR, (".py",)))
+    print(f"files: {len(files)}")
+
+    try:
+        for i in range(args.runs):
+            t0 = time.perf_counter()
+            subprocess.run(["pyright", "--outputjson", *files], cwd=str(ROOT_DIR), capture_output=True)
+            print(f"cli       run {i + 1}: {_ms(t0)}")
+    except FileNotFoundError:
+        print("cli: pyright not installed")
+
+    if not installed():
+        print("server: pyright-langserver not installed")
+        return 0
+    srv = PyrightServer(ROOT_DIR)
+    t0 = time.perf_counter()
+    srv.start()
+    print(f"server    start: {_ms(t0)}")
+    try:
+        t0 = time.perf_counter()
+        srv.diagnostics(files)
+        print(f"server    cold : {_ms(t0)}")
+        for i in range(args.runs):
+            t0 = time.perf_counter()
+            srv.diagnostics(files)
+            print(f"server    warm {i + 1}: {_ms(t0)}")
+        target = ROOT_DIR / files[0]
+        original = target.read_bytes()
+        try:
+            target.write_bytes(original + b"\n# bench touch\n")
+            t0 = time.perf_counter()
+            srv.diagnostics(files)
+            print(f"server    1 file changed: {_ms(t0)}")
+        finally:
+            target.write_bytes(original)
+            os.utime(target)
+    finally:
+        srv.shutdown()
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,87 @@
+import os
+import tempfile
+import unittest
+from pathlib import Path
+
+
+class TestActionCache(unittest.TestCase):
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.base = Path(self._tmp.name)
+        self.ws = self.base / "ws"
+        self.ws.mkdir()
+        (self.ws / "a.py").write_text("x = 1\n", encoding="utf-8")
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def make_cache(self, **kw):
+        from tools.action_cache import ActionCache
+        from tools.index.workspace import FileHasher
+        hasher = FileHasher(self.ws, memo_path=self.base / "hashes.json")
+        return ActionCache(root=self.base / "actions", hasher=hasher, **kw)
+
+    def test_hit_until_content_changes(self):
+        cache = self.make_cache()
+        key = cache.key("tool", {"q": 1}, cache.hasher.tree_digest())
+        self.assertIsNone(cache.get(key))
+        cache.put(key, "tool", {"answer": 42})
+        # input order does not matter; unchanged tree -> same key
+        again = cache.key("tool", {"q": 1}, cache.hasher.tree_digest())
+        self.assertEqual(again, key)
+        self.assertEqual(cache.get(again), {"answer": 42})
+        self.assertEqual(cache.stats()["hit_rate"], 0.5)
+        # touching without changing content keeps the key; editing changes it
+        os.utime(self.ws / "a.py", ns=(1, 1))
+        self.assertEqual(cache.key("tool", {"q": 1}, cache.hasher.tree_digest()), key)
+        (self.ws / "a.py").write_text("x = 2\n", encoding="utf-8")
+        self.assertNotEqual(cache.key("tool", {"q": 1}, cache.hasher.tree_digest()), key)
+
+    def test_scan_key_skips_symlinks_and_large_files(self):
+        from unittest import mock
+        from tools.impact_scan import _scan_digest
+        cache = self.make_cache()
+        model = self.base / "model.gguf"
+        model.write_bytes(b"\0" * 64)
+        (self.ws / "model.gguf").symlink_to(model)
+        (self.ws / "big.log").write_text("y" * 100, encoding="utf-8")
+        with mock.patch("tools.impact_scan.MAX_FILE_BYTES", 50):
+            key = _scan_digest(cache.hasher)
+            model.write_bytes(b"\1" * 64)
+            (self.ws / "big.log").write_text("z" * 100, encoding="utf-8")
+            self.assertEqual(_scan_digest(cache.hasher), key)
+            self.assertNotIn("model.gguf", cache.hasher._memo)
+            (self.ws / "a.py").write_text("x = 2\n", encoding="utf-8")
+            self.assertNotEqual(_scan_digest(cache.hasher), key)
+
+    def test_lru_eviction(self):
+        cache = self.make_cache(max_bytes=250)
+        keys = [cache.key("tool", {"i": i}, "d") for i in range(3)]
+        cache.put(keys[0], "tool", "x" * 60)
+        cache.put(keys[1], "tool", "y" * 60)
+        os.utime(cache.root / f"{keys[0]}.json", ns=(1, 1))
+        os.utime(cache.root / f"{keys[1]}.json", ns=(2, 2))
+        self.assertIsNotNone(cache.get(keys[0]))  # bumps key 0 to most recent
+        cache.put(keys[2], "tool", "z" * 60)
+        self.assertIsNotNone(cache.get(keys[0]))
+        self.assertIsNone(cache.get(keys[1]))
+        self.assertIsNotNone(cache.get(keys[2]))
+
+    def test_unsettled_pyright_server_answer_is_not_cached(self):
+        from unittest import mock
+        from tools.index.workspace import ROOT_DIR
+        from tools.lsp import diagnostics
+        cache = self.make_cache()
+        answers = [
+            {"framework": "pyright", "diagnostics": [], "server": {"pending": [], "stale": ["b.py"]}},
+            {"framework": "pyright", "diagnostics": [], "server": {"pending": [], "stale": []}},
+        ]
+        with mock.patch.object(diagnostics, "get_cache", return_value=cache), \
+                mock.patch.object(diagnostics, "_python_pyright", side_effect=answers) as run:
+            for _ in range(3):
+                diagnostics.python_pyright(str(ROOT_DIR))
+        self.assertEqual(run.call_count, 2)  # the stale answer was not replayed, the settled one was
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,97 @@
+import tempfile
+import unittest
+from pathlib import Path
+
+
+class TestAffectedTests(unittest.TestCase):
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.root = Path(self._tmp.name)
+        files = {
+            "src/calc.py": "def add(a, b):\n    return a + b\n",
+            "src/other.py": "def name():\n    return 'x'\n",
+            "src/app.py": "from src.calc import add\n",
+            "tests/test_calc.py": "from src.calc import add\n",
+            "tests/test_app.py": "import src.app\n",
+            "tests/test_other.py": "from src.other import name\n",
+        }
+        for rel, text in files.items():
+            self.write(rel, text)
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def write(self, rel, text):
+        p = self.root / rel
+        p.parent.mkdir(parents=True, exist_ok=True)
+        p.write_text(text, encoding="utf-8")
+
+    def tracker(self):
+        from tools.testing.affected import AffectedTests
+        return AffectedTests(self.root, state_dir=self.root / ".cache")
+
+    def green(self):
+        t = self.tracker()
+        t.record_green(t.select(full=True).snapshot)
+
+    def test_first_run_is_full(self):
+        sel = self.tracker().select()
+        self.assertEqual((sel.mode, sel.reason), ("full", "no green baseline yet"))
+        self.assertEqual(sel.selected, ["tests/test_app.py", "tests/test_calc.py", "tests/test_other.py"])
+
+    def test_selects_direct_and_transitive_importers(self):
+        self.green()
+        self.write("src/calc.py", "def add(a, b):\n    return b + a  # swapped\n")
+        sel = self.tracker().select()
+        self.assertEqual(sel.mode, "affected")
+        self.assertEqual(sel.changed, ["src/calc.py"])
+        self.assertEqual(sel.selected, ["tests/test_app.py", "tests/test_calc.py"])
+        self.assertEqual(sel.skipped, ["tests/test_other.py"])
+        self.assertEqual(sel.via["tests/test_app.py"], "src/calc.py")
+        report = sel.report()
+        self.assertEqual(report["counts"], {"changed": 1, "selected": 2, "skipped": 1})
+
+    def test_changed_test_and_no_changes(self):
+        self.green()
+        self.assertEqual(self.tracker().select().selected, [])
+        self.write("tests/test_other.py", "from src.other import name\n\nX = 1\n")
+        self.assertEqual(self.tracker().select().selected, ["tests/test_other.py"])
+
+    def test_config_change_and_deleted_module_fall_back_to_full(self):
+        self.green()
+        self.write("tests/conftest.py", "import os\n")
+        self.assertEqual(self.tracker().select().mode, "full")
+        self.green()
+        (self.root / "src/other.py").unlink()
+        sel = self.tracker().select()
+        self.assertEqual((sel.mode, sel.reason), ("full", "module removed: src/other.py"))
+
+    def test_test_data_change_falls_back_to_full(self):
+        self.write("tests/data/cases.json", "[1, 2]\n")
+        self.green()
+        self.assertEqual(self.tracker().select().selected, [])
+        self.write("tests/data/cases.json", "[1, 2, 3]\n")
+        sel = self.tracker().select()
+        self.assertEqual((sel.mode, sel.reason), ("full", "test data changed: tests/data/cases.json"))
+        self.assertEqual(len(sel.selected), 3)
+
+    def test_coverage_map_adds_dynamic_dependencies(self):
+        self.green()
+        t = self.tracker()
+        report = {"files": {"src/other.py": {"contexts": {"1": ["tests.test_calc.TestCalc.test_add", ""]}},
+                            "tests/test_calc.py": {"contexts": {"1": ["test_calc.TestCalc.test_add"]}}}}
+        self.assertEqual(t.store_coverage(report, ["tests/test_calc.py", "tests/test_other.py"]), 1)
+        self.write("src/other.py", "def name():\n    return 'changed'\n")
+        sel = self.tracker().select()
+        self.assertEqual(sel.selected, ["tests/test_calc.py", "tests/test_other.py"])
+
+    def test_command_for_targets(self):
+        from tools.tests import command_for
+        self.assertEqual(command_for("unittest", ["tests/test_calc.py"])[1],
+                         ["python3", "-m", "unittest", "-v", "tests.test_calc"])
+        self.assertEqual(command_for("pytest", ["tests/test_calc.py"])[1], ["pytest", "-q", "tests/test_calc.py"])
+        self.assertIn("discover", command_for("unittest")[1])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,64 @@
+import json
+import tempfile
+import unittest
+from pathlib import Path
+
+
+class TestApplyEdits(unittest.TestCase):
+    TEXT = "def a():\n    return 1\n\ndef b():\n    return 2\n"
+
+    def test_ops_refer_to_original_lines(self):
+        from tools.edit.edit_ops import apply_edits
+        out = apply_edits(self.TEXT, [
+            {"op": "insert_after", "line": 0, "text": "import os"},
+            {"op": "replace_lines", "start": 2, "end": 2, "text": "    return 10\n"},
+            {"op": "search_replace", "search": "return 2", "replace": "return 20"},
+            {"op": "insert_after", "anchor": "def b():\n    return 2", "text": "\ndef c():\n    return 3"},
+        ])
+        self.assertEqual(out, "import os\ndef a():\n    return 10\n\ndef b():\n    return 20\n\ndef c():\n    return 3\n")
+
+    def test_crlf_is_preserved(self):
+        from tools.edit.edit_ops import apply_edits
+        out = apply_edits("a\r\nb\r\n", [{"op": "search_replace", "search": "a\nb", "replace": "a\nx\nb"}])
+        self.assertEqual(out, "a\r\nx\r\nb\r\n")
+
+    def test_errors(self):
+        from tools.edit.edit_ops import apply_edits
+        from tools.edit.plan_patch import PlanError
+        bad = [
+            [{"op": "search_replace", "search": "return", "replace": "yield"}],  # ambiguous
+            [{"op": "search_replace", "search": "nope", "replace": ""}],
+            [{"op": "replace_lines", "start": 4, "end": 9, "text": ""}],
+            [{"op": "replace_lines", "start": 1, "end": 2, "text": ""},
+             {"op": "search_replace", "search": "return 1", "replace": "x"}],  # overlap
+            [{"op": "rewrite"}],
+        ]
+        for edits in bad:
+            with self.assertRaises(PlanError):
+                apply_edits(self.TEXT, edits)
+        out = apply_edits(self.TEXT, [{"op": "search_replace", "search": "return", "replace": "yield", "all": True}])
+        self.assertEqual(out.count("yield"), 2)
+
+
+class TestPlanEditsFlow(unittest.TestCase):
+    def test_plan_and_apply(self):
+        from tools.edit.edit_ops import run as edits_run
+        from tools.edit.apply_patch import run as apply_run
+        root = Path(__file__).resolve().parents[1]
+        tmp = tempfile.TemporaryDirectory(prefix="test_", dir=root / "tmp")  # ApplyPatch stays inside the workspace
+        self.addCleanup(tmp.cleanup)
+        p = Path(tmp.name) / "e2e_edit_ops.txt"
+        p.write_text("".join(f"line {i}\n" for i in range(1, 101)), encoding="utf-8")
+        rel = str(p.relative_to(root))
+        plan = json.loads(edits_run(json.dumps({"path": rel, "edits": [
+            {"op": "replace_lines", "start": 50, "end": 50, "text": "fifty"},
+        ]})))
+        self.assertEqual(plan["edits"], 1)
+        self.assertIn("-line 50\n+fifty\n", plan["diff"])
+        self.assertIn("ok: 1 file(s) updated", apply_run(json.dumps(plan)))
+        self.assertEqual(p.read_text().splitlines()[49], "fifty")
+        self.assertIn("error", json.loads(edits_run(json.dumps({"path": rel, "edits": []}))))
+
+
+if __name__ == "__main__":
+    unittest.main()
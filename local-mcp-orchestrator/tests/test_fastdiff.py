@@ -0,0 +1,81 @@
+import difflib
+import random
+import unittest
+from unittest import mock
+
+
+def _ref(a, b, n=3):
+    lines = difflib.unified_diff(a.splitlines(True), b.splitlines(True), fromfile="a/f", tofile="b/f", n=n)
+    return "".join(ln if ln.endswith("\n") else ln + "\n\\ No newline at end of file\n" for ln in lines)
+
+
+def _apply(a, diff):
+    from tools.edit.apply_patch import _apply_hunks_to_text, parse_unified_diff
+    (fd,) = parse_unified_diff(diff)
+    return "".join(_apply_hunks_to_text(a.splitlines(True), fd.hunks, fd.headers)[0])
+
+
+class TestFastDiff(unittest.TestCase):
+    def setUp(self):
+        rng = random.Random(7)
+        self.lines = [f"value_{i} = compute({rng.randrange(1000)})\n" for i in range(400)]
+
+    def test_matches_difflib_for_scattered_edits(self):
+        from tools.edit.fastdiff import unified_diff_text
+        rng = random.Random(1)
+        a = "".join(self.lines)
+        for _ in range(30):
+            new = list(self.lines)
+            for _ in range(rng.randint(1, 4)):
+                k = rng.randrange(len(new))
+                if rng.random() < 0.5:
+                    new[k] = "changed\n"
+                else:
+                    del new[k]
+            b = "".join(new)
+            for n in (0, 1, 3):
+                self.assertEqual(unified_diff_text(a, b, "a/f", "b/f", n), _ref(a, b, n))
+
+    def test_edge_cases(self):
+        from tools.edit.fastdiff import unified_diff_text
+        cases = [("", "x\n"), ("x\n", ""), ("a\nb", "a\nc"), ("a\r\nb\r\n", "a\r\nc\r\n"), ("a\nb\n", "a\nb\nc")]
+        for a, b in cases:
+            self.assertEqual(unified_diff_text(a, b, "a/f", "b/f"), _ref(a, b))
+        self.assertEqual(unified_diff_text("same\n", "same\n"), "")
+
+    def test_trimming_can_pick_another_minimal_diff(self):
+        from tools.edit.fastdiff import unified_diff_text
+        a, b = "A\nB\nC\nA\nB\nC\nD\n", "A\nB\nC\nD\n"
+        diff = unified_diff_text(a, b, "a/f", "b/f", 0)
+        # difflib removes lines 1-3; the longest common prefix leaves 4-6 (reported from line 3 on)
+        self.assertEqual(diff, "--- a/f\n+++ b/f\n@@ -3,3 +2,0 @@\n-C\n-A\n-B\n")
+        self.assertNotEqual(diff, _ref(a, b, 0))
+        self.assertEqual(_apply(a, diff), b)
+
+    def test_histogram_path_roundtrips(self):
+        from tools.edit import fastdiff
+        rng = random.Random(3)
+        a = "".join(self.lines)
+        new = list(self.lines)
+        block = new[50:80]
+        del new[50:80]
+        new[300:300] = block
+        new[10] = "changed\n"
+        new.extend(["pass\n"] * 5)
+        b = "".join(new)
+        with mock.patch.object(fastdiff, "SMALL_PRODUCT", 0):
+            diff = fastdiff.unified_diff_text(a, b, "a/f", "b/f")
+        self.assertEqual(_apply(a, diff), b)
+        # the moved block costs about its own size, not the whole span
+        self.assertLess(diff.count("\n"), 120)
+        for _ in range(50):
+            x = [rng.choice("abcde") + "\n" for _ in range(rng.randint(0, 60))]
+            y = [rng.choice("abcde") + "\n" for _ in range(rng.randint(0, 60))]
+            with mock.patch.object(fastdiff, "SMALL_PRODUCT", 0):
+                diff = fastdiff.unified_diff_text("".join(x), "".join(y), "a/f", "b/f")
+            if diff:
+                self.assertEqual(_apply("".join(x), diff), "".join(y))
+
+
+if __name__ == "__main__":
+    unittest.main()
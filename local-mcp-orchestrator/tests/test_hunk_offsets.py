@@ -0,0 +1,55 @@
+import difflib
+import unittest
+
+
+def _diff(old, new, n=3):
+    return "".join(difflib.unified_diff(old, new, fromfile="a/f.txt", tofile="b/f.txt", n=n))
+
+
+class TestHunkPositioning(unittest.TestCase):
+    def setUp(self):
+        self.old = [f"line {i}\n" for i in range(1, 41)]
+        self.new = list(self.old)
+        self.new[2] = "LINE 3\n"
+        self.new[30] = "LINE 31\n"
+
+    def apply(self, orig, diff_text):
+        from tools.edit.apply_patch import _apply_hunks_to_text, parse_unified_diff
+        (fd,) = parse_unified_diff(diff_text)
+        return _apply_hunks_to_text(orig, fd.hunks, fd.headers)
+
+    def test_hunks_with_gap(self):
+        out, report = self.apply(self.old, _diff(self.old, self.new))
+        self.assertEqual(out, self.new)
+        self.assertEqual([(r["offset"], r["fuzz"]) for r in report], [(0, 0), (0, 0)])
+
+    def test_shifted_lines_report_offset(self):
+        shifted = ["header\n"] * 5 + self.old
+        out, report = self.apply(shifted, _diff(self.old, self.new))
+        self.assertEqual(out, ["header\n"] * 5 + self.new)
+        self.assertEqual([r["offset"] for r in report], [5, 5])
+        self.assertEqual(report[1]["applied_at"], 28 + 5)
+
+    def test_changed_context_uses_fuzz(self):
+        drifted = list(self.old)
+        drifted[27] = "edited elsewhere\n"  # first context line of the second hunk
+        out, report = self.apply(drifted, _diff(self.old, self.new))
+        self.assertEqual(out[30], "LINE 31\n")
+        self.assertEqual(out[27], "edited elsewhere\n")
+        self.assertEqual(report[1]["fuzz"], 1)
+
+    def test_pure_insertion_uses_header(self):
+        new = self.old[:10] + ["inserted\n"] + self.old[10:]
+        out, report = self.apply(self.old, _diff(self.old, new, n=0))
+        self.assertEqual(out, new)
+        self.assertEqual(report[0]["applied_at"], 11)
+
+    def test_missing_context_fails(self):
+        from tools.edit.apply_patch import PatchError
+        other = [f"other {i}\n" for i in range(40)]
+        with self.assertRaises(PatchError):
+            self.apply(other, _diff(self.old, self.new))
+
+
+if __name__ == "__main__":
+    unittest.main()
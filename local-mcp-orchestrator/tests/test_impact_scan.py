@@ -47,6 +47,59 @@ class TestImpactScan(unittest.TestCase):
         self.assertEqual(used.get("venvPath"), "/tmp/x")
         self.assertEqual(used.get("venv"), "venv")
 
+    def test_rg_hits_are_workspace_relative(self):
+        from unittest import mock
+        from tools import impact_scan
+        from tools.proc_runner import ProcResult
+        real = impact_scan.run_bounded
+
+        def fake(cmd, **kwargs):
+            if cmd[0] == "rg":
+                return ProcResult(0, "./src/calc.py:1:def divide(a, b):\n", "")
+            return real(cmd, **kwargs)
+
+        with mock.patch.object(impact_scan, "run_bounded", side_effect=fake):
+            res = self.run_scan({"query": "divide", "mode": "literal", "context": 0, "cache": False})
+        self.assertEqual([h["path"] for h in res["hits"]], ["src/calc.py"])
+        self.assertIn("src/cli_tool.py", [r["path"] for r in res["blast_radius"]])
+
+    def test_symbol_mode_skips_strings_and_comments(self):
+        res = self.run_scan({"query": "divide", "mode": "symbol", "context": 0, "limit": 50})
+        self.assertFalse(res.get("error"), msg=res.get("error"))
+        kinds = {(h["path"], h["kind"]) for h in res["hits"]}
+        self.assertIn(("src/calc.py", "function"), kinds)
+        self.assertIn(("src/cli_tool.py", "import"), kinds)
+        self.assertFalse(any("division by zero" in h["text"] for h in res["hits"]))
+        self.assertEqual(res["used"]["symbols"]["mode"], "symbol")
+
+    def test_compact_merges_overlapping_context(self):
+        from tools.impact_scan import _compact_hits
+        hits = [
+            {"path": "src/calc.py", "line": 1, "text": "def divide(a, b):"},
+            {"path": "src/calc.py", "line": 3, "text": "        raise ValueError(\"division by zero\")"},
+            {"path": "src/adder.py", "line": 1, "text": "def add(a, b):"},
+        ]
+        res = _compact_hits(hits, context=1, token_budget=2000)
+        files = res["files"]
+        self.assertEqual([f["path"] for f in files], ["src/calc.py", "src/adder.py"])
+        snippet = files[0]["snippet"]
+        # windows 1-2 and 2-4 merge into one block; line 2 appears once
+        self.assertNotIn("...", snippet)
+        self.assertEqual(snippet.count("if b == 0"), 1)
+        self.assertTrue(snippet.startswith("1> def divide"))
+        self.assertFalse(res["truncated"])
+
+    def test_compact_respects_token_budget(self):
+        from tools.impact_scan import _compact_hits
+        hits = [
+            {"path": "src/calc.py", "line": 1, "text": "def divide(a, b):"},
+            {"path": "src/adder.py", "line": 1, "text": "def add(a, b):"},
+        ]
+        res = _compact_hits(hits, context=0, token_budget=12)
+        self.assertTrue(res["truncated"])
+        self.assertEqual(len(res["files"]), 1)
+        self.assertEqual(res["omitted_hits"], 1)
+
 
 if __name__ == "__main__":
     unittest.main()
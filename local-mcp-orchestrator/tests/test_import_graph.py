@@ -0,0 +1,65 @@
+import tempfile
+import unittest
+from pathlib import Path
+
+
+class TestImportGraph(unittest.TestCase):
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.root = Path(self._tmp.name)
+        files = {
+            "pkg/__init__.py": "",
+            "pkg/core.py": "def f():\n    return 1\n",
+            "pkg/mid.py": "from .core import f\n",
+            "pkg/sub/__init__.py": "from .. import mid\n",
+            "app.py": "import pkg.sub\nimport os.path\n",
+            "lonely.py": "import json\n",
+        }
+        for rel, text in files.items():
+            p = self.root / rel
+            p.parent.mkdir(parents=True, exist_ok=True)
+            p.write_text(text, encoding="utf-8")
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def make_graph(self):
+        from tools.index.symbols import SymbolIndex
+        from tools.index.imports import ImportGraph
+        idx = SymbolIndex(self.root, cache_path=self.root / ".cache" / "symbols.json")
+        g = ImportGraph(idx)
+        g.refresh()
+        return g
+
+    def test_transitive_dependents_with_distance(self):
+        from tools.index.imports import blast_radius
+        g = self.make_graph()
+        deps = g.dependents(["pkg/core.py"])
+        self.assertEqual(deps["pkg/mid.py"]["distance"], 1)
+        self.assertEqual(deps["pkg/sub/__init__.py"]["distance"], 2)
+        self.assertEqual(deps["app.py"], {"distance": 3, "via": "pkg/sub/__init__.py"})
+        self.assertNotIn("lonely.py", deps)
+        ranked = [r["path"] for r in blast_radius(g, ["pkg/core.py"])]
+        self.assertEqual(ranked, ["pkg/mid.py", "pkg/sub/__init__.py", "app.py"])
+        self.assertEqual(g.resolve("pkg.mid"), "pkg/mid.py")
+
+    def test_centrality_counts_follow_cycles_and_edits(self):
+        g = self.make_graph()
+        self.assertEqual([g.centrality(r) for r in ("pkg/core.py", "pkg/mid.py", "app.py")], [3, 2, 0])
+        (self.root / "pkg/core.py").write_text("import app\n", encoding="utf-8")  # core -> app -> ... -> core
+        g.refresh()
+        self.assertEqual([g.centrality(r) for r in ("pkg/core.py", "app.py", "lonely.py")], [3, 3, 0])
+
+    def test_incremental_update(self):
+        g = self.make_graph()
+        (self.root / "lonely.py").write_text("from pkg import core\n", encoding="utf-8")
+        stats = g.refresh()
+        self.assertEqual(stats["resolved"], 1)
+        self.assertIn("lonely.py", g.dependents(["pkg/core.py"]))
+        (self.root / "app.py").unlink()
+        g.refresh()
+        self.assertNotIn("app.py", g.dependents(["pkg/core.py"]))
+
+
+if __name__ == "__main__":
+    unittest.main()
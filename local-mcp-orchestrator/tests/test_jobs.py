@@ -0,0 +1,41 @@
+import json
+import shlex
+import time
+import unittest
+
+
+class TestJobs(unittest.TestCase):
+    def setUp(self):
+        from tools import jobs
+        self.jobs = jobs
+
+    def test_start_tail_wait(self):
+        code = "import time\nfor i in range(4):\n    print('tick', i, flush=True)\n    time.sleep(0.15)"
+        job = json.loads(self.jobs.run("start", json.dumps({"cmd": f"python3 -c {shlex.quote(code)}"})))
+        self.assertEqual(job["status"], "running")
+        time.sleep(0.3)
+        tail = json.loads(self.jobs.run("tail", json.dumps({"id": job["id"], "lines": 1})))
+        self.assertTrue(tail["tail"].startswith("tick"))
+        self.assertEqual(tail["tail"].count("\n"), 0)
+        done = json.loads(self.jobs.run("wait", json.dumps({"id": job["id"], "timeout": 10})))
+        self.assertEqual((done["status"], done["returncode"]), ("done", 0))
+        self.assertEqual(done["output"], "tick 0\ntick 1\ntick 2\ntick 3\n")
+
+    def test_wait_timeout_cancel_and_job_timeout(self):
+        job = json.loads(self.jobs.run("start", "sleep 30"))
+        self.assertEqual(json.loads(self.jobs.run("wait", json.dumps({"id": job["id"], "timeout": 0.1})))["status"],
+                         "running")
+        self.assertEqual(json.loads(self.jobs.run("cancel", job["id"]))["status"], "cancelled")
+        job = json.loads(self.jobs.run("start", json.dumps({"cmd": "sleep 30", "timeout": 0.2})))
+        self.assertEqual(json.loads(self.jobs.run("wait", job["id"]))["status"], "timeout")
+
+    def test_errors(self):
+        self.assertIn("error", json.loads(self.jobs.run("start", "")))
+        self.assertIn("error", json.loads(self.jobs.run("start", json.dumps({"tests": "nose"}))))
+        self.assertIn("error", json.loads(self.jobs.run("poll", "job-missing")))
+        listed = json.loads(self.jobs.run("poll", ""))
+        self.assertIsInstance(listed["jobs"], list)
+
+
+if __name__ == "__main__":
+    unittest.main()
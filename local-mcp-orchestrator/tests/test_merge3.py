@@ -0,0 +1,56 @@
+import json
+import tempfile
+import unittest
+from pathlib import Path
+
+
+def L(*xs):
+    return [f"{x}\n" for x in xs]
+
+
+class TestMerge3(unittest.TestCase):
+    def test_disjoint_edits_merge(self):
+        from tools.edit.merge3 import merge3
+        base = L(1, 2, 3, 4, 5, 6)
+        ours = L(1, "two", 3, 4, 5, 6)
+        theirs = L(1, 2, 3, 4, 5, "six", 7)
+        merged, conflicts = merge3(base, ours, theirs)
+        self.assertEqual(conflicts, [])
+        self.assertEqual(merged, L(1, "two", 3, 4, 5, "six", 7))
+
+    def test_adjacent_and_identical_edits(self):
+        from tools.edit.merge3 import merge3
+        base = L(1, 2, 3)
+        merged, conflicts = merge3(base, L("one", 2, 3), L(1, "two", 3))
+        self.assertEqual((merged, conflicts), (L("one", "two", 3), []))
+        merged, conflicts = merge3(base, L(1, "x", 3), L(1, "x", 3))
+        self.assertEqual((merged, conflicts), (L(1, "x", 3), []))
+
+    def test_overlap_is_conflict(self):
+        from tools.edit.merge3 import merge3
+        _, conflicts = merge3(L(1, 2, 3), L(1, "a", 3), L(1, "b", 3))
+        self.assertEqual(conflicts, [{"base_start": 2, "base_end": 2}])
+        _, conflicts = merge3(L(1, 2), L(1, "x", 2), L(1, "y", 2))
+        self.assertEqual(len(conflicts), 1)
+
+
+class TestApplyMerge(unittest.TestCase):
+    def test_apply_merges_concurrent_edit(self):
+        from tools.edit.plan_patch import plan_patch
+        from tools.edit.apply_patch import run as apply_run
+        root = Path(__file__).resolve().parents[1]
+        tmp = tempfile.TemporaryDirectory(prefix="test_", dir=root / "tmp")  # ApplyPatch stays inside the workspace
+        self.addCleanup(tmp.cleanup)
+        p = Path(tmp.name) / "e2e_merge3.txt"
+        p.write_text("".join(L(*range(1, 21))), encoding="utf-8")
+        rel = str(p.relative_to(root))
+        plan = plan_patch({"path": rel, "new_content": "".join(L(*range(1, 20), "twenty"))})
+        p.write_text("".join(L("one", *range(2, 21))), encoding="utf-8")  # someone else edits line 1
+        out = apply_run(json.dumps(plan))
+        self.assertIn("ok: 1 file(s) updated", out)
+        self.assertEqual(json.loads(out.splitlines()[-1])["strategy"], "merge3")
+        self.assertEqual(p.read_text(), "".join(L("one", *range(2, 20), "twenty")))
+
+
+if __name__ == "__main__":
+    unittest.main()
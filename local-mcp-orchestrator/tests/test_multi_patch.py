@@ -0,0 +1,96 @@
+import json
+import os
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+
+class TestMultiFilePatch(unittest.TestCase):
+    def setUp(self):
+        self.root = Path(__file__).resolve().parents[1]
+        # ApplyPatch only writes inside the workspace; tmp/test_* is gitignored
+        self._tmp = tempfile.TemporaryDirectory(prefix="test_", dir=self.root / "tmp")
+        self.addCleanup(self._tmp.cleanup)
+        self.tmp_dir = Path(self._tmp.name)
+
+    def _plan(self, name, new):
+        from tools.edit.plan_patch import plan_patch
+        p = self.tmp_dir / name
+        return plan_patch({"path": str(p.relative_to(self.root)), "new_content": new})
+
+    def test_apply_all_files_with_footer(self):
+        from tools.edit.apply_patch import run as apply_run
+        (self.tmp_dir / "a.txt").write_text("a1\n", encoding="utf-8")
+        (self.tmp_dir / "gone.txt").write_text("bye\n", encoding="utf-8")
+        plans = [self._plan("a.txt", "a2\n"), self._plan("new.txt", "n\n"), self._plan("gone.txt", "")]
+        out = apply_run(json.dumps({
+            "diff": "".join(p["diff"] for p in plans),
+            "base_hashes": {p["path"]: p["base_hash"] for p in plans},
+        }))
+        self.assertIn("ok: 3 file(s) updated", out)
+        footer = json.loads(out.splitlines()[-1])
+        self.assertEqual(footer["mode"], "multi")
+        self.assertEqual([f["mode"] for f in footer["files"]], ["modify", "create", "delete"])
+        self.assertEqual((self.tmp_dir / "a.txt").read_text(), "a2\n")
+        self.assertEqual((self.tmp_dir / "new.txt").read_text(), "n\n")
+        self.assertFalse((self.tmp_dir / "gone.txt").exists())
+
+    def test_verification_failure_writes_nothing(self):
+        from tools.edit.apply_patch import run as apply_run
+        (self.tmp_dir / "a.txt").write_text("a1\n", encoding="utf-8")
+        (self.tmp_dir / "b.txt").write_text("b1\n", encoding="utf-8")
+        plans = [self._plan("a.txt", "a2\n"), self._plan("b.txt", "b2\n")]
+        (self.tmp_dir / "b.txt").write_text("external\n", encoding="utf-8")
+        out = apply_run(json.dumps({
+            "diff": "".join(p["diff"] for p in plans),
+            "base_hashes": {p["path"]: p["base_hash"] for p in plans},
+        }))
+        self.assertIn("conflict", out)
+        self.assertIn("b.txt", out)
+        self.assertEqual((self.tmp_dir / "a.txt").read_text(), "a1\n")
+
+    def test_rename_failure_rolls_back(self):
+        from tools.edit import apply_patch
+        (self.tmp_dir / "a.txt").write_text("a1\n", encoding="utf-8")
+        plans = [self._plan("a.txt", "a2\n"), self._plan("c.txt", "c\n")]
+        real_replace = os.replace
+        calls = []
+
+        def flaky(src, dst):
+            calls.append(dst)
+            if str(dst).endswith("c.txt"):
+                raise OSError("disk full")
+            return real_replace(src, dst)
+
+        with mock.patch.object(apply_patch.os, "replace", side_effect=flaky):
+            out = apply_patch.run("".join(p["diff"] for p in plans))
+        self.assertIn("disk full", out)
+        self.assertEqual((self.tmp_dir / "a.txt").read_text(), "a1\n")
+        self.assertFalse((self.tmp_dir / "c.txt").exists())
+        self.assertEqual([p.name for p in self.tmp_dir.iterdir()], ["a.txt"])
+        self.assertFalse(apply_patch.JOURNAL.exists())
+
+    def test_recover_interrupted_journal(self):
+        from tools.edit import apply_patch
+        a = self.tmp_dir / "a.txt"
+        a.write_text("half-applied\n", encoding="utf-8")
+        created = self.tmp_dir / "created.txt"
+        created.write_text("new\n", encoding="utf-8")
+        apply_patch.TXN_DIR.mkdir(parents=True, exist_ok=True)
+        backup = apply_patch.TXN_DIR / "test.0.bak"
+        backup.write_text("original\n", encoding="utf-8")
+        apply_patch._write_journal({"txid": "test", "entries": [
+            {"path": str(a), "tmp": str(self.tmp_dir / ".a.txt.test.tmp"), "backup": str(backup), "created": False},
+            {"path": str(created), "tmp": str(self.tmp_dir / ".created.txt.test.tmp"), "backup": None, "created": True},
+        ]})
+        restored = apply_patch.recover()
+        self.assertEqual(len(restored), 2)
+        self.assertEqual(a.read_text(), "original\n")
+        self.assertFalse(created.exists())
+        self.assertFalse(backup.exists())
+        self.assertFalse(apply_patch.JOURNAL.exists())
+
+
+if __name__ == "__main__":
+    unittest.main()
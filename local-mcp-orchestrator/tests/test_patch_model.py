@@ -0,0 +1,71 @@
+import hashlib
+import json
+import tempfile
+import unittest
+from pathlib import Path
+
+
+DIFF = (
+    "--- a/f.txt\n+++ b/f.txt\n"
+    "@@ -1,3 +1,3 @@\n a\n-b\n+B\n c\n"
+    "@@ -8 +8,2 @@\n h\n+i\n"
+)
+
+
+class TestPatchModel(unittest.TestCase):
+    def test_parse_render_and_reverse(self):
+        from tools.edit.patch_model import Patch
+        patch = Patch.parse(DIFF)
+        (fd,) = patch
+        self.assertEqual((fd.rel, fd.mode, fd.counts()), ("f.txt", "modify", (2, 1)))
+        self.assertEqual(fd.headers[1], {"a_start": 8, "a_count": 1, "b_start": 8, "b_count": 2})
+        self.assertEqual(patch.text(), DIFF)
+        rev = patch.reversed()
+        self.assertEqual(rev.files[0].hunks[0].lines, [" a\n", "-B\n", "+b\n", " c\n"])
+        self.assertEqual(rev.files[0].headers[1]["a_count"], 2)
+        self.assertEqual(rev.reversed().text(), DIFF)
+
+    def test_apply_reverse_and_hash_after(self):
+        from tools.edit.apply_patch import apply_files, run as apply_run
+        from tools.edit.patch_model import Patch
+        root = Path(__file__).resolve().parents[1]
+        tmp = tempfile.TemporaryDirectory(prefix="test_", dir=root / "tmp")  # ApplyPatch stays inside the workspace
+        self.addCleanup(tmp.cleanup)
+        p = Path(tmp.name) / "patch_model.txt"
+        orig = "a\nb\nc\nd\ne\nf\ng\nh\n"
+        p.write_text(orig)
+        rel = str(p.relative_to(root))
+        patch = Patch.parse(DIFF.replace("f.txt", rel))
+        # one parsed patch serves the dry run and the real apply
+        (dry,) = apply_files(patch, dry_run=True)
+        self.assertEqual(p.read_text(), orig)
+        (s,) = apply_files(patch)
+        self.assertEqual(s.hash_after, hashlib.sha256(p.read_bytes()).hexdigest())
+        self.assertEqual(s.new_text, dry.new_text)
+        out = apply_run(json.dumps({"diff": patch.text(), "reverse": True}))
+        self.assertIn("ok: 1 file(s) updated", out)
+        self.assertEqual(p.read_text(), orig)
+        footer = json.loads(out.splitlines()[-1])
+        self.assertEqual(footer["hash_after"], hashlib.sha256(orig.encode()).hexdigest())
+
+    def test_removed_lines_that_look_like_headers(self):
+        from tools.edit.apply_patch import run as apply_run
+        from tools.edit.patch_model import Patch
+        from tools.edit.plan_patch import plan_patch
+        root = Path(__file__).resolve().parents[1]
+        tmp = tempfile.TemporaryDirectory(prefix="test_", dir=root / "tmp")  # ApplyPatch stays inside the workspace
+        self.addCleanup(tmp.cleanup)
+        p = Path(tmp.name) / "patch_model.sql"
+        p.write_text("-- old comment\n++ kept\nSELECT 1;\n")
+        rel = str(p.relative_to(root))
+        plan = plan_patch({"files": [{"path": rel, "new_content": "-- new comment\n++ kept\nSELECT 1;\n"}]})
+        self.assertIn("\n--- old comment\n", plan["diff"])
+        # the removal is hunk body, and the next file's header still starts a new file
+        two = Patch.parse(plan["diff"] + plan["diff"].replace(rel, rel + ".other"))
+        self.assertEqual([fd.hunks[0].lines[0] for fd in two], ["--- old comment\n"] * 2)
+        self.assertIn("ok: 1 file(s) updated", apply_run(json.dumps({"diff": plan["diff"]})))
+        self.assertEqual(p.read_text(), "-- new comment\n++ kept\nSELECT 1;\n")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,57 @@
+import json
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+
+ROOT = Path(__file__).resolve().parents[1]
+
+
+class TestPlanBatch(unittest.TestCase):
+    def setUp(self):
+        # ApplyPatch only writes inside the workspace; tmp/test_* is gitignored
+        self._tmp = tempfile.TemporaryDirectory(prefix="test_", dir=ROOT / "tmp")
+        self.addCleanup(self._tmp.cleanup)
+        self.dir = Path(self._tmp.name)
+        (self.dir / "a.py").write_text("x = 1\ny = 2\n")
+        (self.dir / "b.txt").write_text("no newline")
+        self.rel = str(self.dir.relative_to(ROOT))
+
+    def _plan_and_apply(self):
+        from tools.edit.plan_patch import run as plan_run
+        from tools.edit.apply_patch import run as apply_run
+        plan = json.loads(plan_run(json.dumps({"files": [
+            {"path": f"{self.rel}/a.py", "new_content": "x = 1\ny = 3\n"},
+            {"path": f"{self.rel}/b.txt", "new_content": "still no newline"},
+            {"path": f"{self.rel}/c.txt", "new_content": "new\n"},
+            {"path": f"{self.rel}/missing.txt", "new_content": ""},  # nothing to do
+        ]})))
+        self.assertEqual(len(plan["files"]), 4)
+        self.assertEqual(set(plan["base_hashes"]), {f"{self.rel}/a.py", f"{self.rel}/b.txt"})
+        self.assertIn("\\ No newline at end of file\n--- ", plan["diff"])
+        out = apply_run(json.dumps(plan))
+        self.assertIn("ok: 3 file(s) updated", out)
+        self.assertEqual((self.dir / "a.py").read_text(), "x = 1\ny = 3\n")
+        self.assertEqual((self.dir / "b.txt").read_text(), "still no newline")
+        self.assertEqual((self.dir / "c.txt").read_text(), "new\n")
+
+    def test_serial(self):
+        self._plan_and_apply()
+
+    def test_process_pool(self):
+        with mock.patch("tools.edit.plan_patch.PARALLEL_MIN_BYTES", 0), \
+                mock.patch("tools.edit.plan_patch.PLAN_WORKERS", 2):
+            self._plan_and_apply()
+
+    def test_errors(self):
+        from tools.edit.plan_patch import plan_patch
+        self.assertIn("error", plan_patch({"files": []}))
+        dup = plan_patch({"files": [{"path": "x.txt", "new_content": ""}, {"path": "./x.txt", "new_content": ""}]})
+        self.assertIn("more than once", dup["error"])
+        bad = plan_patch({"files": [{"path": "../outside.txt", "new_content": "x"}]})
+        self.assertIn("../outside.txt: path escapes workspace", bad["error"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,79 @@
+import json
+import os
+import sys
+import unittest
+from unittest import mock
+
+
+class TestBoundedCapture(unittest.TestCase):
+    def test_keeps_head_and_tail(self):
+        from tools.proc_runner import BoundedCapture
+        cap = BoundedCapture(head=5, tail=5)
+        for i in range(1000):
+            cap.feed(f"{i:04d}")
+        self.assertEqual(cap.total, 4000)
+        self.assertEqual(cap.omitted, 3990)
+        self.assertEqual(cap.text(), "00000\n…(3990 chars omitted)…\n80999")
+        small = BoundedCapture(head=5, tail=5)
+        small.feed("abcdefgh")
+        self.assertEqual((small.text(), small.omitted), ("abcdefgh", 0))
+
+
+class TestRunBounded(unittest.TestCase):
+    def test_tail_survives_and_output_is_live(self):
+        from tools.proc_runner import run_bounded
+        code = ("import sys\nfor i in range(20000): print('line', i)\n"
+                "print('FINAL ERROR', file=sys.stderr)\nsys.exit(2)")
+        seen = []
+        res = run_bounded([sys.executable, "-c", code], timeout=30, limit=300,
+                          on_output=lambda stream, text: seen.append(stream))
+        self.assertEqual(res.returncode, 2)
+        self.assertTrue(res.truncated)
+        self.assertTrue(res.stdout.startswith("line 0\n"))
+        self.assertTrue(res.stdout.endswith("line 19999\n"))
+        self.assertLess(len(res.stdout), 400)
+        self.assertEqual(res.stderr, "FINAL ERROR\n")
+        self.assertGreater(res.stdout_bytes, 200000)
+        self.assertIn("stderr", seen)
+
+    def test_timeout_keeps_partial_output(self):
+        from tools.proc_runner import run_bounded
+        res = run_bounded([sys.executable, "-c", "import time; print('started', flush=True); time.sleep(30)"],
+                          timeout=0.5)
+        self.assertTrue(res.timed_out)
+        self.assertIsNone(res.returncode)
+        self.assertEqual(res.stdout, "started\n")
+
+    def test_resource_usage_rlimits_and_metrics_log(self):
+        from tools import proc_runner
+        log = proc_runner.CACHE_DIR / "test_metrics.jsonl"
+        log.unlink(missing_ok=True)
+        with mock.patch.object(proc_runner, "METRICS_PATH", log):
+            res = proc_runner.run_bounded(
+                [sys.executable, "-c", "b = bytearray(40 * 1024 * 1024)\nwhile True: pass"],
+                timeout=30, rlimits={"cpu": 1}, tool="test")
+        self.assertEqual(res.returncode, -24)  # SIGXCPU from RLIMIT_CPU
+        self.assertGreaterEqual(res.user_s + res.sys_s, 0.5)  # the limit is enforced at tick granularity
+        self.assertGreater(res.max_rss_kb, 40 * 1024)
+        entry = json.loads(log.read_text().splitlines()[-1])
+        self.assertEqual((entry["tool"], entry["returncode"], entry["max_rss_kb"]), ("test", -24, res.max_rss_kb))
+        log.unlink()
+        self.assertIn("peak rss", proc_runner.format_result("t", res, 30, 6000).splitlines()[0])
+
+    def test_fatal_output_cap_kills_early(self):
+        from tools.shell_exec import run
+        with mock.patch.dict(os.environ, {"GPT_CODE_OUTPUT_KILL_MB": "0.5"}):
+            out = run("yes", timeout=20)
+        self.assertTrue(out.startswith("[sh] killed after"), out[:100])
+
+
+    def test_parsing_callers_can_opt_out_of_the_fatal_cap(self):
+        from tools import proc_runner
+        with mock.patch.dict(os.environ, {"GPT_CODE_OUTPUT_KILL_MB": "0.5"}):
+            res = proc_runner.run_bounded(["sh", "-c", "yes | head -c 2000000"], timeout=20, limit=None,
+                                          kill_after_bytes=0)
+        self.assertEqual((res.returncode, res.output_limited, len(res.stdout)), (0, False, 2000000))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,82 @@
+import json
+import unittest
+
+
+class TestPySession(unittest.TestCase):
+    def setUp(self):
+        from tools import py_session
+        self.ps = py_session
+        self.sess = py_session.PySession("test", mem_mb=512)
+
+    def tearDown(self):
+        self.sess.shutdown()
+
+    def test_state_persists_and_trailing_expression_is_shown(self):
+        self.assertEqual(self.sess.run("import math\nx = 41", timeout=10)["rc"], 0)
+        res = self.sess.run("x += 1\nmath.sqrt(x * x)", timeout=10)
+        self.assertEqual((res["rc"], res["out"], res["call"]), (0, "42.0\n", 2))
+        res = self.sess.run("raise SystemExit(3)", timeout=10)
+        self.assertEqual(res["rc"], 3)
+        self.assertEqual(self.sess.run("print(x, _)", timeout=10)["out"], "42 42.0\n")
+
+    def test_traceback_points_at_the_snippet(self):
+        res = self.sess.run("def f():\n    raise KeyError('k')\nf()", timeout=10)
+        self.assertEqual(res["rc"], 1)
+        self.assertTrue(res["err"].startswith("Traceback"))
+        self.assertIn('File "<session>", line 2, in f', res["err"])
+        self.assertNotIn("py_session.py", res["err"])
+
+    def test_tools_modules_do_not_shadow_the_workspace(self):
+        code = "import sys\nsorted(n for n in sys.modules if n.split('.')[0] in {'proc_runner', 'pyexec_pool', 'index'})"
+        self.assertEqual(self.sess.run(code, timeout=10)["out"], "[]\n")
+
+    def test_timeout_interrupts_but_keeps_state(self):
+        self.sess.run("keep = [1, 2, 3]", timeout=10)
+        res = self.sess.run("import time\nwhile True:\n    time.sleep(0.05)", timeout=0.3)
+        self.assertTrue(res["timeout"] and res["interrupted"])
+        self.assertIn("KeyboardInterrupt", res["err"])
+        self.assertEqual(self.sess.run("sum(keep)", timeout=10)["out"], "6\n")
+
+    def test_fatal_output_cap_interrupts_but_keeps_state(self):
+        import os
+        from unittest import mock
+        self.sess.run("keep = 7", timeout=10)
+        with mock.patch.dict(os.environ, {"GPT_CODE_OUTPUT_KILL_MB": "0.5"}):
+            res = self.sess.run('while True:\n    print("x" * 1000)', timeout=10)
+        self.assertTrue(res["output_limited"] and res["interrupted"])
+        self.assertNotIn("timeout", res)
+        self.assertIn("stopped after", self.ps._format("test", res, 10))
+        self.assertEqual(self.sess.run("keep", timeout=10)["out"], "7\n")
+
+    def test_unresponsive_kernel_is_killed_and_restarted(self):
+        code = "import signal, time\nsignal.signal(signal.SIGINT, signal.SIG_IGN)\ntime.sleep(30)"
+        old = self.ps.INTERRUPT_GRACE
+        self.ps.INTERRUPT_GRACE = 0.2
+        try:
+            res = self.sess.run(code, timeout=0.2)
+        finally:
+            self.ps.INTERRUPT_GRACE = old
+        self.assertTrue(res["killed"])
+        res = self.sess.run("1 + 1", timeout=10)
+        self.assertEqual((res["out"], res["restarted"]), ("2\n", True))
+
+    def test_memory_limit(self):
+        res = self.sess.run("b = bytearray(2 * 1024 ** 3)", timeout=10)
+        self.assertIn("MemoryError", res["err"])
+        self.assertEqual(self.sess.run("'b' in globals()", timeout=10)["out"], "False\n")
+
+    def test_run_wrapper_actions(self):
+        try:
+            self.assertIn("returncode=0", self.ps.run(json.dumps({"session": "t-wrap", "code": "y = 5"})))
+            self.assertIn("5", self.ps.run(json.dumps({"session": "t-wrap", "code": "y"})))
+            names = [s["name"] for s in json.loads(self.ps.run('{"action": "list"}'))["sessions"]]
+            self.assertIn("t-wrap", names)
+            self.assertIn("reset", self.ps.run(json.dumps({"session": "t-wrap", "action": "reset"})))
+            self.assertIn("NameError", self.ps.run(json.dumps({"session": "t-wrap", "code": "y"})))
+            self.assertIn("invalid session name", self.ps.run(json.dumps({"session": "../x", "code": "1"})))
+        finally:
+            self.ps.close_session("t-wrap")
+
+
+if __name__ == "__main__":
+    unittest.main()
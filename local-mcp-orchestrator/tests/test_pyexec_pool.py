@@ -0,0 +1,79 @@
+import os
+import subprocess
+import tempfile
+import unittest
+from pathlib import Path
+
+
+ROOT = Path(__file__).resolve().parents[1]
+
+
+class TestForkServer(unittest.TestCase):
+    def setUp(self):
+        from tools.pyexec_pool import ForkServer
+        # the template only preloads modules inside the workspace; tmp/test_* is gitignored
+        self._tmp = tempfile.TemporaryDirectory(prefix="test_", dir=ROOT / "tmp")
+        self.src = Path(self._tmp.name)
+        (self.src / "mod.py").write_text("VALUE = 1\nprint('import side effect')\n")
+        self.srv = ForkServer(self.src)
+
+    def tearDown(self):
+        self.srv.shutdown()
+        self._tmp.cleanup()
+
+    def test_runs_like_python_c(self):
+        for code in ["import sys; print('out'); print('err', file=sys.stderr); print(__name__, sys.argv)",
+                     "def f():\n    raise KeyError('x')\nf()",
+                     "raise SystemExit(3)",
+                     "import os; os.system('echo from child')"]:
+            ref = subprocess.run(["python3", "-c", code], capture_output=True, text=True, cwd=str(ROOT))
+            rc, out, err, usage = self.srv.run(code, timeout=10, cwd=str(ROOT))
+            self.assertEqual((rc, out, err), (ref.returncode, ref.stdout, ref.stderr))
+            self.assertEqual(usage["stdout_bytes"], len(ref.stdout.encode()))
+            self.assertGreater(usage["max_rss_kb"], 0)
+
+    def test_no_state_leaks_and_stale_modules_reload(self):
+        code = f"from tmp.{self.src.name} import mod\nmod.VALUE += 1\nprint(mod.VALUE)"
+        self.assertEqual(self.srv.run(code, timeout=10, cwd=str(ROOT))[1], "2\n")
+        self.assertEqual(self.srv.run(code, timeout=10, cwd=str(ROOT))[1], "2\n")
+        (self.src / "mod.py").write_text("VALUE = 10\n")
+        st = os.stat(self.src / "mod.py")
+        os.utime(self.src / "mod.py", ns=(st.st_atime_ns, st.st_mtime_ns + 10**9))
+        self.assertEqual(self.srv.run(code, timeout=10, cwd=str(ROOT))[1], "11\n")
+
+    def test_workspace_modules_are_not_shadowed_by_tools(self):
+        (self.src / "index.py").write_text("WHO = 'workspace'\n")
+        for code in ["import index\nprint(index.WHO)", "import proc_runner"]:
+            ref = subprocess.run(["python3", "-c", code], capture_output=True, text=True, cwd=str(self.src))
+            rc, out, err, _ = self.srv.run(code, timeout=10, cwd=str(self.src))
+            self.assertEqual((rc, out, err), (ref.returncode, ref.stdout, ref.stderr))
+
+    def test_timeout_and_cap(self):
+        rc, _, _, _ = self.srv.run("import time; time.sleep(30)", timeout=0.5)
+        self.assertIsNone(rc)
+        rc, out, _, _ = self.srv.run("print('head' + 'x' * 100000 + 'tail')", timeout=10, cap=60)
+        self.assertEqual(rc, 0)
+        self.assertTrue(out.startswith("headxx") and out.endswith("xxtail\n"))
+        self.assertIn("bytes omitted", out)
+        self.assertLess(len(out), 120)
+
+    def test_rlimits_apply_to_forked_workers(self):
+        from unittest import mock
+        code = "import resource; print(resource.getrlimit(resource.RLIMIT_CPU)[0], resource.getrlimit(resource.RLIMIT_NOFILE)[0])"
+        with mock.patch.dict(os.environ, {"GPT_CODE_RLIMIT_CPU_S": "7", "GPT_CODE_RLIMIT_NOFILE": "64"}):
+            self.assertEqual(self.srv.run(code, timeout=10, cwd=str(ROOT))[1], "7 64\n")
+        self.assertNotEqual(self.srv.run(code, timeout=10, cwd=str(ROOT))[1], "7 64\n")  # the template is unlimited
+
+    def test_fatal_output_cap_kills_early(self):
+        import time
+        from unittest import mock
+        from tools import code_exec
+        with mock.patch.dict(os.environ, {"GPT_CODE_OUTPUT_KILL_MB": "0.5"}):
+            start = time.monotonic()
+            out = code_exec.run('while True: print("x" * 1000)', timeout=10)
+        self.assertTrue(out.startswith("[code_exec] killed after"), out[:100])
+        self.assertLess(time.monotonic() - start, 5)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,118 @@
+import sys
+import tempfile
+import textwrap
+import unittest
+from pathlib import Path
+
+
+# Minimal stdio LSP server: publishes one error per line containing "BAD", plus one for
+# "import x" while x's text contains "RENAMED"; importers are re-published late, like a recheck
+FAKE_SERVER = textwrap.dedent('''
+    import json, sys, time
+
+    docs = {}
+
+    def read():
+        length = None
+        while True:
+            line = sys.stdin.buffer.readline()
+            if not line:
+                sys.exit(0)
+            line = line.strip()
+            if not line:
+                break
+            if line.lower().startswith(b"content-length:"):
+                length = int(line.split(b":")[1])
+        return json.loads(sys.stdin.buffer.read(length))
+
+    def send(msg):
+        body = json.dumps(msg).encode()
+        sys.stdout.buffer.write(b"Content-Length: %d\\r\\n\\r\\n" % len(body) + body)
+        sys.stdout.buffer.flush()
+
+    def publish(uri, version):
+        text = docs[uri]
+        diags = [{"range": {"start": {"line": i, "character": 0}, "end": {"line": i, "character": 1}},
+                  "severity": 1, "message": "bad line", "code": "fake"}
+                 for i, ln in enumerate(text.splitlines()) if "BAD" in ln]
+        for other, other_text in docs.items():
+            stem = other.rsplit("/", 1)[-1][:-3]
+            if f"import {stem}" in text and "RENAMED" in other_text:
+                diags.append({"range": {"start": {"line": 0, "character": 0}, "end": {"line": 0, "character": 1}},
+                              "severity": 1, "message": "missing name", "code": "dep"})
+        send({"jsonrpc": "2.0", "method": "textDocument/publishDiagnostics",
+              "params": {"uri": uri, "version": version, "diagnostics": diags}})
+
+    versions = {}
+    while True:
+        msg = read()
+        m = msg.get("method")
+        if m == "initialize":
+            send({"jsonrpc": "2.0", "id": 900, "method": "workspace/configuration",
+                  "params": {"items": [{"section": "python"}]}})
+            send({"jsonrpc": "2.0", "id": msg["id"], "result": {"capabilities": {}}})
+        elif m in ("textDocument/didOpen", "textDocument/didChange"):
+            doc = msg["params"]["textDocument"]
+            docs[doc["uri"]] = doc.get("text") or msg["params"]["contentChanges"][0]["text"]
+            versions[doc["uri"]] = doc["version"]
+            publish(doc["uri"], doc["version"])
+            if m == "textDocument/didChange":
+                stem = doc["uri"].rsplit("/", 1)[-1][:-3]
+                time.sleep(0.2)
+                for uri, text in docs.items():
+                    if f"import {stem}" in text:
+                        publish(uri, versions[uri])
+        elif m == "shutdown":
+            send({"jsonrpc": "2.0", "id": msg["id"], "result": None})
+        elif m == "exit":
+            sys.exit(0)
+''')
+
+
+class TestPyrightServer(unittest.TestCase):
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.root = Path(self._tmp.name)
+        fake = self.root / "fake_lsp.py"
+        fake.write_text(FAKE_SERVER, encoding="utf-8")
+        (self.root / "a.py").write_text("ok\nBAD\n", encoding="utf-8")
+        (self.root / "b.py").write_text("ok\n", encoding="utf-8")
+        from tools.lsp.pyright_server import PyrightServer
+        self.srv = PyrightServer(self.root, settings={"python": {"venvPath": "/x"}}, cmd=[sys.executable, str(fake)])
+        self.srv.start(timeout=10)
+
+    def tearDown(self):
+        self.srv.shutdown()
+        self._tmp.cleanup()
+
+    def test_diagnostics_are_cached_until_content_changes(self):
+        res = self.srv.diagnostics(["a.py", "b.py"], timeout=10)
+        self.assertEqual(res["changed"], 2)
+        self.assertEqual([(d["line"], d["severity"], d["rule"]) for d in res["diagnostics"]], [(1, "error", "fake")])
+        self.assertTrue(res["diagnostics"][0]["path"].endswith("a.py"))
+
+        again = self.srv.diagnostics(["a.py", "b.py"], timeout=10)
+        self.assertEqual((again["changed"], again["cached"]), (0, 2))
+        self.assertEqual(len(again["diagnostics"]), 1)
+
+        (self.root / "b.py").write_text("BAD\nBAD\n", encoding="utf-8")
+        third = self.srv.diagnostics(["b.py"], timeout=10)
+        self.assertEqual(third["changed"], 1)
+        self.assertEqual(len(third["diagnostics"]), 2)
+        self.assertEqual(third["pending"], [])
+
+
+    def test_waits_for_importers_of_an_edited_file(self):
+        (self.root / "c.py").write_text("import a\n", encoding="utf-8")
+        first = self.srv.diagnostics(["a.py", "b.py", "c.py"], timeout=10)
+        self.assertEqual(len(first["diagnostics"]), 1)
+        (self.root / "a.py").write_text("RENAMED\n", encoding="utf-8")
+        res = self.srv.diagnostics(["a.py", "b.py", "c.py"], timeout=10)
+        self.assertEqual((res["changed"], res["cached"]), (1, 2))
+        self.assertEqual([(Path(d["path"]).name, d["rule"]) for d in res["diagnostics"]], [("c.py", "dep")])
+        # b.py does not import a.py, so it is never re-published: answered after the quiet period, but stale
+        self.assertEqual([Path(p).name for p in res["stale"]], ["b.py"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,87 @@
+import os
+import tempfile
+import unittest
+from pathlib import Path
+
+
+class TestResidentTests(unittest.TestCase):
+    def setUp(self):
+        from tools.index.imports import ImportGraph
+        from tools.index.symbols import SymbolIndex
+        from tools.testing.affected import AffectedTests
+        from tools.testing.resident import ResidentTests
+        self._tmp = tempfile.TemporaryDirectory()
+        self.root = Path(self._tmp.name)
+        self.write("src/calc.py", "def add(a, b):\n    return a + b\n")
+        self.write("src/mid.py", "from src.calc import add\n\ndef twice(a):\n    return add(a, a)\n")
+        self.write("tests/test_calc.py", "import unittest\nfrom src.calc import add\n\nclass T(unittest.TestCase):\n"
+                                         "    def test_add(self):\n        self.assertEqual(add(1, 2), 3)\n")
+        self.write("tests/test_mid.py", "import unittest\nfrom src import mid\n\nclass T(unittest.TestCase):\n"
+                                        "    def test_twice(self):\n        self.assertEqual(mid.twice(2), 4)\n")
+        self.graph = ImportGraph(SymbolIndex(self.root, self.root / ".cache" / "symbols.json"))
+        self.tracker = AffectedTests(self.root, state_dir=self.root / ".cache", graph=self.graph)
+        self.resident = ResidentTests(self.root)
+        self.modules = ["tests.test_calc", "tests.test_mid"]
+
+    def tearDown(self):
+        self.resident.shutdown()
+        self._tmp.cleanup()
+
+    def write(self, rel, text):
+        p = self.root / rel
+        p.parent.mkdir(parents=True, exist_ok=True)
+        p.write_text(text, encoding="utf-8")
+
+    def run_tests(self, snapshot=None, timeout=30):
+        snap = snapshot if snapshot is not None else self.tracker.snapshot()
+        return self.resident.run(self.modules, timeout, snap, self.graph)
+
+    def test_reuses_template_and_purges_changed_modules_with_importers(self):
+        res, records, info = self.run_tests()
+        self.assertEqual((res.returncode, info["reason"]), (0, "started"))
+        self.assertEqual([r["status"] for r in records], ["passed", "passed"])
+        pid = self.resident.proc.pid
+        self.write("src/calc.py", "def add(a, b):\n    return a + b + 1  # off by one\n")
+        res, records, info = self.run_tests()
+        self.assertEqual((info["fresh"], self.resident.proc.pid), (False, pid))
+        self.assertEqual(info["purged"], 6)  # src.calc, src.mid (+ their src-layout aliases) and both test modules
+        self.assertEqual(res.returncode, 1)
+        self.assertEqual([r["status"] for r in records], ["failed", "failed"])
+        self.assertIn("AssertionError: 4 != 3", records[0]["message"])
+
+    def test_unpurged_change_and_config_change_start_fresh(self):
+        snap = self.tracker.snapshot()
+        self.run_tests(snap)
+        self.write("src/calc.py", "def add(a, b):\n    return a - b  # changed behind the graph\n")
+        self.tracker.snapshot()  # refresh the index, but hand the template the old state
+        res, records, info = self.run_tests(snap)
+        self.assertTrue(info["fresh"])
+        self.assertTrue(info["reason"].startswith("stale module: "), info["reason"])
+        self.assertEqual(res.returncode, 1)
+        self.write("tests/conftest.py", "X = 1\n")
+        _, _, info = self.run_tests()
+        self.assertEqual(info["reason"], "config changed: tests/conftest.py")
+
+    def test_timeout_kills_the_child_only(self):
+        self.write("tests/test_mid.py", "import time, unittest\n\nclass T(unittest.TestCase):\n"
+                                        "    def test_slow(self):\n        time.sleep(30)\n")
+        res, records, _ = self.run_tests(timeout=1)
+        self.assertTrue(res.timed_out)
+        self.assertEqual(records, [])
+        self.assertTrue(self.resident.alive())
+        self.modules = ["tests.test_calc"]
+        res, records, info = self.run_tests()
+        self.assertEqual((res.returncode, info["fresh"]), (0, False))
+
+    def test_rlimits_apply_to_test_children(self):
+        from unittest import mock
+        self.write("tests/test_mid.py", "import resource, unittest\n\nclass T(unittest.TestCase):\n"
+                                        "    def test_limit(self):\n"
+                                        "        self.assertEqual(resource.getrlimit(resource.RLIMIT_NOFILE)[0], 64)\n")
+        with mock.patch.dict(os.environ, {"GPT_CODE_RLIMIT_NOFILE": "64"}):
+            res, records, _ = self.run_tests()
+        self.assertEqual([r["status"] for r in records], ["passed", "passed"])
+
+
+if __name__ == "__main__":
+    unittest.main()
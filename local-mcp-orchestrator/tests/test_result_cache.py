@@ -0,0 +1,57 @@
+import unittest
+
+
+class TestResultCache(unittest.TestCase):
+    def test_pages_until_exhausted(self):
+        from tools.index.result_cache import ResultCache
+        cache = ResultCache()
+        items = list(range(7))
+        cursor = cache.put(items, "fp1", {"tool": "ripgrep"}, offset=3)
+        page, cursor, info = cache.page(cursor, "fp1", 3, tool="ripgrep")
+        self.assertEqual(page, [3, 4, 5])
+        self.assertEqual(info["total"], 7)
+        self.assertIsNotNone(cursor)
+        page, cursor, _ = cache.page(cursor, "fp1", 3, tool="ripgrep")
+        self.assertEqual(page, [6])
+        self.assertIsNone(cursor)
+
+    def test_workspace_change_invalidates(self):
+        from tools.index.result_cache import ResultCache, CursorError
+        cache = ResultCache()
+        cursor = cache.put([1, 2, 3], "fp1", {"tool": "ripgrep"}, offset=1)
+        with self.assertRaises(CursorError):
+            cache.page(cursor, "fp2", 1, tool="ripgrep")
+        # the stale entry is gone for good
+        with self.assertRaises(CursorError):
+            cache.page(cursor, "fp1", 1, tool="ripgrep")
+
+    def test_expired_and_foreign_cursors(self):
+        from tools.index.result_cache import ResultCache, CursorError
+        cache = ResultCache(ttl=0.0)
+        cursor = cache.put([1, 2], "fp", {"tool": "impact_scan"}, offset=1)
+        with self.assertRaises(CursorError):
+            cache.page(cursor, "fp", 1, tool="impact_scan")
+        cache = ResultCache()
+        cursor = cache.put([1, 2], "fp", {"tool": "impact_scan"}, offset=1)
+        with self.assertRaises(CursorError):
+            cache.page(cursor, "fp", 1, tool="ripgrep")
+        with self.assertRaises(CursorError):
+            cache.page("not-a-cursor", "fp", 1, tool="ripgrep")
+
+    def test_fingerprint_tracks_edits(self):
+        import os
+        import tempfile
+        from pathlib import Path
+        from tools.index.workspace import fingerprint
+        with tempfile.TemporaryDirectory() as d:
+            f = Path(d) / "a.txt"
+            f.write_text("x")
+            before = fingerprint(d)
+            self.assertEqual(before, fingerprint(d))
+            f.write_text("xy")
+            os.utime(f, ns=(1, os.stat(d).st_mtime_ns + 10))
+            self.assertNotEqual(before, fingerprint(d))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,100 @@
+import json
+import tempfile
+import unittest
+from pathlib import Path
+
+
+class TestShard(unittest.TestCase):
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.root = Path(self._tmp.name)
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def test_plan_balances_by_cost(self):
+        from tools.testing.shard import plan_shards
+        cost = {"a": 5.0, "b": 3.0, "c": 2.0, "d": 2.0, "e": 1.0}
+        shards = plan_shards(list(cost), cost.__getitem__, 2)
+        self.assertEqual(sorted(sum(cost[t] for t in s) for s in shards), [6.0, 7.0])
+        self.assertEqual(plan_shards(["a"], cost.__getitem__, 4), [["a"]])
+
+    def test_history_is_a_running_average(self):
+        from tools.testing.shard import DEFAULT_COST, TestHistory
+        path = self.root / "history.json"
+        h = TestHistory(path, root=self.root)
+        self.assertEqual(h.estimate("tests/test_x.py"), DEFAULT_COST)
+        h.update([{"id": "tests.test_x.T.test_a", "file": "tests/test_x.py", "status": "passed", "time": 2.0},
+                  {"id": "tests.test_y.T.test_b", "file": "tests/test_y.py", "status": "passed", "time": 4.0}],
+                 ["tests/test_x.py", "tests/test_y.py"])
+        h = TestHistory(path, root=self.root)
+        h.update([{"id": "tests.test_x.T.test_a", "file": "tests/test_x.py", "status": "failed", "time": 4.0}],
+                 ["tests/test_x.py"])
+        self.assertEqual(h.estimate("tests/test_x.py"), 3.0)
+        self.assertEqual(h.estimate("tests/test_new.py"), 3.5)  # mean of known files
+        self.assertEqual(h.tests["tests.test_x.T.test_a"]["fails"], 1)
+        self.assertEqual(TestHistory(path, root=self.root / "other").files, {})
+
+    def test_failed_then_new_then_fastest_first(self):
+        from tools.testing.shard import TestHistory
+        h = TestHistory(self.root / "history.json", root=self.root)
+        h.update([{"id": "tests.test_slow.T.test_a", "file": "tests/test_slow.py", "status": "passed", "time": 3.0},
+                  {"id": "tests.test_fast.T.test_a", "file": "tests/test_fast.py", "status": "passed", "time": 0.1},
+                  {"id": "tests.test_bad.T.test_a", "file": "tests/test_bad.py", "status": "failed", "time": 5.0}],
+                 ["tests/test_slow.py", "tests/test_fast.py", "tests/test_bad.py"])
+        files = ["tests/test_fast.py", "tests/test_new.py", "tests/test_slow.py", "tests/test_bad.py"]
+        self.assertEqual(sorted(files, key=h.rank),
+                         ["tests/test_bad.py", "tests/test_new.py", "tests/test_fast.py", "tests/test_slow.py"])
+
+    def write_tests(self, bodies):
+        (self.root / "tests").mkdir(exist_ok=True)
+        for name, methods in bodies.items():
+            src = "import unittest\n\nclass T(unittest.TestCase):\n"
+            for meth, body in methods.items():
+                src += f"    def {meth}(self):\n        {body}\n"
+            (self.root / "tests" / f"test_{name}.py").write_text(src, encoding="utf-8")
+
+    def test_unittest_shards_are_merged(self):
+        from tools.testing.shard import TestHistory, run_shards
+        from tools.tests import summarize
+        self.write_tests({"a": {"test_a": "self.assertTrue(True)"},
+                          "b": {"test_b": "self.assertEqual(1, 2)", "test_skip": "self.skipTest('later')"},
+                          "c": {"test_c": "import no_such_module"}})
+        tests = ["tests/test_a.py", "tests/test_b.py", "tests/test_c.py"]
+        history = TestHistory(self.root / "history.json", root=self.root)
+        shards, res = run_shards("unittest", tests, timeout=60, workers=2, history=history, cwd=self.root)
+        self.assertEqual(len(shards), 2)
+        self.assertEqual(res.returncode, 1)
+        self.assertIn("[shard 1/2]", res.stderr)
+        results = [r for s in shards for r in s.results]
+        data = json.loads(summarize("unittest", res.returncode, res.stdout, res.stderr, results))
+        self.assertEqual(data["summary"], {"collected": 4, "passed": 1, "failed": 1, "errors": 1, "skipped": 1,
+                                           "duration_sec": data["summary"]["duration_sec"], "ok": False})
+        by_id = {f["id"]: f for f in data["failures"]}
+        self.assertEqual(by_id["tests.test_b.T.test_b"]["file"], "tests/test_b.py")
+        self.assertIn("AssertionError: 1 != 2", by_id["tests.test_b.T.test_b"]["message"])
+        self.assertIn("ModuleNotFoundError", by_id["tests.test_c.T.test_c"]["message"])
+        self.assertEqual(sorted(history.files), tests)
+
+    def test_previous_failures_run_first(self):
+        from tools.testing.shard import TestHistory, run_shards
+        self.write_tests({"a": {"test_1": "pass", "test_2": "pass", "test_3": "pass"}})
+        history = TestHistory(self.root / "history.json", root=self.root)
+        history.update([{"id": "tests.test_a.T.test_1", "file": "tests/test_a.py", "status": "passed", "time": 0.5},
+                        {"id": "tests.test_a.T.test_2", "file": "tests/test_a.py", "status": "passed", "time": 0.1},
+                        {"id": "tests.test_a.T.test_3", "file": "tests/test_a.py", "status": "error", "time": 0.9}],
+                       ["tests/test_a.py"])
+        shards, res = run_shards("unittest", ["tests/test_a.py"], timeout=60, workers=1, history=history, cwd=self.root)
+        self.assertEqual(res.returncode, 0)
+        self.assertEqual([r["id"].rsplit(".", 1)[-1] for r in shards[0].results], ["test_3", "test_2", "test_1"])
+
+    def test_pytest_summary_without_records(self):
+        from tools.tests import summarize
+        data = json.loads(summarize("pytest", 1, "..F\n[shard 2/2] x\n==== 1 failed, 2 passed in 0.50s ====\n"
+                                                 "3 passed, 1 skipped in 1.25s\n", ""))
+        self.assertEqual(data["summary"], {"failed": 1, "passed": 5, "skipped": 1, "collected": 7,
+                                           "duration_sec": 1.25, "ok": False})
+
+
+if __name__ == "__main__":
+    unittest.main()
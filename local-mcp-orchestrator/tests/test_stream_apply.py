@@ -0,0 +1,113 @@
+import json
+import tempfile
+import unittest
+from pathlib import Path
+
+
+ROOT = Path(__file__).resolve().parents[1]
+
+
+def _pieces(text, size=7, sent=None):
+    for i in range(0, len(text), size):
+        if sent is not None:
+            sent.append(i)
+        yield text[i:i + size]
+
+
+class TestStreamApply(unittest.TestCase):
+    def setUp(self):
+        # ApplyPatch only writes inside the workspace; tmp/test_* is gitignored
+        self._tmp = tempfile.TemporaryDirectory(prefix="test_", dir=ROOT / "tmp")
+        self.addCleanup(self._tmp.cleanup)
+        self.dir = Path(self._tmp.name)
+        self.rel = str(self.dir.relative_to(ROOT))
+        (self.dir / "a.txt").write_text("".join(f"line {i}\n" for i in range(1, 41)))
+        (self.dir / "b.txt").write_text("one\ntwo")
+
+    def _plan(self):
+        from tools.edit.plan_patch import plan_patch
+        a = (self.dir / "a.txt").read_text()
+        return plan_patch({"files": [
+            {"path": f"{self.rel}/a.txt", "new_content": a.replace("line 5\n", "five\n").replace("line 30\n", "")},
+            {"path": f"{self.rel}/b.txt", "new_content": "one\n2"},
+            {"path": f"{self.rel}/c.txt", "new_content": "new\n"},
+        ]})
+
+    def test_streamed_diff_is_verified_per_hunk_and_applied(self):
+        from tools.edit.stream_apply import consume
+        plan = self._plan()
+        events = []
+        out = consume(_pieces(plan["diff"]), base_hashes=plan["base_hashes"], on_hunk=events.append)
+        self.assertIn("ok: 3 file(s) updated", out)
+        self.assertEqual([(e["path"].rsplit("/", 1)[1], e["hunk"]) for e in events],
+                         [("a.txt", 1), ("a.txt", 2), ("b.txt", 1), ("c.txt", 1)])
+        self.assertIn("five\n", (self.dir / "a.txt").read_text())
+        self.assertNotIn("line 30\n", (self.dir / "a.txt").read_text())
+        self.assertEqual((self.dir / "b.txt").read_text(), "one\n2")
+        self.assertEqual((self.dir / "c.txt").read_text(), "new\n")
+        footer = json.loads(out.splitlines()[-1])
+        self.assertEqual(footer["mode"], "multi")
+
+    def test_removed_sql_comment_does_not_end_the_hunk(self):
+        from tools.edit.plan_patch import plan_patch
+        from tools.edit.stream_apply import consume
+        (self.dir / "d.sql").write_text("-- old comment\nSELECT 1;\n")
+        plan = plan_patch({"files": [{"path": f"{self.rel}/d.sql", "new_content": "SELECT 1;\n"}]})
+        out = consume(_pieces(plan["diff"]), base_hashes=plan["base_hashes"])
+        self.assertIn("ok: 1 file(s) updated", out)
+        self.assertEqual((self.dir / "d.sql").read_text(), "SELECT 1;\n")
+
+    def test_mismatch_stops_the_stream_early(self):
+        from tools.edit.stream_apply import consume
+        before = (self.dir / "a.txt").read_text()
+        bad = self._plan()["diff"].replace("-line 5\n", "-line five\n", 1)
+        sent = []
+        out = consume(_pieces(bad, sent=sent))
+        self.assertIn("aborted", out)
+        self.assertIn("mismatch while applying hunk 1", out)
+        self.assertLess(len(sent) * 7, len(bad) // 2)
+        self.assertEqual((self.dir / "a.txt").read_text(), before)
+        self.assertFalse((self.dir / "c.txt").exists())
+
+    def test_fallback_edit_stops_the_model_stream(self):
+        import contextlib
+        import io
+        import gpt_code_agent
+        state = {"parts": 0, "closed": False}
+
+        def fake_llama(prompt, stream=False, **kw):
+            self.assertTrue(stream)
+            self.assertIn("line 40", prompt)
+            try:
+                for piece in _pieces("```diff\n" + diff):
+                    state["parts"] += 1
+                    yield {"choices": [{"text": piece}]}
+            finally:
+                state["closed"] = True
+
+        diff = self._plan()["diff"].replace("-line 5\n", "-line five\n", 1)
+        with contextlib.redirect_stdout(io.StringIO()):
+            out = gpt_code_agent._stream_edit(fake_llama, f"{self.rel}/a.txt", "rename line 5")
+        self.assertIn("aborted", out)
+        self.assertTrue(state["closed"])
+        self.assertLess(state["parts"] * 7, len(diff) // 2)
+        self.assertNotIn("five", (self.dir / "a.txt").read_text())
+        diff = self._plan()["diff"]
+        with contextlib.redirect_stdout(io.StringIO()):
+            out = gpt_code_agent._stream_edit(fake_llama, f"{self.rel}/a.txt", "rename line 5")
+        self.assertIn("ok: 3 file(s) updated", out)
+
+    def test_changed_file_falls_back_at_finish(self):
+        from tools.edit.stream_apply import StreamingPatchSession
+        plan = self._plan()
+        s = StreamingPatchSession(base_hashes=plan["base_hashes"], dry_run=True)
+        s.feed(plan["diff"])
+        (self.dir / "b.txt").write_text("zero\none\ntwo")  # edited after its hunk was verified
+        staged = {st.rel.rsplit("/", 1)[1]: st for st in s.finish()}
+        self.assertEqual(staged["b.txt"].strategy, "merge3")
+        self.assertEqual(staged["b.txt"].new_text, "zero\none\n2")
+        self.assertEqual(staged["a.txt"].strategy, "unified_diff")
+
+
+if __name__ == "__main__":
+    unittest.main()
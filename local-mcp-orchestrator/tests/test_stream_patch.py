@@ -0,0 +1,94 @@
+import json
+import os
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+
+ROOT = Path(__file__).resolve().parents[1]
+
+
+def _lines(n, nl="\n"):
+    return "".join(f"row {i} = value_{i % 7}{nl}" for i in range(1, n + 1))
+
+
+class TestStreamPatch(unittest.TestCase):
+    """Files above the threshold go through the mmap planner/applier (threshold lowered to 1 KB here)."""
+
+    def setUp(self):
+        self.patches = [
+            mock.patch("tools.edit.plan_patch.MAX_BYTES", 1000),
+            mock.patch("tools.edit.apply_patch.STREAM_THRESHOLD", 1000),
+        ]
+        for p in self.patches:
+            p.start()
+        # ApplyPatch only writes inside the workspace; tmp/test_* is gitignored
+        self._tmp = tempfile.TemporaryDirectory(prefix="test_", dir=ROOT / "tmp")
+        self.dir = Path(self._tmp.name)
+
+    def tearDown(self):
+        for p in self.patches:
+            p.stop()
+        self._tmp.cleanup()
+
+    def _file(self, name, data: bytes) -> str:
+        p = self.dir / name
+        p.write_bytes(data)
+        return str(p.relative_to(ROOT))
+
+    def test_plan_and_apply_preserve_crlf_bom_and_mode(self):
+        from tools.edit.plan_patch import run as plan_run
+        from tools.edit.apply_patch import run as apply_run
+        text = "\ufeff" + _lines(400, "\r\n")
+        rel = self._file("crlf.txt", text.encode("utf-8"))
+        os.chmod(ROOT / rel, 0o755)
+        new = text.replace("row 200 = value_4\r\n", "row 200 = changed\r\n").replace("row 400 = value_1\r\n", "")
+        plan = json.loads(plan_run(json.dumps({"path": rel, "new_content": new})))
+        self.assertTrue(plan["streamed"])
+        self.assertIn("-row 200 = value_4\r\n+row 200 = changed\r\n", plan["diff"])
+        self.assertEqual(plan["diff"].count("@@ -"), 2)
+        out = apply_run(json.dumps(plan))
+        self.assertIn("ok: 1 file(s) updated", out)
+        self.assertIn('"strategy": "streamed"', out)
+        self.assertEqual((ROOT / rel).read_bytes(), new.encode("utf-8"))
+        self.assertTrue(os.stat(ROOT / rel).st_mode & 0o100)
+
+    def test_plan_edits_matches_in_memory_edits(self):
+        from tools.edit.edit_ops import apply_edits, plan_edits
+        from tools.edit.apply_patch import apply_unified_diff
+        text = _lines(300)
+        rel = self._file("edits.txt", text.encode())
+        edits = [
+            {"op": "insert_after", "line": 0, "text": "header"},
+            {"op": "replace_lines", "start": 10, "end": 12, "text": "ten to twelve"},
+            {"op": "search_replace", "search": "row 150 = value_3", "replace": "row 150 = x"},
+            {"op": "insert_after", "anchor": "row 300 = value_6", "text": "footer"},
+        ]
+        plan = plan_edits({"path": rel, "edits": edits})
+        self.assertTrue(plan["streamed"])
+        self.assertEqual(plan["edits"], 4)
+        apply_unified_diff(plan["diff"], base_hash=plan["base_hash"], target_path=rel)
+        self.assertEqual((ROOT / rel).read_text(), apply_edits(text, edits))
+        self.assertIn("error", plan_edits({"path": rel, "edits": [
+            {"op": "search_replace", "search": "value_1", "replace": "y"}]}))
+
+    def test_offset_and_mismatch(self):
+        from tools.edit.plan_patch import plan_patch
+        from tools.edit.apply_patch import PatchError, apply_files
+        text = _lines(300)
+        rel = self._file("offset.txt", text.encode())
+        plan = plan_patch({"path": rel, "new_content": text.replace("row 250 = value_5\n", "row 250 = moved\n")})
+        # lines added above the hunk after planning: applied at an offset (no base_hash)
+        (ROOT / rel).write_text("new 1\nnew 2\n" + text)
+        (s,) = apply_files(plan["diff"])
+        self.assertEqual(s.hunk_report[0]["offset"], 2)
+        self.assertIn("row 250 = moved\n", (ROOT / rel).read_text())
+        with self.assertRaises(PatchError):
+            apply_files(plan["diff"], dry_run=True)  # already applied
+        with self.assertRaises(PatchError):
+            apply_files(plan["diff"], dry_run=True, base_hashes={rel: plan["base_hash"]})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,76 @@
+import tempfile
+import unittest
+from pathlib import Path
+
+
+SOURCE = '''import os.path
+from .calc import divide as div
+
+
+def divide(a, b):
+    """divide in a docstring must not count"""
+    return a / b
+
+
+class Runner:
+    limit = 3
+
+    def go(self):
+        # divide in a comment must not count
+        return div(1, 2) + self.helper.divide(4, 2)
+'''
+
+
+class TestSymbolIndex(unittest.TestCase):
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.root = Path(self._tmp.name)
+        (self.root / "pkg").mkdir()
+        (self.root / "pkg" / "mod.py").write_text(SOURCE, encoding="utf-8")
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def make_index(self):
+        from tools.index.symbols import SymbolIndex
+        return SymbolIndex(self.root, cache_path=self.root / ".cache" / "symbols.json")
+
+    def test_kinds_and_no_text_matches(self):
+        idx = self.make_index()
+        idx.refresh()
+        kinds = sorted((h["kind"], h["line"]) for h in idx.lookup("divide"))
+        # the aliased import matches through its target
+        self.assertEqual(kinds, [("call", 15), ("function", 5), ("import", 2)])
+        imp = idx.lookup("div", kinds=["import"])
+        self.assertEqual(imp[0]["target"], ".calc.divide")
+        self.assertEqual(idx.lookup("calc.divide")[0]["kind"], "import")
+        self.assertEqual([h["kind"] for h in idx.lookup("limit")], ["variable"])
+        self.assertEqual([h["kind"] for h in idx.lookup("helper")], ["attribute"])
+
+    def test_incremental_refresh_and_persistence(self):
+        idx = self.make_index()
+        first = idx.refresh()
+        self.assertEqual(first["parsed"], 1)
+        self.assertEqual(idx.refresh()["parsed"], 0)
+        # identical content elsewhere is reused by hash, not re-parsed
+        (self.root / "copy.py").write_text(SOURCE, encoding="utf-8")
+        st = idx.refresh()
+        self.assertEqual((st["parsed"], st["reused"]), (0, 1))
+        (self.root / "pkg" / "mod.py").write_text("def other():\n    pass\n", encoding="utf-8")
+        self.assertEqual(idx.refresh()["parsed"], 1)
+        (self.root / "copy.py").unlink()
+        self.assertEqual(idx.refresh()["removed"], 1)
+        # a fresh instance loads the persisted index without parsing
+        again = self.make_index()
+        self.assertEqual(again.refresh()["parsed"], 0)
+        self.assertEqual(again.lookup("other")[0]["path"], "pkg/mod.py")
+
+    def test_syntax_error_is_recorded(self):
+        (self.root / "bad.py").write_text("def broken(:\n", encoding="utf-8")
+        idx = self.make_index()
+        idx.refresh()
+        self.assertEqual(idx.lookup("broken"), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,59 @@
+import tempfile
+import unittest
+from pathlib import Path
+
+
+class TestTieredDiagnostics(unittest.TestCase):
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.root = Path(self._tmp.name)
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def write(self, rel, text):
+        (self.root / rel).write_text(text, encoding="utf-8")
+        return rel
+
+    def test_syntax_error_skips_pyright_in_auto_mode(self):
+        from tools.lsp.tiered import check
+        rel = self.write("broken.py", "def f(:\n    pass\n")
+        res = check([rel], project_root=self.root)
+        self.assertEqual(res["framework"], "tiered")
+        d = res["diagnostics"][0]
+        self.assertEqual((d["line"], d["rule"], d["severity"], d["source"]), (0, "syntax", "error", "syntax"))
+        self.assertFalse(res["tiers"]["pyright"]["ran"])
+        self.assertIn("tier 1", res["tiers"]["pyright"]["skipped"])
+
+    def test_undefined_names(self):
+        from tools.lsp.tiered import check
+        rel = self.write("names.py", (
+            "import os\n"
+            "def f(a):\n"
+            "    global G\n"
+            "    G = [i for i in range(a)]\n"
+            "    return os.sep + missing(a)\n"
+            "print(G, __file__, later)\n"
+            "later = 1\n"
+        ))
+        res = check([rel], pyright="never", project_root=self.root)
+        msgs = [(d["line"], d["message"]) for d in res["diagnostics"]]
+        self.assertEqual(msgs, [(4, '"missing" is not defined')])
+
+    def test_undefined_name_position_skips_locals_of_the_same_name(self):
+        from tools.lsp.tiered import undefined_names
+        src = "class C(B):\n    def m(self, x):\n        return super().m(x)\n\nprint([y for y in x])\n"
+        msgs = [(d["line"], d["col"], d["message"]) for d in undefined_names(src, "pos.py")]
+        self.assertEqual(msgs, [(0, 8, '"B" is not defined'), (4, 18, '"x" is not defined')])
+
+    def test_clean_file_and_changed_default(self):
+        from tools.lsp.tiered import check
+        self.write("ok.py", "x = 1\n")
+        first = check(pyright="never", project_root=self.root)
+        self.assertEqual((first["tiers"]["syntax"]["files"], first["diagnostics"]), (1, []))
+        # nothing changed since the previous check
+        self.assertEqual(check(pyright="never", project_root=self.root)["tiers"]["syntax"]["files"], 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
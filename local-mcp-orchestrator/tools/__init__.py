@@ -1,19 +1,27 @@
 from .web_search import run as web_search_run
 from .code_exec import run as code_exec_run
+from .py_session import run as py_session_run
 from .tests import run as tests_run
+from .jobs import run as jobs_run
 from .edit.plan_patch import run as plan_patch_run
 from .edit.apply_patch import run as apply_patch_run
+from .edit.edit_ops import run as plan_edits_run
 from .index.ripgrep import search as ripgrep_search
 from .lsp.diagnostics import python_pyright as lsp_python_pyright
+from .lsp.tiered import check as lsp_tiered_check
 from .impact_scan import run as impact_scan_run
 
 __all__ = [
     "web_search_run",
     "code_exec_run",
+    "py_session_run",
     "tests_run",
+    "jobs_run",
     "plan_patch_run",
     "apply_patch_run",
+    "plan_edits_run",
     "ripgrep_search",
     "lsp_python_pyright",
+    "lsp_tiered_check",
     "impact_scan_run",
 ]
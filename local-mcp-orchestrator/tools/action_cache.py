@@ -0,0 +1,137 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+from .index.workspace import CACHE_DIR, FileHasher
+
+
+DEFAULT_MAX_BYTES = int(os.environ.get("GPT_CODE_ACTION_CACHE_MB", "64")) * 1024 * 1024
+
+
+def enabled() -> bool:
+    return os.environ.get("GPT_CODE_ACTION_CACHE", "1").lower() not in {"0", "false", "off", "no"}
+
+
+class ActionCache:
+    """Persistent, content-addressed cache of deterministic tool results.
+
+    A key is sha256(tool name, normalized JSON input, digest of the relevant
+    files' content hashes). Entries are single JSON files under
+    `.gpt_code_cache/actions/`; reads bump the mtime and writes evict the
+    least recently used entries once the directory exceeds `max_bytes`.
+    """
+
+    def __init__(self, root: Path | None = None, max_bytes: int = DEFAULT_MAX_BYTES, hasher: Optional[FileHasher] = None):
+        self.root = Path(root) if root is not None else CACHE_DIR / "actions"
+        self.max_bytes = max_bytes
+        self.hasher = hasher if hasher is not None else FileHasher()
+        self.session = {"hits": 0, "misses": 0}
+        self._totals = {"hits": 0, "misses": 0}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(tool: str, inputs: Any, files_digest: str) -> str:
+        norm = json.dumps(inputs, sort_keys=True, ensure_ascii=False, separators=(",", ":"), default=str)
+        return hashlib.sha256(f"{tool}\0{norm}\0{files_digest}".encode("utf-8")).hexdigest()
+
+    def _path(self, key: str) -> Path:
+        return self.root / f"{key}.json"
+
+    def get(self, key: str) -> Optional[Any]:
+        p = self._path(key)
+        try:
+            data = json.loads(p.read_text(encoding="utf-8"))
+            os.utime(p)  # LRU: last use is the mtime
+        except (OSError, ValueError):
+            self._count(hit=False)
+            return None
+        self._count(hit=True)
+        return data.get("result")
+
+    def put(self, key: str, tool: str, result: Any) -> None:
+        try:
+            self.root.mkdir(parents=True, exist_ok=True)
+            with tempfile.NamedTemporaryFile("w", encoding="utf-8", dir=str(self.root), suffix=".tmp", delete=False) as tf:
+                json.dump({"tool": tool, "created": time.time(), "result": result}, tf, ensure_ascii=False)
+                tmp_name = tf.name
+            os.replace(tmp_name, str(self._path(key)))
+            self.evict()
+        except OSError:
+            pass  # cache is best-effort
+
+    def evict(self) -> int:
+        """Drop least recently used entries until the cache fits in max_bytes."""
+        entries = []
+        total = 0
+        try:
+            with os.scandir(self.root) as it:
+                for e in it:
+                    if not e.name.endswith(".json") or e.name == "stats.json":
+                        continue
+                    st = e.stat()
+                    entries.append((st.st_mtime_ns, st.st_size, e.path))
+                    total += st.st_size
+        except OSError:
+            return 0
+        removed = 0
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.unlink(path)
+            except OSError:
+                continue
+            total -= size
+            removed += 1
+        return removed
+
+    def _count(self, hit: bool) -> None:
+        field = "hits" if hit else "misses"
+        with self._lock:
+            self.session[field] += 1
+            stats_path = self.root / "stats.json"
+            try:
+                totals = json.loads(stats_path.read_text(encoding="utf-8"))
+            except (OSError, ValueError):
+                totals = {"hits": 0, "misses": 0}
+            totals[field] = int(totals.get(field, 0)) + 1
+            try:
+                self.root.mkdir(parents=True, exist_ok=True)
+                stats_path.write_text(json.dumps(totals), encoding="utf-8")
+            except OSError:
+                pass
+            self._totals = totals
+
+    def stats(self, hit: Optional[bool] = None) -> Dict[str, Any]:
+        def rate(c: Dict[str, int]) -> float:
+            n = c.get("hits", 0) + c.get("misses", 0)
+            return round(c.get("hits", 0) / n, 3) if n else 0.0
+
+        with self._lock:
+            totals = dict(self._totals)
+            out: Dict[str, Any] = {
+                "session_hits": self.session["hits"],
+                "session_misses": self.session["misses"],
+                "hit_rate": rate(self.session),
+                "hit_rate_total": rate(totals),
+            }
+        if hit is not None:
+            out = {"hit": hit, **out}
+        return out
+
+
+_CACHE: Optional[ActionCache] = None
+
+
+def get_cache() -> ActionCache:
+    global _CACHE
+    if _CACHE is None:
+        _CACHE = ActionCache()
+    return _CACHE
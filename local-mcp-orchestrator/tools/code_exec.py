@@ -1,48 +1,60 @@
 from __future__ import annotations
 
-import subprocess
 from typing import Optional
 
+from . import pyexec_pool
+from .proc_runner import OutputCallback, ProcResult, format_result, record_metrics, run_bounded
 
-def run(code: str, timeout: int = 10) -> str:
+
+MAX_OUTPUT = 4000
+# per stream, leaving room for the status line so the tail is never cut by MAX_OUTPUT
+STREAM_LIMIT = (MAX_OUTPUT - 300) // 2
+
+
+def _run_pooled(code: str, timeout: int) -> Optional[str]:
+    """Run in a worker forked from the warm template; None if the pool is unavailable."""
+    srv = pyexec_pool.get_server()
+    if srv is None:
+        return None
+    try:
+        rc, out, err, usage = srv.run(code, timeout, cap=STREAM_LIMIT)
+    except (OSError, pyexec_pool.PoolError):
+        return None
+    limited = bool(usage.get("output_limited"))
+    res = ProcResult(rc, out, err, timed_out=rc is None and not limited, output_limited=limited,
+                     duration=usage.get("wall_s", 0.0),
+                     user_s=usage.get("user_s"), sys_s=usage.get("sys_s"), max_rss_kb=usage.get("max_rss_kb"),
+                     stdout_bytes=usage.get("stdout_bytes", 0), stderr_bytes=usage.get("stderr_bytes", 0))
+    record_metrics("code_exec", {"argv0": "pyexec_pool", "returncode": rc, "timed_out": res.timed_out, **res.usage()})
+    return format_result("code_exec", res, timeout, MAX_OUTPUT)
+
+
+def run(code: str, timeout: int = 10, on_output: Optional[OutputCallback] = None) -> str:
     """Execute short Python code in a subprocess and return combined output.
 
+    - Runs in a fresh worker forked from a warm interpreter (tools/pyexec_pool)
+      when available, otherwise in a new `python3 -c` process.
     - Time-limited via `timeout`.
-    - Returns both stdout and stderr.
-    - Truncates long outputs.
+    - Returns both stdout and stderr, keeping the head and tail of long output.
+    - `on_output` (live chunks) needs a pipe, so it always uses `python3 -c`.
     """
     code = (code or "").strip()
     if not code:
         return "[code_exec] empty code"
 
+    if pyexec_pool.enabled() and on_output is None:
+        pooled = _run_pooled(code, timeout)
+        if pooled is not None:
+            return pooled
+
     try:
-        proc = subprocess.run(
-            ["python3", "-c", code],
-            capture_output=True,
-            text=True,
-            timeout=timeout,
-        )
-    except subprocess.TimeoutExpired:
-        return f"[code_exec] timeout after {timeout}s"
+        res = run_bounded(["python3", "-c", code], timeout=timeout, limit=STREAM_LIMIT, on_output=on_output,
+                          tool="code_exec")
     except Exception as e:  # pragma: no cover
         return f"[code_exec] failed: {type(e).__name__}: {e}"
 
-    out = (proc.stdout or "")
-    err = (proc.stderr or "")
-    rc = proc.returncode
-
-    combined = "".join([
-        f"[code_exec] returncode={rc}\n",
-        ("[stdout]\n" + out if out else ""),
-        ("[stderr]\n" + err if err else ""),
-    ]).strip()
-
-    # Truncate if extremely long
-    if len(combined) > 4000:
-        combined = combined[:4000] + "\n…(truncated)"
-    return combined
+    return format_result("code_exec", res, timeout, MAX_OUTPUT)
 
 
 if __name__ == "__main__":
     print(run("print('hello from code_exec')"))
-
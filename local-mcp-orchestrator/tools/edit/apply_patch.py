@@ -1,18 +1,41 @@
 from __future__ import annotations
 
 import io
-import re
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
 from pathlib import Path
-from typing import List, Tuple
+from typing import Any, BinaryIO, Callable, Dict, List, Optional, Tuple
 import os
 import json
 import hashlib
+import shutil
 import tempfile
+import threading
+import time
+import uuid
 import errno
 
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - not POSIX
+    fcntl = None  # type: ignore[assignment]
+
+from ..index.workspace import CACHE_DIR
+from .blobs import get_store
+from .merge3 import merge3
+from .patch_model import FileDiff, Hunk, Patch, PatchError
+from .stream_patch import STREAM_THRESHOLD, hash_file, stage_stream
+
 
 ROOT_DIR = Path(__file__).resolve().parents[2]
 
+# threads used to verify the files of a multi-file diff
+VERIFY_WORKERS = 8
+# lines searched above/below a hunk's header position when the context has moved
+HUNK_SEARCH_WINDOW = 300
+# max leading/trailing context lines a hunk may ignore (GNU patch default is 2)
+MAX_FUZZ = 2
+
 
 def _safe_path(rel_path: str) -> Path:
     root = os.path.realpath(str(ROOT_DIR))
@@ -23,57 +46,102 @@ def _safe_path(rel_path: str) -> Path:
     return Path(tgt)
 
 
-_RE_HUNK = re.compile(r"^@@ -(?P<a_start>\d+)(,(?P<a_count>\d+))? \+(?P<b_start>\d+)(,(?P<b_count>\d+))? @@")
-
-
-class PatchError(Exception):
-    pass
-
-
-def _parse_file_header(lines: List[str], i: int) -> Tuple[str, str, int]:
-    if i >= len(lines) or not lines[i].startswith('--- '):
-        raise PatchError("expected --- header")
-    a_path = lines[i][4:].strip()
-    i += 1
-    if i >= len(lines) or not lines[i].startswith('+++ '):
-        raise PatchError("expected +++ header")
-    b_path = lines[i][4:].strip()
-    i += 1
-    return a_path, b_path, i
-
-
-def _apply_hunks_to_text(orig_lines: List[str], hunks: List[List[str]], a_start_first: int) -> List[str]:
-    out: List[str] = []
-    idx = 0  # 0-based index into orig_lines
-    # Copy until first hunk start (a_start_first is 1-based)
-    pre = max(a_start_first - 1, 0)
-    out.extend(orig_lines[:pre])
-    idx = pre
-    for h in hunks:
-        for hl in h:
-            if not hl:
-                continue
-            tag = hl[0]
-            text = hl[1:]
-            if tag == ' ':
-                # context line, must match
-                if idx >= len(orig_lines) or orig_lines[idx] != text:
-                    raise PatchError("context mismatch while applying hunk")
-                out.append(orig_lines[idx])
-                idx += 1
-            elif tag == '-':
-                # removal, must match original
-                if idx >= len(orig_lines) or orig_lines[idx] != text:
-                    raise PatchError("deletion mismatch while applying hunk")
-                idx += 1
-            elif tag == '+':
-                # addition
-                out.append(text)
-            else:
+def _find_block(orig_lines: List[str], block: List[str], expected: int, lo: int) -> Optional[int]:
+    """Index where `block` matches, searching outward from `expected` within HUNK_SEARCH_WINDOW."""
+    hi = len(orig_lines) - len(block)
+    if hi < lo:
+        return None
+    expected = min(max(expected, lo), hi)
+    for dist in range(HUNK_SEARCH_WINDOW + 1):
+        for pos in ((expected,) if dist == 0 else (expected - dist, expected + dist)):
+            if lo <= pos <= hi and orig_lines[pos:pos + len(block)] == block:
+                return pos
+        if expected - dist < lo and expected + dist > hi:
+            break
+    return None
+
+
+class HunkApplier:
+    """Applies hunks one at a time, in file order, to a list of lines.
+
+    Each hunk is positioned by its own `@@` header. A hunk whose context is
+    not at its header line is searched for within HUNK_SEARCH_WINDOW lines
+    (offset, carried over to the following hunks as GNU patch does); failing
+    that, up to MAX_FUZZ leading/trailing context lines are ignored (fuzz).
+    """
+
+    def __init__(self, orig_lines: List[str]):
+        self.orig_lines = orig_lines
+        self.out: List[str] = []
+        self.report: List[Dict[str, int]] = []  # {"applied_at" (1-based), "offset", "fuzz"} per hunk
+        self.idx = 0  # 0-based index into orig_lines; hunks may not overlap
+        self.carry = 0  # offset found for the previous hunk
+
+    def add(self, hunk_lines: List[str], hdr: Dict[str, int]) -> Dict[str, int]:
+        orig_lines, idx, carry = self.orig_lines, self.idx, self.carry
+        n = len(self.report)
+        lines = [hl for hl in hunk_lines if hl]
+        for hl in lines:
+            if hl[0] not in (' ', '-', '+'):
                 raise PatchError("invalid hunk line")
-    # Append the remainder
-    out.extend(orig_lines[idx:])
-    return out
+        a_start = hdr.get('a_start', idx + 1)
+        # a_count == 0 means "insert after line a_start"; otherwise the hunk starts at a_start
+        expected = (a_start if hdr.get('a_count', 1) == 0 else a_start - 1) + carry
+        # leading/trailing context lines that fuzz may drop
+        lead = next((k for k, hl in enumerate(lines) if hl[0] != ' '), len(lines))
+        trail = next((k for k, hl in enumerate(reversed(lines)) if hl[0] != ' '), len(lines))
+        pos = None
+        body = lines
+        prev = None
+        for fuzz in range(MAX_FUZZ + 1):
+            cut_lead = min(fuzz, lead)
+            cut_trail = min(fuzz, trail)
+            if (cut_lead, cut_trail) == prev:
+                break  # no more context to drop
+            prev = (cut_lead, cut_trail)
+            body = lines[cut_lead:len(lines) - cut_trail] if (cut_lead or cut_trail) else lines
+            old = [hl[1:] for hl in body if hl[0] != '+']
+            if not old:
+                # pure insertion: nothing to match, trust the header
+                pos = min(max(expected + cut_lead, idx), len(orig_lines))
+                break
+            pos = _find_block(orig_lines, old, expected + cut_lead, idx)
+            if pos is not None:
+                break
+        if pos is None:
+            first_mismatch = "context" if lines and lines[0][0] == ' ' else "deletion"
+            raise PatchError(f"{first_mismatch} mismatch while applying hunk {n + 1} (@@ -{a_start} @@)")
+        offset = pos - (expected - carry) - cut_lead
+        self.carry = offset
+        self.out.extend(orig_lines[idx:pos])
+        idx = pos
+        for hl in body:
+            if hl[0] == '+':
+                self.out.append(hl[1:])
+            else:
+                # context keeps the original line (identical text); deletions skip it
+                if hl[0] == ' ':
+                    self.out.append(orig_lines[idx])
+                idx += 1
+        self.idx = idx
+        rep = {"applied_at": pos + 1, "offset": offset, "fuzz": fuzz}
+        self.report.append(rep)
+        return rep
+
+    def result(self) -> List[str]:
+        # applied hunks plus the untouched remainder
+        return self.out + self.orig_lines[self.idx:]
+
+
+def _apply_hunks_to_text(orig_lines: List[str], hunks: List[Hunk],
+                         headers: Optional[List[Dict[str, int]]] = None) -> Tuple[List[str], List[Dict[str, int]]]:
+    """Apply hunks in order (see HunkApplier); returns the new lines and the per-hunk report."""
+    if headers is None:
+        headers = [h.header for h in hunks]
+    applier = HunkApplier(orig_lines)
+    for n, h in enumerate(hunks):
+        applier.add(list(h), headers[n] if n < len(headers) else {})
+    return applier.result(), applier.report
 
 
 def _atomic_write_text(path: Path, data: str) -> None:
@@ -88,216 +156,447 @@ def _atomic_write_text(path: Path, data: str) -> None:
     os.replace(tmp_name, str(path))
 
 
-def apply_unified_diff(diff_text: str, dry_run: bool = False, base_hash: str = "", target_path: str = "") -> str:
-    """Apply a minimal unified diff to files under ROOT_DIR.
+def parse_unified_diff(diff_text: str) -> List[FileDiff]:
+    return Patch.parse(diff_text).files
 
-    Limitations: no renames; expects same relative path in a/b headers; does not
-    handle binary patches; simple hunk application with strict context checks.
+
+@dataclass
+class _Staged:
+    fd: FileDiff
+    target: Path
+    rel: str
+    new_text: Optional[str]  # None -> delete
+    existed: bool
+    old_mode: Optional[int] = None
+    hunk_report: List[Dict[str, int]] = field(default_factory=list)
+    strategy: str = "unified_diff"
+    # large files: streams the new content instead of holding it in new_text
+    writer: Optional[Callable[[BinaryIO], None]] = None
+    # sha256 of the bytes written by _commit
+    hash_after: Optional[str] = None
+
+    @property
+    def writes(self) -> bool:
+        return self.new_text is not None or self.writer is not None
+
+
+def _read_hash(target: Path, fallback: str = "") -> str:
+    # compare raw bytes to align with planner's hashing and preserve CRLF/BOM semantics
+    try:
+        return hash_file(target)
+    except Exception:
+        return hashlib.sha256(fallback.encode()).hexdigest()
+
+
+def _stage(fd: FileDiff, base_hash: str, require_delete_hash: bool) -> _Staged:
+    """Verify one file's hunks against the current tree and compute its new content."""
+    target = _safe_path(fd.rel or "")
+    rel = str(target.relative_to(ROOT_DIR))
+    if fd.mode == "create":
+        # Create new file: apply hunks to empty original
+        new_lines, report = _apply_hunks_to_text([], fd.hunks)
+        if target.exists():
+            raise PatchError("conflict: file appeared since plan")
+        return _Staged(fd, target, rel, "".join(new_lines), existed=False, hunk_report=report)
+    if fd.mode == "delete":
+        if not target.exists():
+            return _Staged(fd, target, rel, None, existed=False)
+        if require_delete_hash and not base_hash:
+            raise PatchError("delete requires base_hash (or force=true)")
+        # optimistic lock on delete if applicable
+        if base_hash and _read_hash(target) != base_hash:
+            raise PatchError("conflict: file changed since plan (base_hash mismatch)")
+        return _Staged(fd, target, rel, None, existed=True, old_mode=os.stat(target).st_mode)
+    # Modify existing file
+    existed = target.exists()
+    if existed and os.stat(target).st_size > STREAM_THRESHOLD:
+        return _stage_large(fd, target, rel, base_hash)
+    if existed:
+        try:
+            # Preserve original line endings (CRLF/LF) to match diff hunks
+            with open(target, 'r', encoding='utf-8', newline='') as f:
+                orig = f.read()
+        except Exception:
+            orig = target.read_text(errors='ignore')
+    else:
+        orig = ""
+    # preserve mode (exec bit etc.)
+    old_mode = os.stat(target).st_mode if existed else None
+    # optimistic lock for modifies; on mismatch try to merge with the planned base
+    if base_hash and _read_hash(target, orig) != base_hash:
+        merged = _merge_with_base(fd, base_hash, orig)
+        return _Staged(fd, target, rel, merged, existed=existed, old_mode=old_mode, strategy="merge3")
+    new_lines, report = _apply_hunks_to_text(orig.splitlines(keepends=True), fd.hunks)
+    return _Staged(fd, target, rel, "".join(new_lines), existed=existed, old_mode=old_mode, hunk_report=report)
+
+
+def _stage_large(fd: FileDiff, target: Path, rel: str, base_hash: str) -> _Staged:
+    # no three-way merge here: that needs base, current and planned text in memory
+    if base_hash and hash_file(target) != base_hash:
+        raise PatchError("conflict: file changed since plan (base_hash mismatch)")
+    try:
+        writer, report = stage_stream(target, fd.hunks, HUNK_SEARCH_WINDOW, MAX_FUZZ)
+    except ValueError as e:
+        n, a_start = e.args
+        raise PatchError(f"context mismatch while applying hunk {n} (@@ -{a_start} @@)") from None
+    return _Staged(fd, target, rel, None, existed=True, old_mode=os.stat(target).st_mode,
+                   hunk_report=report, strategy="streamed", writer=writer)
+
+
+def _merge_with_base(fd: FileDiff, base_hash: str, current: str) -> str:
+    """Three-way merge of the plan's base, the current file and the planned content."""
+    base_b = get_store().get(base_hash)
+    if base_b is None:
+        raise PatchError("conflict: file changed since plan (base_hash mismatch)")
+    base_lines = base_b.decode("utf-8", errors="surrogatepass").splitlines(keepends=True)
+    try:
+        planned, _ = _apply_hunks_to_text(base_lines, fd.hunks)
+    except PatchError:
+        raise PatchError("conflict: file changed since plan (base_hash mismatch)") from None
+    merged, conflicts = merge3(base_lines, current.splitlines(keepends=True), planned)
+    if conflicts:
+        where = ", ".join(f"{c['base_start']}-{c['base_end']}" for c in conflicts[:5])
+        raise PatchError(f"conflict: file changed since plan and the changes overlap (base lines {where})")
+    return "".join(merged)
+
+
+# -- transactional commit ---------------------------------------------------
+#
+# 1. write the journal (txid + per-file tmp/backup names) and fsync it
+# 2. hard-link each existing target to its backup, write each new content to
+#    a temp file next to its target (fsynced, mode copied)
+# 3. os.replace() every temp file over its target / unlink deleted targets
+# 4. fsync each touched directory once
+# 5. remove the journal (commit point), then the backups
+#
+# A failure in 2-4 rolls back from the journal in-process; a crash leaves the
+# journal behind and the next apply_unified_diff() rolls it back first.
+
+TXN_DIR = CACHE_DIR / "txn"
+JOURNAL = TXN_DIR / "journal.json"
+
+
+class _TxnLock:
+    """Serializes transactions in this process (thread lock) and across processes (flock on TXN_DIR/lock).
+
+    The journal is shared by every process working on the workspace, e.g.
+    parallel test shards or a background job next to the agent.
     """
-    lines = diff_text.splitlines(keepends=True)
-    i = 0
-    changed: List[str] = []
-    processed_files = 0
-    if not lines:
-        return "[apply_patch] empty diff"
 
-    while i < len(lines):
-        # Skip empty lines
-        if not lines[i].strip():
-            i += 1
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._fd: Optional[int] = None
+
+    def __enter__(self) -> "_TxnLock":
+        self._lock.acquire()
+        if fcntl is not None:
+            try:
+                TXN_DIR.mkdir(parents=True, exist_ok=True)
+                self._fd = os.open(str(TXN_DIR / "lock"), os.O_RDWR | os.O_CREAT, 0o644)
+                fcntl.flock(self._fd, fcntl.LOCK_EX)
+            except OSError:
+                if self._fd is not None:
+                    os.close(self._fd)
+                self._fd = None  # best-effort: in-process locking only
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        if self._fd is not None:
+            os.close(self._fd)  # releases the flock
+            self._fd = None
+        self._lock.release()
+
+
+_TXN_LOCK = _TxnLock()
+
+
+def _fsync_dir(path: Path) -> None:
+    try:
+        fd = os.open(str(path), os.O_RDONLY)
+    except OSError:
+        return  # platforms without directory fds
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+def _write_journal(data: Dict[str, Any]) -> None:
+    TXN_DIR.mkdir(parents=True, exist_ok=True)
+    with tempfile.NamedTemporaryFile('w', encoding='utf-8', dir=str(TXN_DIR), delete=False) as tf:
+        json.dump(data, tf)
+        tf.flush()
+        os.fsync(tf.fileno())
+        tmp_name = tf.name
+    os.replace(tmp_name, str(JOURNAL))
+    _fsync_dir(TXN_DIR)
+
+
+def _rollback(entries: List[Dict[str, Any]]) -> List[str]:
+    restored: List[str] = []
+    for e in reversed(entries):
+        path, tmp, backup = e["path"], e.get("tmp"), e.get("backup")
+        try:
+            if backup and os.path.exists(backup):
+                os.replace(backup, path)
+                # rename() is a no-op when both names link the same inode
+                if os.path.exists(backup):
+                    os.unlink(backup)
+                restored.append(path)
+            elif e.get("created") and tmp and not os.path.exists(tmp) and os.path.exists(path):
+                os.unlink(path)  # temp file was already renamed into place
+                restored.append(path)
+            if tmp and os.path.exists(tmp):
+                os.unlink(tmp)
+        except OSError:
             continue
-        a_path, b_path, i = _parse_file_header(lines, i)
-        processed_files += 1
-        if processed_files > 1:
-            raise PatchError("multi-file diff not supported; split per file and re-apply")
-        # Normalize paths (strip a/ and b/ prefixes), handle /dev/null
-        def _norm(h: str):
-            if h == '/dev/null':
-                return None
-            return h[2:] if h.startswith(('a/', 'b/')) else h
-        a_rel = _norm(a_path)
-        b_rel = _norm(b_path)
-        if a_rel is not None and b_rel is not None and a_rel != b_rel:
-            raise PatchError("renames not supported in this minimal applier")
-        rel = b_rel if b_rel is not None else a_rel
-        if rel is None or rel.startswith('/'):  # absolute forbidden or cannot infer
-            raise PatchError("absolute paths not allowed")
-        target = _safe_path(rel)
-
-        # Collect hunks for this file
-        hunks: List[List[str]] = []
-        a_start_first = 1
-        while i < len(lines) and lines[i].startswith('@@ '):
-            m = _RE_HUNK.match(lines[i])
-            if not m:
-                raise PatchError("bad hunk header")
-            if not hunks:
-                a_start_first = int(m.group('a_start'))
-            i += 1
-            h: List[str] = []
-            while i < len(lines):
-                if lines[i].startswith(('--- ', '+++ ', '@@ ')):
-                    break
-                if not lines[i]:
-                    break
-                tag = lines[i][0]
-                if tag in (' ', '+', '-'):
-                    h.append(lines[i])
-                    i += 1
-                else:
-                    # end of hunk (unexpected tag)
-                    break
-            hunks.append(h)
-        # Handle create/delete/modify
-        if a_rel is None and b_rel is not None:
-            # Create new file: apply hunks to empty original
-            orig_lines: List[str] = []
-            new_lines = _apply_hunks_to_text(orig_lines, hunks, a_start_first)
-            new_text = "".join(new_lines)
-            if target.exists():
-                raise PatchError("conflict: file appeared since plan")
-            if not dry_run:
-                _atomic_write_text(target, new_text)
-            changed.append(str(target.relative_to(ROOT_DIR)))
-        elif b_rel is None and a_rel is not None:
-            # Delete existing file
-            if target.exists():
-                if not base_hash:
-                    raise PatchError("delete requires base_hash (or force=true)")
-                # optimistic lock on delete if applicable; compare raw bytes like planner
-                if base_hash and target_path and target_path == str(target.relative_to(ROOT_DIR)):
-                    try:
-                        now_hash = hashlib.sha256(target.read_bytes()).hexdigest()
-                    except Exception:
-                        # fallback to text read if bytes fail unexpectedly
-                        now_hash = hashlib.sha256(target.read_text(errors='ignore').encode()).hexdigest()
-                    if now_hash != base_hash:
-                        raise PatchError("conflict: file changed since plan (base_hash mismatch)")
-                if not dry_run:
-                    target.unlink()
-                changed.append(str(target.relative_to(ROOT_DIR)))
-        else:
-            # Modify existing file
-            if target.exists():
-                try:
-                    # Preserve original line endings (CRLF/LF) to match diff hunks
-                    with open(target, 'r', encoding='utf-8', newline='') as f:
-                        orig = f.read()
-                except Exception:
-                    orig = target.read_text(errors='ignore')
-            else:
-                orig = ""
-            # optimistic lock for modifies
-            if base_hash and target_path and target_path == str(target.relative_to(ROOT_DIR)):
-                # compare raw bytes to align with planner's hashing and preserve CRLF/BOM semantics
-                try:
-                    now_hash = hashlib.sha256(target.read_bytes()).hexdigest()
-                except Exception:
-                    now_hash = hashlib.sha256(orig.encode()).hexdigest()
-                if now_hash != base_hash:
-                    raise PatchError("conflict: file changed since plan (base_hash mismatch)")
-            orig_lines = orig.splitlines(keepends=True)
-            new_lines = _apply_hunks_to_text(orig_lines, hunks, a_start_first)
-            new_text = "".join(new_lines)
-            if not dry_run:
-                # preserve mode (exec bit etc.)
-                try:
-                    old_mode = os.stat(target).st_mode
-                except FileNotFoundError:
-                    old_mode = None
-                _atomic_write_text(target, new_text)
-                if old_mode is not None:
+    for d in {os.path.dirname(e["path"]) for e in entries}:
+        _fsync_dir(Path(d))
+    return restored
+
+
+def recover() -> List[str]:
+    """Roll back a transaction interrupted by a crash; returns the restored paths."""
+    with _TXN_LOCK:
+        return _recover_locked()
+
+
+def _recover_locked() -> List[str]:
+    try:
+        data = json.loads(JOURNAL.read_text(encoding='utf-8'))
+    except FileNotFoundError:
+        return []
+    except (OSError, ValueError):
+        data = {}
+    restored = _rollback(data.get("entries") or [])
+    try:
+        JOURNAL.unlink()
+    except OSError:
+        pass
+    return restored
+
+
+def _backup(src: Path, dst: Path) -> None:
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copy2(src, dst)  # no hard links (other filesystem, FAT, ...)
+
+
+class _HashingWriter:
+    """File wrapper that hashes what is streamed through it."""
+
+    def __init__(self, f: BinaryIO):
+        self.f = f
+        self.hash = hashlib.sha256()
+
+    def write(self, data: bytes) -> int:
+        self.hash.update(data)
+        return self.f.write(data)
+
+
+def _commit(staged: List[_Staged]) -> None:
+    txid = uuid.uuid4().hex[:12]
+    entries: List[Dict[str, Any]] = []
+    for n, s in enumerate(staged):
+        entries.append({
+            "path": str(s.target),
+            "tmp": str(s.target.parent / f".{s.target.name}.{txid}.tmp") if s.writes else None,
+            "backup": str(TXN_DIR / f"{txid}.{n}.bak") if s.existed else None,
+            "created": not s.existed,
+        })
+    _write_journal({"txid": txid, "entries": entries})
+    try:
+        for s, e in zip(staged, entries):
+            if e["backup"]:
+                _backup(s.target, Path(e["backup"]))
+            if e["tmp"]:
+                s.target.parent.mkdir(parents=True, exist_ok=True)
+                with open(e["tmp"], 'wb') as f:
+                    if s.writer is not None:
+                        out = _HashingWriter(f)
+                        s.writer(out)
+                        s.hash_after = out.hash.hexdigest()
+                    else:
+                        data = (s.new_text or "").encode('utf-8', 'surrogatepass')
+                        f.write(data)
+                        s.hash_after = hashlib.sha256(data).hexdigest()
+                    f.flush()
+                    os.fsync(f.fileno())
+                if s.old_mode is not None:
                     try:
-                        os.chmod(target, old_mode)
-                    except Exception:
+                        os.chmod(e["tmp"], s.old_mode)
+                    except OSError:
                         pass
-            changed.append(str(target.relative_to(ROOT_DIR)))
+        for s, e in zip(staged, entries):
+            if e["tmp"]:
+                os.replace(e["tmp"], str(s.target))
+            elif s.existed:
+                os.unlink(s.target)
+        for d in {s.target.parent for s in staged}:
+            _fsync_dir(d)
+    except BaseException:
+        _rollback(entries)
+        try:
+            JOURNAL.unlink()
+        except OSError:
+            pass
+        raise
+    JOURNAL.unlink()
+    _fsync_dir(TXN_DIR)
+    for e in entries:
+        if e["backup"]:
+            try:
+                os.unlink(e["backup"])
+            except OSError:
+                pass
+
 
-        # Skip until next file header or end
-        while i < len(lines) and not lines[i].startswith('--- '):
-            i += 1
+def apply_files(patch: Patch | str, dry_run: bool = False, base_hashes: Optional[Dict[str, str]] = None,
+                require_delete_hash: bool = True) -> List[_Staged]:
+    """Verify every file section of `patch`, then apply them as one transaction.
+
+    Nothing is written unless all hunks of all files apply; `base_hashes`
+    ({rel path: sha256 of raw bytes}) are checked during verification.
+    """
+    files = (patch if isinstance(patch, Patch) else Patch.parse(patch)).files
+    hashes = dict(base_hashes or {})
+    seen = set()
+    for fd in files:
+        if fd.rel in seen:
+            raise PatchError(f"{fd.rel}: file appears more than once in diff")
+        seen.add(fd.rel)
+    multi = len(files) > 1
 
+    def _one(fd: FileDiff) -> _Staged:
+        try:
+            return _stage(fd, hashes.get(fd.rel or "", ""), require_delete_hash)
+        except PatchError as e:
+            raise PatchError(f"{fd.rel}: {e}" if multi else str(e)) from None
+
+    with _TXN_LOCK:
+        if not dry_run:
+            _recover_locked()
+        if multi:
+            # file reads and hashing dominate verification and release the GIL
+            with ThreadPoolExecutor(max_workers=min(VERIFY_WORKERS, len(files))) as ex:
+                staged = list(ex.map(_one, files))
+        else:
+            staged = [_one(fd) for fd in files]
+        if not dry_run:
+            _commit([s for s in staged if s.writes or s.existed])
+    return staged
+
+
+def _apply(diff_text: str, dry_run: bool, base_hash: str, target_path: str,
+           base_hashes: Optional[Dict[str, str]], reverse: bool = False) -> List[_Staged]:
+    hashes = dict(base_hashes or {})
+    if base_hash and target_path:
+        hashes.setdefault(target_path, base_hash)
+    patch = Patch.parse(diff_text)
+    if reverse:
+        patch = patch.reversed()
+    # a bare base_hash still satisfies the delete guard of single-file diffs
+    single = len(patch) == 1
+    return apply_files(patch, dry_run=dry_run, base_hashes=hashes,
+                       require_delete_hash=not (single and base_hash))
+
+
+def _status(staged: List[_Staged]) -> str:
+    changed = [s.rel for s in staged if s.writes or s.existed]
     return f"[apply_patch] ok: {len(changed)} file(s) updated\n" + "\n".join(changed)
 
 
+def apply_unified_diff(diff_text: str, dry_run: bool = False, base_hash: str = "", target_path: str = "",
+                       base_hashes: Optional[Dict[str, str]] = None, reverse: bool = False) -> str:
+    """Apply a unified diff (one or more files) to files under ROOT_DIR.
+
+    All files are verified before any is written and then committed together
+    (see `_commit`); either every file is updated or none is. `reverse`
+    undoes a previously applied diff (base hashes then refer to the patched files).
+
+    Limitations: no renames; expects same relative path in a/b headers; does not
+    handle binary patches; simple hunk application with strict context checks.
+    """
+    if not diff_text.splitlines():
+        return "[apply_patch] empty diff"
+    return _status(_apply(diff_text, dry_run, base_hash, target_path, base_hashes, reverse))
+
+
+def _file_footer(s: _Staged) -> Dict[str, Any]:
+    # computed from the bytes written (or, for a dry run, the staged text); no re-read
+    hash_after = s.hash_after
+    if hash_after is None and s.new_text is not None:
+        hash_after = hashlib.sha256(s.new_text.encode('utf-8', 'surrogatepass')).hexdigest()
+    added, removed = s.fd.counts()
+    return {
+        "mode": s.fd.mode,
+        "path": s.rel,
+        "hash_after": hash_after,
+        "lines_added": added,
+        "lines_removed": removed,
+        "strategy": s.strategy,
+        # header numbers plus where each hunk actually applied (offset/fuzz, as GNU patch reports)
+        "hunks": [{**h, **r} for h, r in zip(s.fd.headers, s.hunk_report)] if s.hunk_report else s.fd.headers,
+    }
+
+
+def format_result(staged: List[_Staged], t0: float, target_rel: str = "") -> str:
+    """Status line plus footer JSON for applied files (`t0`: perf_counter at start)."""
+    status = _status(staged)
+    files = [_file_footer(s) for s in staged]
+    if len(files) == 1:
+        f = files[0]
+        footer: Dict[str, Any] = {
+            "mode": f["mode"],
+            "path": f["path"] or target_rel,
+            "hash_after": f["hash_after"],
+            "lines_added": f["lines_added"],
+            "lines_removed": f["lines_removed"],
+            "strategy": f["strategy"],
+            "hunks": f["hunks"],
+        }
+    else:
+        footer = {
+            "mode": "multi",
+            "files": files,
+            "lines_added": sum(f["lines_added"] for f in files),
+            "lines_removed": sum(f["lines_removed"] for f in files),
+            "strategy": "merge3" if any(f["strategy"] == "merge3" for f in files) else "unified_diff",
+            "transaction": {"files": len(files), "ms": round((time.perf_counter() - t0) * 1000, 2)},
+        }
+    return f"{status}\n{json.dumps(footer, ensure_ascii=False)}"
+
+
 def run(input_payload: str) -> str:
     payload = (input_payload or "").strip()
     if not payload:
         return "[apply_patch] empty diff"
     base_hash = ""
     target_rel = ""
-    # Accept either raw diff or JSON {diff, base_hash?, path?}
+    base_hashes: Dict[str, str] = {}
+    reverse = False
+    # Accept either raw diff or JSON {diff, base_hash?, path?, base_hashes?, reverse?}
     if payload.startswith('{'):
         try:
             obj = json.loads(payload)
             diff_text = obj.get("diff") or ""
             base_hash = (obj.get("base_hash") or "")
             target_rel = (obj.get("path") or "")
+            base_hashes = {k: v for k, v in (obj.get("base_hashes") or {}).items() if v}
+            reverse = bool(obj.get("reverse"))
             if not diff_text.strip():
                 return "[apply_patch] empty diff"
         except Exception as e:
             return f"[apply_patch] bad input: {type(e).__name__}: {e}"
     else:
         diff_text = payload
-    # derive mode and counts for structured footer
-    def _parse_mode_and_counts(diff_text: str):
-        mode = "modify"
-        path = ""
-        added = 0
-        removed = 0
-        hunks_meta = []
-        lines = diff_text.splitlines()
-        for idx, ln in enumerate(lines):
-            if ln.startswith('--- '):
-                from_hdr = ln[4:].strip()
-                to_hdr = lines[idx+1][4:].strip() if idx+1 < len(lines) and lines[idx+1].startswith('+++ ') else ''
-                if from_hdr == '/dev/null' and to_hdr:
-                    mode = 'create'
-                    path = to_hdr[2:] if to_hdr.startswith('b/') else to_hdr
-                elif to_hdr == '/dev/null' and from_hdr:
-                    mode = 'delete'
-                    path = from_hdr[2:] if from_hdr.startswith('a/') else from_hdr
-                else:
-                    path = to_hdr[2:] if to_hdr.startswith('b/') else to_hdr
-            elif ln.startswith('@@ '):
-                m = _RE_HUNK.match(ln + '\n') or _RE_HUNK.match(ln)
-                if m:
-                    a_start = int(m.group('a_start'))
-                    a_count = int(m.group('a_count') or 0)
-                    b_start = int(m.group('b_start'))
-                    b_count = int(m.group('b_count') or 0)
-                    hunks_meta.append({
-                        'a_start': a_start,
-                        'a_count': a_count,
-                        'b_start': b_start,
-                        'b_count': b_count,
-                    })
-            elif ln.startswith('+') and not ln.startswith('+++'):
-                added += 1
-            elif ln.startswith('-') and not ln.startswith('---'):
-                removed += 1
-        return mode, path, added, removed, hunks_meta
     try:
-        status = apply_unified_diff(diff_text, dry_run=False, base_hash=base_hash, target_path=target_rel)
-        mode, pth, added, removed, hunks_meta = _parse_mode_and_counts(diff_text)
-        # compute hash_after
-        hash_after = None
-        if mode in ("create", "modify") and pth:
-            try:
-                tgt = _safe_path(pth)
-                hash_after = hashlib.sha256(tgt.read_bytes()).hexdigest() if tgt.exists() else None
-            except Exception:
-                hash_after = None
-        footer = json.dumps({
-            "mode": mode,
-            "path": pth or target_rel,
-            "hash_after": hash_after,
-            "lines_added": added,
-            "lines_removed": removed,
-            "strategy": "unified_diff",
-            "hunks": hunks_meta,
-        }, ensure_ascii=False)
-        return f"{status}\n{footer}"
+        t0 = time.perf_counter()
+        staged = _apply(diff_text, False, base_hash, target_rel, base_hashes, reverse)
+        return format_result(staged, t0, target_rel)
     except Exception as e:
         return f"[apply_patch] failed: {type(e).__name__}: {e}"
 
@@ -0,0 +1,93 @@
+from __future__ import annotations
+
+import hashlib
+import os
+import tempfile
+from pathlib import Path
+from typing import Optional
+
+from ..index.workspace import CACHE_DIR
+
+
+DEFAULT_MAX_BYTES = 32 * 1024 * 1024
+
+
+class BlobStore:
+    """Content-addressed store of file contents (`.gpt_code_cache/blobs/<sha256>`).
+
+    plan_patch keeps the base it diffed against here so ApplyPatch can
+    three-way merge when the file changed in between. Bounded by `max_bytes`;
+    the least recently used blobs are dropped first.
+    """
+
+    def __init__(self, root: Path | None = None, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.root = Path(root) if root is not None else CACHE_DIR / "blobs"
+        self.max_bytes = max_bytes
+
+    def _path(self, sha: str) -> Path:
+        return self.root / sha
+
+    def put(self, data: bytes) -> str:
+        sha = hashlib.sha256(data).hexdigest()
+        p = self._path(sha)
+        try:
+            if p.exists():
+                os.utime(p)
+                return sha
+            self.root.mkdir(parents=True, exist_ok=True)
+            with tempfile.NamedTemporaryFile("wb", dir=str(self.root), suffix=".tmp", delete=False) as tf:
+                tf.write(data)
+                tmp_name = tf.name
+            os.replace(tmp_name, str(p))
+            self.evict()
+        except OSError:
+            pass  # store is best-effort
+        return sha
+
+    def get(self, sha: str) -> Optional[bytes]:
+        if not sha or any(c not in "0123456789abcdef" for c in sha):
+            return None
+        p = self._path(sha)
+        try:
+            data = p.read_bytes()
+            os.utime(p)
+        except OSError:
+            return None
+        if hashlib.sha256(data).hexdigest() != sha:
+            return None  # truncated/corrupted blob
+        return data
+
+    def evict(self) -> int:
+        entries = []
+        total = 0
+        try:
+            with os.scandir(self.root) as it:
+                for e in it:
+                    if e.name.endswith(".tmp"):
+                        continue
+                    st = e.stat()
+                    entries.append((st.st_mtime_ns, st.st_size, e.path))
+                    total += st.st_size
+        except OSError:
+            return 0
+        removed = 0
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.unlink(path)
+            except OSError:
+                continue
+            total -= size
+            removed += 1
+        return removed
+
+
+_STORE: Optional[BlobStore] = None
+
+
+def get_store() -> BlobStore:
+    global _STORE
+    if _STORE is None:
+        _STORE = BlobStore()
+    return _STORE
@@ -0,0 +1,153 @@
+from __future__ import annotations
+
+import bisect
+import json
+from typing import Any, Dict, List, Tuple
+
+from .plan_patch import PlanError, decode_base, is_large, load_base, plan_from_text, resolve_path
+
+
+OPS = ("replace_lines", "search_replace", "insert_after")
+
+# (start offset, end offset, replacement, edit index) in the original text
+_Span = Tuple[int, int, str, int]
+
+
+def newline_of(text: str) -> str:
+    crlf = text.count("\r\n")
+    return "\r\n" if crlf and crlf >= text.count("\n") - crlf else "\n"
+
+
+def normalize(s: Any, nl: str) -> str:
+    s = "" if s is None else str(s)
+    return s.replace("\r\n", "\n").replace("\n", nl)
+
+
+def as_lines(s: str, nl: str) -> str:
+    # line-oriented ops insert whole lines
+    return s if not s or s.endswith(nl) else s + nl
+
+
+def _resolve(text: str, edits: List[Dict[str, Any]], nl: str) -> List[_Span]:
+    lines = text.splitlines(keepends=True)
+    starts = [0]
+    for ln in lines:
+        starts.append(starts[-1] + len(ln))
+    n_lines = len(lines)
+    spans: List[_Span] = []
+    for i, ed in enumerate(edits):
+        op = ed.get("op")
+        if op == "replace_lines":
+            try:
+                a, b = int(ed["start"]), int(ed.get("end", ed["start"]))
+            except (KeyError, TypeError, ValueError):
+                raise PlanError(f"edit {i}: replace_lines needs integer start/end")
+            if not (1 <= a <= b <= n_lines):
+                raise PlanError(f"edit {i}: line range {a}-{b} outside file (1-{n_lines})")
+            spans.append((starts[a - 1], starts[b], as_lines(normalize(ed.get("text"), nl), nl), i))
+        elif op == "search_replace":
+            search = normalize(ed.get("search"), nl)
+            if not search:
+                raise PlanError(f"edit {i}: empty search")
+            replace = normalize(ed.get("replace"), nl)
+            found = []
+            pos = text.find(search)
+            while pos != -1:
+                found.append(pos)
+                pos = text.find(search, pos + len(search))
+            if not found:
+                raise PlanError(f"edit {i}: search text not found")
+            if len(found) > 1 and not ed.get("all"):
+                where = ", ".join(str(bisect.bisect_right(starts, p)) for p in found[:5])
+                raise PlanError(f"edit {i}: search text matches {len(found)} times (lines {where}); add context or set all=true")
+            spans.extend((p, p + len(search), replace, i) for p in found)
+        elif op == "insert_after":
+            body = as_lines(normalize(ed.get("text"), nl), nl)
+            if "line" in ed:
+                try:
+                    ln = int(ed["line"])
+                except (TypeError, ValueError):
+                    raise PlanError(f"edit {i}: insert_after line must be an integer")
+                if not (0 <= ln <= n_lines):
+                    raise PlanError(f"edit {i}: line {ln} outside file (0-{n_lines})")
+            else:
+                anchor = normalize(ed.get("anchor"), nl)
+                if not anchor:
+                    raise PlanError(f"edit {i}: insert_after needs anchor or line")
+                first = text.find(anchor)
+                if first == -1:
+                    raise PlanError(f"edit {i}: anchor not found")
+                if text.find(anchor, first + 1) != -1:
+                    raise PlanError(f"edit {i}: anchor is not unique; add context")
+                # the line holding the anchor's last character
+                ln = bisect.bisect_right(starts, first + len(anchor) - 1)
+            at = starts[ln]
+            if at == len(text) and text and not text.endswith(("\n", "\r")):
+                body = nl + body  # last line has no newline yet
+            spans.append((at, at, body, i))
+        else:
+            raise PlanError(f"edit {i}: unknown op {op!r} (expected one of {', '.join(OPS)})")
+    spans.sort(key=lambda s: (s[0], s[1], s[3]))
+    for prev, cur in zip(spans, spans[1:]):
+        if cur[0] < prev[1]:
+            raise PlanError(f"edits {prev[3]} and {cur[3]} overlap")
+    return spans
+
+
+def apply_edits(text: str, edits: List[Dict[str, Any]]) -> str:
+    """Apply anchored edit operations to `text`.
+
+    All positions refer to the original text (line numbers do not shift
+    between operations); overlapping edits are rejected. Inserted text uses
+    the file's dominant newline style.
+    """
+    nl = newline_of(text)
+    out: List[str] = []
+    pos = 0
+    for start, end, repl, _ in _resolve(text, edits, nl):
+        out.append(text[pos:start])
+        out.append(repl)
+        pos = end
+    out.append(text[pos:])
+    return "".join(out)
+
+
+def plan_edits(payload: dict) -> dict:
+    """Like plan_patch, but from a list of edit operations instead of the whole new file.
+
+    payload: {path, edits: [
+        {"op": "replace_lines", "start", "end"?, "text"},
+        {"op": "search_replace", "search", "replace", "all"?},
+        {"op": "insert_after", "anchor" | "line", "text"},
+    ], context?}
+    """
+    rel = payload["path"]
+    edits = payload.get("edits") or []
+    ctx = int(payload.get("context", 3))
+    if not isinstance(edits, list) or not edits:
+        return {"error": "edits must be a non-empty list"}
+    try:
+        p = resolve_path(rel)
+        if is_large(p):
+            from .stream_patch import plan_edits_large
+            out = plan_edits_large(rel, p, edits, ctx)
+        else:
+            _, exists, base_b = load_base(rel)
+            new_text = apply_edits(decode_base(base_b) if exists else "", edits)
+            out = plan_from_text(rel, exists, base_b, new_text, ctx)
+    except PlanError as e:
+        return {"error": str(e)}
+    out["edits"] = len(edits)
+    return out
+
+
+def run(input_str: str) -> str:
+    """Plan edits wrapper. Input JSON -> Output JSON string."""
+    try:
+        obj = json.loads(input_str)
+    except Exception as e:
+        return f"[plan_edits] bad input: {type(e).__name__}: {e}"
+    try:
+        return json.dumps(plan_edits(obj), ensure_ascii=False)
+    except Exception as e:
+        return f"[plan_edits] failed: {type(e).__name__}: {e}"
@@ -0,0 +1,230 @@
+from __future__ import annotations
+
+import difflib
+from typing import Dict, Iterator, List, Sequence, Tuple
+
+from .patch_model import NO_NEWLINE
+
+
+# middles up to this many line pairs (len_a * len_b) go through difflib's
+# SequenceMatcher, so typical edits produce difflib's hunks
+SMALL_PRODUCT = 250_000
+# histogram diff ignores anchor lines that occur more often than this
+MAX_CHAIN = 64
+
+_Opcode = Tuple[str, int, int, int, int]
+
+
+def _common_prefix_len(a: str, b: str) -> int:
+    # binary search on slice equality: memcmp-speed instead of a per-char loop
+    lo, hi = 0, min(len(a), len(b))
+    while lo < hi:
+        mid = (lo + hi + 1) // 2
+        if a[:mid] == b[:mid]:
+            lo = mid
+        else:
+            hi = mid - 1
+    return lo
+
+
+def _common_suffix_len(a: str, b: str, limit: int) -> int:
+    lo, hi = 0, min(len(a), len(b), limit)
+    while lo < hi:
+        mid = (lo + hi + 1) // 2
+        if a[len(a) - mid:] == b[len(b) - mid:]:
+            lo = mid
+        else:
+            hi = mid - 1
+    return lo
+
+
+def _histogram_blocks(a: Sequence[str], b: Sequence[str]) -> List[Tuple[int, int, int]]:
+    """Matching blocks (i, j, size) by histogram diff.
+
+    Each region is split at the longest run starting with the line that is
+    rarest in the region (ties: longest run), then both sides are recursed;
+    regions without a common line of count <= MAX_CHAIN are left unmatched.
+    """
+    blocks: List[Tuple[int, int, int]] = []
+    stack = [(0, len(a), 0, len(b))]
+    while stack:
+        alo, ahi, blo, bhi = stack.pop()
+        k = 0
+        while alo + k < ahi and blo + k < bhi and a[alo + k] == b[blo + k]:
+            k += 1
+        if k:
+            blocks.append((alo, blo, k))
+            alo, blo = alo + k, blo + k
+        k = 0
+        while ahi - k > alo and bhi - k > blo and a[ahi - k - 1] == b[bhi - k - 1]:
+            k += 1
+        if k:
+            blocks.append((ahi - k, bhi - k, k))
+            ahi, bhi = ahi - k, bhi - k
+        if alo >= ahi or blo >= bhi:
+            continue
+        counts: Dict[str, int] = {}
+        for i in range(alo, ahi):
+            counts[a[i]] = counts.get(a[i], 0) + 1
+        where: Dict[str, List[int]] = {}
+        for j in range(blo, bhi):
+            if b[j] in counts:
+                where.setdefault(b[j], []).append(j)
+        best = None
+        best_count = MAX_CHAIN + 1
+        i = alo
+        while i < ahi:
+            js = where.get(a[i])
+            count = counts[a[i]] + len(js) if js else 0
+            if not js or count > best_count:
+                i += 1
+                continue
+            step = 1
+            for j in js:
+                size = 1
+                while i + size < ahi and j + size < bhi and a[i + size] == b[j + size]:
+                    size += 1
+                if best is None or count < best_count or size > best[2]:
+                    best, best_count = (i, j, size), count
+                step = max(step, size)
+            # lines inside a run just found only yield shorter runs on the same diagonal
+            i += step
+        if best is None:
+            continue
+        i, j, size = best
+        blocks.append(best)
+        stack.append((alo, i, blo, j))
+        stack.append((i + size, ahi, j + size, bhi))
+    blocks.sort()
+    merged: List[Tuple[int, int, int]] = []
+    for i, j, size in blocks:
+        if merged and merged[-1][0] + merged[-1][2] == i and merged[-1][1] + merged[-1][2] == j:
+            pi, pj, ps = merged[-1]
+            merged[-1] = (pi, pj, ps + size)
+        else:
+            merged.append((i, j, size))
+    return merged
+
+
+def _opcodes_from_blocks(blocks: List[Tuple[int, int, int]], la: int, lb: int) -> List[_Opcode]:
+    codes: List[_Opcode] = []
+    i = j = 0
+    for ai, bj, size in blocks + [(la, lb, 0)]:
+        tag = ""
+        if i < ai and j < bj:
+            tag = "replace"
+        elif i < ai:
+            tag = "delete"
+        elif j < bj:
+            tag = "insert"
+        if tag:
+            codes.append((tag, i, ai, j, bj))
+        i, j = ai + size, bj + size
+        if size:
+            codes.append(("equal", ai, i, bj, j))
+    return codes
+
+
+def opcodes(a: Sequence[str], b: Sequence[str]) -> List[_Opcode]:
+    """SequenceMatcher-style opcodes; histogram diff for large inputs."""
+    if len(a) * len(b) <= SMALL_PRODUCT:
+        return difflib.SequenceMatcher(None, a, b).get_opcodes()
+    return _opcodes_from_blocks(_histogram_blocks(a, b), len(a), len(b))
+
+
+def _grouped(codes: List[_Opcode], n: int) -> Iterator[List[_Opcode]]:
+    # same grouping as difflib.SequenceMatcher.get_grouped_opcodes
+    codes = list(codes) or [("equal", 0, 1, 0, 1)]
+    if codes[0][0] == "equal":
+        tag, i1, i2, j1, j2 = codes[0]
+        codes[0] = tag, max(i1, i2 - n), i2, max(j1, j2 - n), j2
+    if codes[-1][0] == "equal":
+        tag, i1, i2, j1, j2 = codes[-1]
+        codes[-1] = tag, i1, min(i2, i1 + n), j1, min(j2, j1 + n)
+    nn = n + n
+    group: List[_Opcode] = []
+    for tag, i1, i2, j1, j2 in codes:
+        if tag == "equal" and i2 - i1 > nn:
+            group.append((tag, i1, min(i2, i1 + n), j1, min(j2, j1 + n)))
+            yield group
+            group = []
+            i1, j1 = max(i1, i2 - n), max(j1, j2 - n)
+        group.append((tag, i1, i2, j1, j2))
+    if group and not (len(group) == 1 and group[0][0] == "equal"):
+        yield group
+
+
+def _format_range(start: int, stop: int) -> str:
+    beginning = start + 1
+    length = stop - start
+    if length == 1:
+        return str(beginning)
+    if not length:
+        beginning -= 1
+    return f"{beginning},{length}"
+
+
+def unified_diff_text(a: str, b: str, fromfile: str = "", tofile: str = "", n: int = 3) -> str:
+    """`"".join(difflib.unified_diff(a.splitlines(True), b.splitlines(True), ...))`, faster.
+
+    The common prefix/suffix is found on the raw strings and only the
+    differing middle (plus `n` context lines) is split into lines and
+    matched; small middles use SequenceMatcher, large ones histogram diff.
+    The output format (headers, hunk ranges, grouping) is difflib's, plus
+    "\\ No newline at end of file" after a last line without newline. The
+    hunks themselves can differ from difflib's: trimming keeps the longest
+    common prefix, so when the change borders repeated lines another equally
+    small diff may be chosen ("ABCABCD" -> "ABCD" removes the second "ABC",
+    difflib the first), and large middles use histogram diff.
+    """
+    if a == b:
+        return ""
+    p = _common_prefix_len(a, b)
+    q = _common_suffix_len(a, b, min(len(a), len(b)) - p)
+    # whole lines only; the last prefix line / first suffix line may be partial
+    pre = a[:p].splitlines(keepends=True)[:-1]
+    suf_a = a[len(a) - q:].splitlines(keepends=True)[1:] if q else []
+    suf_len = sum(len(s) for s in suf_a)
+    p_chars = sum(len(s) for s in pre)
+    mid_a = a[p_chars:len(a) - suf_len].splitlines(keepends=True)
+    mid_b = b[p_chars:len(b) - suf_len].splitlines(keepends=True)
+    head = pre[max(len(pre) - n, 0):] if n else []
+    tail = suf_a[:n]
+    off = len(pre) - len(head)
+    a_lines = head + mid_a + tail
+    b_lines = head + mid_b + tail
+    codes = opcodes(mid_a, mid_b)
+    h, ma, mb = len(head), len(mid_a), len(mid_b)
+    parts: List[_Opcode] = []
+    if h:
+        parts.append(("equal", 0, h, 0, h))
+    parts.extend((t, i1 + h, i2 + h, j1 + h, j2 + h) for t, i1, i2, j1, j2 in codes)
+    if tail:
+        parts.append(("equal", h + ma, h + ma + len(tail), h + mb, h + mb + len(tail)))
+    # the context lines join the middle's own leading/trailing equal runs
+    full: List[_Opcode] = []
+    for op in parts:
+        if full and op[0] == "equal" and full[-1][0] == "equal":
+            full[-1] = ("equal", full[-1][1], op[2], full[-1][3], op[4])
+        else:
+            full.append(op)
+
+    out: List[str] = []
+    for group in _grouped(full, n):
+        if not out:
+            out.append(f"--- {fromfile}\n")
+            out.append(f"+++ {tofile}\n")
+        first, last = group[0], group[-1]
+        out.append(f"@@ -{_format_range(first[1] + off, last[2] + off)} +{_format_range(first[3] + off, last[4] + off)} @@\n")
+        for tag, i1, i2, j1, j2 in group:
+            if tag == "equal":
+                out.extend(" " + line for line in a_lines[i1:i2])
+                continue
+            if tag in ("replace", "delete"):
+                out.extend("-" + line for line in a_lines[i1:i2])
+            if tag in ("replace", "insert"):
+                out.extend("+" + line for line in b_lines[j1:j2])
+    if a.endswith("\n") and b.endswith("\n"):
+        return "".join(out)
+    # a last line without newline gets GNU's marker so the next line cannot run into it
+    return "".join(line if line.endswith("\n") else line + NO_NEWLINE for line in out)
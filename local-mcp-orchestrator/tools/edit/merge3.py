@@ -0,0 +1,70 @@
+from __future__ import annotations
+
+import difflib
+from typing import Dict, List, Sequence, Tuple
+
+
+# (base_start, base_end, other_start, other_end) of one non-equal opcode
+_Change = Tuple[int, int, int, int]
+
+
+def _changes(base: Sequence[str], other: Sequence[str]) -> List[_Change]:
+    sm = difflib.SequenceMatcher(None, base, other, autojunk=False)
+    return [(i1, i2, j1, j2) for tag, i1, i2, j1, j2 in sm.get_opcodes() if tag != "equal"]
+
+
+def _side_text(base: Sequence[str], other: Sequence[str], changes: List[_Change], start: int, end: int) -> List[str]:
+    """base[start:end] with this side's changes applied."""
+    out: List[str] = []
+    pos = start
+    for i1, i2, j1, j2 in changes:
+        out.extend(base[pos:i1])
+        out.extend(other[j1:j2])
+        pos = i2
+    out.extend(base[pos:end])
+    return out
+
+
+def merge3(base: Sequence[str], ours: Sequence[str], theirs: Sequence[str]) -> Tuple[List[str], List[Dict[str, int]]]:
+    """Line-based three-way merge.
+
+    Changes of `ours` and `theirs` relative to `base` are combined when their
+    base ranges do not overlap (edits of adjacent lines are fine); identical
+    edits on both sides are taken once. Returns (merged lines, conflicts),
+    where each conflict is {"base_start", "base_end"} (1-based, inclusive)
+    and the merged lines keep `ours` in conflicting regions.
+    """
+    events = sorted(
+        [(c, 0) for c in _changes(base, ours)] + [(c, 1) for c in _changes(base, theirs)],
+        key=lambda e: (e[0][0], e[0][1]),
+    )
+    sides = (ours, theirs)
+    out: List[str] = []
+    conflicts: List[Dict[str, int]] = []
+    pos = 0
+    k = 0
+    while k < len(events):
+        start, end = events[k][0][0], events[k][0][1]
+        group = [events[k]]
+        k += 1
+        while k < len(events):
+            i1, i2 = events[k][0][0], events[k][0][1]
+            # overlapping ranges, or an insertion at the boundary of another edit (order would be ambiguous)
+            if i1 < end or (i1 == end and (i1 == i2 or start == end)):
+                group.append(events[k])
+                end = max(end, i2)
+                k += 1
+            else:
+                break
+        out.extend(base[pos:start])
+        texts = []
+        for side in (0, 1):
+            changes = [c for c, s in group if s == side]
+            if changes:
+                texts.append(_side_text(base, sides[side], changes, start, end))
+        if len(texts) == 2 and texts[0] != texts[1]:
+            conflicts.append({"base_start": start + 1, "base_end": max(end, start + 1)})
+        out.extend(texts[0])
+        pos = end
+    out.extend(base[pos:])
+    return out, conflicts
@@ -0,0 +1,231 @@
+from __future__ import annotations
+
+import re
+from typing import Dict, Iterator, List, Optional, Tuple
+
+
+_RE_HUNK = re.compile(r"^@@ -(?P<a_start>\d+)(,(?P<a_count>\d+))? \+(?P<b_start>\d+)(,(?P<b_count>\d+))? @@")
+
+
+# marks a hunk line whose file line has no trailing newline
+NO_NEWLINE = "\n\\ No newline at end of file\n"
+
+
+class PatchError(Exception):
+    pass
+
+
+class Hunk:
+    """One `@@` section: its header numbers and the ' '/'-'/'+' prefixed lines.
+
+    Iterating a hunk yields its lines, so it can be used wherever a plain
+    list of hunk lines is expected.
+    """
+    __slots__ = ("a_start", "a_count", "b_start", "b_count", "lines")
+
+    def __init__(self, a_start: int, a_count: int, b_start: int, b_count: int, lines: Optional[List[str]] = None):
+        self.a_start = a_start
+        self.a_count = a_count
+        self.b_start = b_start
+        self.b_count = b_count
+        self.lines: List[str] = lines if lines is not None else []
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.lines)
+
+    def __len__(self) -> int:
+        return len(self.lines)
+
+    @property
+    def header(self) -> Dict[str, int]:
+        return {"a_start": self.a_start, "a_count": self.a_count, "b_start": self.b_start, "b_count": self.b_count}
+
+    def reversed(self) -> "Hunk":
+        # swap +/- and keep removals before additions within each changed run
+        lines: List[str] = []
+        removed: List[str] = []
+        added: List[str] = []
+        for hl in self.lines + [" "]:
+            if hl[:1] == "+":
+                removed.append("-" + hl[1:])
+            elif hl[:1] == "-":
+                added.append("+" + hl[1:])
+            else:
+                lines += removed + added
+                removed, added = [], []
+                lines.append(hl)
+        lines.pop()
+        return Hunk(self.b_start, self.b_count, self.a_start, self.a_count, lines)
+
+    def text(self) -> str:
+        def rng(start: int, count: int) -> str:
+            return str(start) if count == 1 else f"{start},{count}"
+        body = "".join(hl if hl.endswith("\n") else hl + NO_NEWLINE for hl in self.lines)
+        return f"@@ -{rng(self.a_start, self.a_count)} +{rng(self.b_start, self.b_count)} @@\n" + body
+
+
+class FileDiff:
+    """One `--- / +++` section of a unified diff."""
+    __slots__ = ("a_rel", "b_rel", "hunks", "_counts")
+
+    def __init__(self, a_rel: Optional[str], b_rel: Optional[str], hunks: Optional[List[Hunk]] = None):
+        self.a_rel = a_rel  # None for /dev/null
+        self.b_rel = b_rel
+        self.hunks: List[Hunk] = hunks if hunks is not None else []
+        self._counts: Optional[Tuple[int, int]] = None
+
+    @property
+    def rel(self) -> Optional[str]:
+        return self.b_rel if self.b_rel is not None else self.a_rel
+
+    @property
+    def mode(self) -> str:
+        if self.a_rel is None:
+            return "create"
+        if self.b_rel is None:
+            return "delete"
+        return "modify"
+
+    @property
+    def headers(self) -> List[Dict[str, int]]:
+        return [h.header for h in self.hunks]
+
+    def counts(self) -> Tuple[int, int]:
+        if self._counts is None:
+            added = sum(1 for h in self.hunks for hl in h.lines if hl.startswith('+'))
+            removed = sum(1 for h in self.hunks for hl in h.lines if hl.startswith('-'))
+            self._counts = (added, removed)
+        return self._counts
+
+    def reversed(self) -> "FileDiff":
+        return FileDiff(self.b_rel, self.a_rel, [h.reversed() for h in self.hunks])
+
+    def text(self) -> str:
+        a = f"a/{self.a_rel}" if self.a_rel is not None else "/dev/null"
+        b = f"b/{self.b_rel}" if self.b_rel is not None else "/dev/null"
+        return f"--- {a}\n+++ {b}\n" + "".join(h.text() for h in self.hunks)
+
+
+class Patch:
+    """A parsed unified diff; parse once, then verify, apply, reverse or report on it."""
+    __slots__ = ("files",)
+
+    def __init__(self, files: List[FileDiff]):
+        self.files = files
+
+    def __iter__(self) -> Iterator[FileDiff]:
+        return iter(self.files)
+
+    def __len__(self) -> int:
+        return len(self.files)
+
+    def counts(self) -> Tuple[int, int]:
+        added = removed = 0
+        for fd in self.files:
+            a, r = fd.counts()
+            added += a
+            removed += r
+        return added, removed
+
+    def reversed(self) -> "Patch":
+        return Patch([fd.reversed() for fd in self.files])
+
+    def text(self) -> str:
+        return "".join(fd.text() for fd in self.files)
+
+    @classmethod
+    def parse(cls, diff_text: str) -> "Patch":
+        lines = diff_text.splitlines(keepends=True)
+        i = 0
+        files: List[FileDiff] = []
+        while i < len(lines):
+            # Skip empty lines
+            if not lines[i].strip():
+                i += 1
+                continue
+            a_path, b_path, i = _parse_file_header(lines, i)
+            fd = file_diff(a_path, b_path)
+            while i < len(lines) and lines[i].startswith('@@ '):
+                h = parse_hunk_header(lines[i])
+                left = (h.a_count, h.b_count)
+                i += 1
+                while i < len(lines):
+                    nxt = body_line(lines[i], left)
+                    if nxt is not None:
+                        h.lines.append(lines[i])
+                        left = nxt
+                        i += 1
+                    elif lines[i].startswith('\\') and h.lines:
+                        # "\ No newline at end of file": the previous line has none
+                        if h.lines[-1].endswith('\n'):
+                            h.lines[-1] = h.lines[-1][:-1]
+                        i += 1
+                    else:
+                        # end of hunk (unexpected tag)
+                        break
+                fd.hunks.append(h)
+            files.append(fd)
+            # Skip until next file header or end
+            while i < len(lines) and not lines[i].startswith('--- '):
+                i += 1
+        return cls(files)
+
+
+def parse_hunk_header(line: str) -> Hunk:
+    """An empty Hunk from its `@@ -a,b +c,d @@` line."""
+    m = _RE_HUNK.match(line)
+    if not m:
+        raise PatchError("bad hunk header")
+    # an omitted count means 1 ("@@ -5 +4,0 @@")
+    return Hunk(
+        int(m.group('a_start')),
+        int(m.group('a_count')) if m.group('a_count') is not None else 1,
+        int(m.group('b_start')),
+        int(m.group('b_count')) if m.group('b_count') is not None else 1,
+    )
+
+
+def body_line(line: str, left: Tuple[int, int]) -> Optional[Tuple[int, int]]:
+    """(old, new) lines still expected after `line` if it continues a hunk expecting `left`, else None.
+
+    Within the header counts every ' '/'-'/'+' line is hunk body, so removing
+    a line "-- x" ("--- x" in the diff) does not end the hunk; past them (a
+    miscounted hunk) a line that looks like a file header ends it.
+    """
+    tag = line[:1]
+    if tag not in (' ', '+', '-'):
+        return None
+    old = left[0] - (tag != '+')
+    new = left[1] - (tag != '-')
+    if (old < 0 or new < 0) and line.startswith(('--- ', '+++ ')):
+        return None
+    return old, new
+
+
+def file_diff(a_path: str, b_path: str) -> FileDiff:
+    """An empty FileDiff from the paths of its `---`/`+++` lines."""
+    fd = FileDiff(_norm(a_path), _norm(b_path))
+    if fd.a_rel is not None and fd.b_rel is not None and fd.a_rel != fd.b_rel:
+        raise PatchError("renames not supported in this minimal applier")
+    if fd.rel is None or fd.rel.startswith('/'):  # absolute forbidden or cannot infer
+        raise PatchError("absolute paths not allowed")
+    return fd
+
+
+def _norm(h: str) -> Optional[str]:
+    # strip a/ and b/ prefixes, handle /dev/null
+    if h == '/dev/null':
+        return None
+    return h[2:] if h.startswith(('a/', 'b/')) else h
+
+
+def _parse_file_header(lines: List[str], i: int) -> Tuple[str, str, int]:
+    if i >= len(lines) or not lines[i].startswith('--- '):
+        raise PatchError("expected --- header")
+    a_path = lines[i][4:].strip()
+    i += 1
+    if i >= len(lines) or not lines[i].startswith('+++ '):
+        raise PatchError("expected +++ header")
+    b_path = lines[i][4:].strip()
+    i += 1
+    return a_path, b_path, i
@@ -2,17 +2,22 @@ from __future__ import annotations
 
 import json
 import io
-import difflib
 from pathlib import Path
-import hashlib
 import os
-import difflib
-from typing import Optional
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Dict, List, Optional, Tuple
+
+from .blobs import get_store
+from .fastdiff import unified_diff_text
 
 
 ROOT_DIR = Path(__file__).resolve().parents[2]
 
 MAX_BYTES = 2_000_000
+# batches with at least this much new content (and 2+ files) are planned in a process pool
+PARALLEL_MIN_BYTES = 256_000
+PLAN_WORKERS = min(8, os.cpu_count() or 1)
 EXCLUDES = {".git", "node_modules", ".venv", "__pycache__", "dist", "build"}
 
 
@@ -40,37 +45,60 @@ def make_unified_diff(path: str, new_content: str, context: int = 3) -> str:
     p = _safe_path(path)
     exists = p.exists()
     old = _read_text_safe(p)
-    old_lines = old.splitlines(keepends=True)
-    new_lines = (new_content or "").splitlines(keepends=True)
 
     fromfile = f"a/{path}" if exists else "/dev/null"
     tofile = f"b/{path}" if new_content != "" else "/dev/null"
-    diff = difflib.unified_diff(old_lines, new_lines, fromfile=fromfile, tofile=tofile, n=context)
-    return "".join(diff)
+    return unified_diff_text(old, new_content or "", fromfile=fromfile, tofile=tofile, n=context)
 
 
-def plan_patch(payload: dict) -> dict:
-    rel = payload["path"]
-    new_text: str = payload.get("new_content", "")
-    ctx = int(payload.get("context", 3))
+class PlanError(Exception):
+    pass
+
 
-    # path safety
+def resolve_path(rel: str) -> Path:
+    """Resolve `rel` inside the workspace (symlinks included)."""
     root = os.path.realpath(str(ROOT_DIR))
     tgt = os.path.realpath(os.path.join(root, rel))
     if os.path.commonpath([root, tgt]) != root:
-        return {"error": "path escapes workspace"}
+        raise PlanError("path escapes workspace")
+    return Path(tgt)
 
-    p = Path(tgt)
+
+def is_large(p: Path) -> bool:
+    """True if `p` exists and is above MAX_BYTES (planned by stream_patch instead)."""
+    try:
+        return p.stat().st_size > MAX_BYTES
+    except OSError:
+        return False
+
+
+def load_base(rel: str) -> Tuple[Path, bool, bytes]:
+    """Resolve `rel` inside the workspace and read its current bytes (b"" if missing)."""
+    p = resolve_path(rel)
     exists = p.exists()
+    if is_large(p):
+        raise PlanError("file too large")
     base_b = p.read_bytes() if exists else b""
+    if _is_binary(base_b):
+        raise PlanError("binary file not supported")
+    return p, exists, base_b
+
+
+def decode_base(base_b: bytes) -> str:
+    return base_b.decode("utf-8", errors="surrogatepass")
+
+
+def plan_from_text(rel: str, exists: bool, base_b: bytes, new_text: str, ctx: int = 3) -> dict:
+    """Diff the current bytes of `rel` against `new_text`; the common output of all planners."""
     new_b = new_text.encode("utf-8", "surrogatepass")
-    if len(base_b) > MAX_BYTES or len(new_b) > MAX_BYTES:
-        return {"error": "file too large"}
-    if _is_binary(base_b) or _is_binary(new_b):
-        return {"error": "binary file not supported"}
+    if len(new_b) > MAX_BYTES:
+        raise PlanError("file too large")
+    if _is_binary(new_b):
+        raise PlanError("binary file not supported")
 
-    base_text = base_b.decode("utf-8", errors="surrogatepass") if exists else ""
-    base_hash = hashlib.sha256(base_b).hexdigest() if exists else None
+    base_text = decode_base(base_b) if exists else ""
+    # keep the base so ApplyPatch can three-way merge if the file changes before apply
+    base_hash = get_store().put(base_b) if exists else None
 
     if not exists and new_text == "":
         return {"path": rel, "base_hash": None, "diff": "", "no_changes": True}
@@ -80,12 +108,72 @@ def plan_patch(payload: dict) -> dict:
 
     fromfile = f"a/{rel}" if exists else "/dev/null"
     tofile = f"b/{rel}" if new_text != "" else "/dev/null"
-    diff_lines = list(difflib.unified_diff(
-        base_text.splitlines(keepends=True),
-        new_text.splitlines(keepends=True),
-        fromfile=fromfile, tofile=tofile, n=ctx,
-    ))
-    return {"path": rel, "base_hash": base_hash, "diff": "".join(diff_lines), "no_changes": False}
+    diff = unified_diff_text(base_text, new_text, fromfile=fromfile, tofile=tofile, n=ctx)
+    return {"path": rel, "base_hash": base_hash, "diff": diff, "no_changes": False}
+
+
+def plan_patch(payload: dict) -> dict:
+    if "files" in payload:
+        return plan_batch(payload)
+    rel = payload["path"]
+    new_text: str = payload.get("new_content", "")
+    ctx = int(payload.get("context", 3))
+    try:
+        p = resolve_path(rel)
+        if is_large(p):
+            from .stream_patch import plan_large
+            return plan_large(rel, p, new_text, ctx)
+        _, exists, base_b = load_base(rel)
+        return plan_from_text(rel, exists, base_b, new_text, ctx)
+    except PlanError as e:
+        return {"error": str(e)}
+
+
+def _plan_all(jobs: List[Dict[str, Any]]) -> List[dict]:
+    total = sum(len(j["new_content"]) for j in jobs)
+    if len(jobs) > 1 and total >= PARALLEL_MIN_BYTES and PLAN_WORKERS > 1:
+        # hashing and diffing are CPU-bound; threads would serialize on the GIL
+        try:
+            with ProcessPoolExecutor(max_workers=min(PLAN_WORKERS, len(jobs))) as ex:
+                return list(ex.map(plan_patch, jobs))
+        except (OSError, BrokenProcessPool):
+            pass  # no process support here (sandbox, /dev/shm); plan serially
+    return [plan_patch(j) for j in jobs]
+
+
+def plan_batch(payload: dict) -> dict:
+    """plan_patch for several files at once.
+
+    payload: {files: [{path, new_content, context?}, ...], context?}
+    Returns {files: [...per-file results], diff, base_hashes, no_changes};
+    `diff` and `base_hashes` can be passed to ApplyPatch as is.
+    """
+    items = payload.get("files")
+    if not isinstance(items, list) or not items:
+        return {"error": "files must be a non-empty list"}
+    ctx = int(payload.get("context", 3))
+    jobs: List[Dict[str, Any]] = []
+    seen = set()
+    for n, it in enumerate(items):
+        if not isinstance(it, dict) or not it.get("path"):
+            return {"error": f"files[{n}]: path is required"}
+        key = os.path.normpath(it["path"])
+        if key in seen:
+            return {"error": f"{it['path']}: file appears more than once"}
+        seen.add(key)
+        jobs.append({"path": it["path"], "new_content": it.get("new_content", ""),
+                     "context": int(it.get("context", ctx))})
+    results = _plan_all(jobs)
+    errors = [f"{j['path']}: {r['error']}" for j, r in zip(jobs, results) if "error" in r]
+    if errors:
+        return {"error": "; ".join(errors), "files": results}
+    diff = "".join(r["diff"] for r in results)
+    return {
+        "files": [{k: v for k, v in r.items() if k != "diff"} for r in results],
+        "diff": diff,
+        "base_hashes": {r["path"]: r["base_hash"] for r in results if r.get("base_hash")},
+        "no_changes": not diff,
+    }
 
 
 def run(input_str: str) -> str:
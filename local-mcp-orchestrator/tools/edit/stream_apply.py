@@ -0,0 +1,222 @@
+from __future__ import annotations
+
+import hashlib
+import os
+import time
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from .apply_patch import (
+    ROOT_DIR,
+    STREAM_THRESHOLD,
+    HunkApplier,
+    PatchError,
+    _Staged,
+    _TXN_LOCK,
+    _commit,
+    _recover_locked,
+    _safe_path,
+    _stage,
+    format_result,
+)
+from .patch_model import FileDiff, Hunk, body_line, file_diff, parse_hunk_header
+
+
+class _File:
+    __slots__ = ("fd", "target", "rel", "live", "stamp", "existed", "old_mode")
+
+    def __init__(self, fd: FileDiff, target: Path, rel: str):
+        self.fd = fd
+        self.target = target
+        self.rel = rel
+        self.live: Optional[HunkApplier] = None  # None: verified by _stage at finish()
+        self.stamp: Optional[Tuple[int, int]] = None  # (size, mtime_ns) when read
+        self.existed = False
+        self.old_mode: Optional[int] = None
+
+
+class StreamingPatchSession:
+    """Verify a unified diff hunk by hunk while it is still being generated.
+
+    feed() takes arbitrary pieces of diff text. Each hunk is checked against
+    the target file (same positioning as ApplyPatch) as soon as the line after
+    it arrives, and raises PatchError on the first mismatch so the caller can
+    stop generating. finish() commits the already verified result as one
+    transaction. Files that need more than the in-memory applier (deletes,
+    files above STREAM_THRESHOLD, files changed since plan) are verified by
+    the regular staging code in finish().
+    """
+
+    def __init__(self, base_hashes: Optional[Dict[str, str]] = None, dry_run: bool = False):
+        self.base_hashes = dict(base_hashes or {})
+        self.dry_run = dry_run
+        self.files: List[_File] = []
+        self.received = 0  # characters fed so far
+        self.verified = 0  # hunks checked so far
+        self._buf = ""
+        self._a_path: Optional[str] = None  # `---` line waiting for its `+++`
+        self._hunk: Optional[Hunk] = None
+        self._left = (0, 0)  # (old, new) lines the open hunk's header still expects
+        self._skip = False  # junk after a hunk: ignore lines until the next file
+
+    def feed(self, chunk: str) -> List[Dict[str, int]]:
+        """Consume a piece of diff text; returns {path, hunk, applied_at, offset, fuzz} per hunk verified."""
+        self.received += len(chunk)
+        self._buf += chunk
+        cut = self._buf.rfind("\n") + 1
+        if not cut:
+            return []
+        done, self._buf = self._buf[:cut], self._buf[cut:]
+        events: List[Dict[str, int]] = []
+        for line in done.splitlines(keepends=True):
+            self._line(line, events)
+        return events
+
+    def _line(self, line: str, events: List[Dict[str, int]]) -> None:
+        h = self._hunk
+        if line.startswith("\\"):
+            # "\ No newline at end of file": the previous line has none
+            if h is not None and h.lines and h.lines[-1].endswith("\n"):
+                h.lines[-1] = h.lines[-1][:-1]
+            return
+        if h is not None:
+            nxt = body_line(line, self._left)
+            if nxt is not None:
+                h.lines.append(line)
+                self._left = nxt
+                return
+        # any other line ends the hunk (the line after it may still have been a "\ No newline")
+        self._close_hunk(events)
+        if line.startswith("--- "):
+            self._a_path, self._skip = line[4:].strip(), False
+        elif self._a_path is not None:
+            if not line.startswith("+++ "):
+                raise PatchError("expected +++ header")
+            self._open_file(self._a_path, line[4:].strip())
+            self._a_path = None
+        elif line.startswith("@@ ") and not self._skip:
+            if not self.files:
+                raise PatchError("expected --- header")
+            self._hunk = parse_hunk_header(line)
+            self._left = (self._hunk.a_count, self._hunk.b_count)
+            self.files[-1].fd.hunks.append(self._hunk)
+        elif self.files and line.strip():
+            self._skip = True  # like Patch.parse: the rest of this file section is ignored
+
+    def _open_file(self, a_path: str, b_path: str) -> None:
+        fd = file_diff(a_path, b_path)
+        try:
+            target = _safe_path(fd.rel or "")
+        except ValueError as e:
+            raise PatchError(str(e)) from None
+        rel = str(target.relative_to(ROOT_DIR))
+        if any(f.rel == rel for f in self.files):
+            raise PatchError(f"{rel}: file appears more than once in diff")
+        f = _File(fd, target, rel)
+        self.files.append(f)
+        if fd.mode == "create":
+            if target.exists():
+                raise PatchError(f"{rel}: conflict: file appeared since plan")
+            f.live = HunkApplier([])
+        elif fd.mode == "modify":
+            f.existed = target.exists()
+            if not f.existed:
+                f.live = HunkApplier([])
+                return
+            st = os.stat(target)
+            if st.st_size > STREAM_THRESHOLD:
+                return
+            data = target.read_bytes()
+            base_hash = self.base_hashes.get(fd.rel or "", "")
+            if base_hash and hashlib.sha256(data).hexdigest() != base_hash:
+                return  # changed since plan: finish() tries the three-way merge
+            try:
+                orig = data.decode("utf-8")
+            except UnicodeDecodeError:
+                orig = data.decode("utf-8", errors="ignore")
+            f.live = HunkApplier(orig.splitlines(keepends=True))
+            f.stamp = (st.st_size, st.st_mtime_ns)
+            f.old_mode = st.st_mode
+
+    def _close_hunk(self, events: List[Dict[str, int]]) -> None:
+        h, self._hunk = self._hunk, None
+        f = self.files[-1] if self.files else None
+        if h is None or f is None or f.live is None:
+            return
+        try:
+            rep = f.live.add(h.lines, h.header)
+        except PatchError as e:
+            raise PatchError(f"{f.rel}: {e}") from None
+        self.verified += 1
+        events.append({"path": f.rel, "hunk": len(f.live.report), **rep})
+
+    def _still_valid(self, f: _File) -> bool:
+        # the target is as it was when its hunks were verified
+        if f.fd.mode == "create" or not f.existed:
+            return not f.target.exists()
+        try:
+            st = os.stat(f.target)
+        except OSError:
+            return False
+        return (st.st_size, st.st_mtime_ns) == f.stamp
+
+    def end_input(self) -> List[Dict[str, int]]:
+        """The diff is complete: verify the last line and hunk; returns their events like feed()."""
+        events: List[Dict[str, int]] = []
+        if self._buf:
+            self._line(self._buf, events)
+            self._buf = ""
+        self._close_hunk(events)
+        return events
+
+    def finish(self) -> List[_Staged]:
+        """Verify what is left and apply all files as one transaction (nothing is written on error)."""
+        self.end_input()
+        if self._a_path is not None:
+            raise PatchError("expected +++ header")
+        if not self.files:
+            raise PatchError("empty diff")
+        with _TXN_LOCK:
+            if not self.dry_run:
+                _recover_locked()
+            staged: List[_Staged] = []
+            for f in self.files:
+                if f.live is not None and self._still_valid(f):
+                    staged.append(_Staged(f.fd, f.target, f.rel, "".join(f.live.result()), existed=f.existed,
+                                          old_mode=f.old_mode, hunk_report=f.live.report))
+                    continue
+                try:
+                    staged.append(_stage(f.fd, self.base_hashes.get(f.fd.rel or "", ""), True))
+                except PatchError as e:
+                    raise PatchError(f"{f.rel}: {e}") from None
+            if not self.dry_run:
+                _commit([s for s in staged if s.writes or s.existed])
+        return staged
+
+
+def consume(chunks: Iterable[str], base_hashes: Optional[Dict[str, str]] = None, dry_run: bool = False,
+            on_hunk: Optional[Callable[[Dict[str, int]], None]] = None) -> str:
+    """Apply a diff from a stream of text pieces (e.g. a model's token stream).
+
+    On the first mismatch the source iterator is closed (for a generator
+    this stops generation) and nothing is written.
+    Returns ApplyPatch's status + footer, or `[apply_patch] aborted ...`.
+    """
+    session = StreamingPatchSession(base_hashes, dry_run)
+    t0 = time.perf_counter()
+    it = iter(chunks)
+    try:
+        for chunk in it:
+            for ev in session.feed(chunk):
+                if on_hunk is not None:
+                    on_hunk(ev)
+        for ev in session.end_input():
+            if on_hunk is not None:
+                on_hunk(ev)
+        staged = session.finish()
+    except PatchError as e:
+        close = getattr(it, "close", None)
+        if close is not None:
+            close()
+        return f"[apply_patch] aborted after {session.received} chars ({session.verified} hunk(s) verified): {e}"
+    return format_result(staged, t0)
@@ -0,0 +1,404 @@
+from __future__ import annotations
+
+import hashlib
+import mmap
+import os
+import re
+from pathlib import Path
+from typing import Any, BinaryIO, Callable, Dict, List, Optional, Tuple
+
+from .fastdiff import unified_diff_text
+from .patch_model import Hunk
+from .plan_patch import MAX_BYTES, PlanError
+
+
+# files above this size are planned/applied through the mmap paths below
+STREAM_THRESHOLD = MAX_BYTES
+# unchanged ranges are copied, hashed and scanned in pieces of this size
+COPY_CHUNK = 1 << 20
+COUNT_CHUNK = 1 << 16
+
+_RE_RANGES = re.compile(r"^@@ -(\d+)(,\d+)? \+(\d+)(,\d+)? @@", re.M)
+
+# (start offset, end offset, replacement bytes) in the original file
+Span = Tuple[int, int, bytes]
+
+
+def hash_file(path: Path | str) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(COPY_CHUNK), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def _encode(s: str) -> bytes:
+    return s.encode("utf-8", "surrogatepass")
+
+
+def _count_nl(mm: mmap.mmap, start: int, end: int) -> int:
+    n = 0
+    for off in range(start, end, COUNT_CHUNK):
+        n += mm[off:min(off + COUNT_CHUNK, end)].count(b"\n")
+    return n
+
+
+class LineCursor:
+    """Forward-only line number -> byte offset mapping over an mmap (lines end with b"\\n")."""
+
+    def __init__(self, mm: mmap.mmap, line: int = 0, off: int = 0):
+        self.mm = mm
+        self.line = line  # 0-based index of the line starting at `off`
+        self.off = off
+
+    def clone(self) -> "LineCursor":
+        return LineCursor(self.mm, self.line, self.off)
+
+    def seek(self, line: int) -> int:
+        """Move to the start of `line` (or EOF) and return its offset."""
+        mm, size = self.mm, len(self.mm)
+        while self.line < line and self.off < size:
+            need = line - self.line
+            chunk = mm[self.off:min(self.off + COUNT_CHUNK, size)]
+            c = chunk.count(b"\n")
+            if c >= need:
+                pos = -1
+                for _ in range(need):
+                    pos = chunk.find(b"\n", pos + 1)
+                self.off += pos + 1
+                self.line = line
+            elif c:
+                self.off += chunk.rfind(b"\n") + 1
+                self.line += c
+            else:
+                # line longer than a chunk
+                nl = mm.find(b"\n", self.off + len(chunk))
+                self.off = size if nl == -1 else nl + 1
+                self.line += 1
+        return self.off
+
+
+def _open_map(path: Path) -> Tuple[BinaryIO, mmap.mmap]:
+    f = open(path, "rb")
+    try:
+        return f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    except Exception:
+        f.close()
+        raise
+
+
+def _copy(mm: mmap.mmap, start: int, end: int, out: BinaryIO) -> None:
+    for off in range(start, end, COPY_CHUNK):
+        out.write(mm[off:min(off + COPY_CHUNK, end)])
+
+
+# -- apply --------------------------------------------------------------------
+
+def _find_near(mm: mmap.mmap, block: bytes, cur: LineCursor, expected: int, window: int) -> Optional[Tuple[int, int]]:
+    """(line, offset) of the occurrence of `block` at a line start nearest to `expected`."""
+    lo = cur.clone()
+    lo_off = lo.seek(max(expected - window, cur.line))
+    hi_off = lo.clone().seek(expected + window + block.count(b"\n") + 1)
+    best: Optional[Tuple[int, int]] = None
+    line, last = lo.line, lo_off
+    p = mm.find(block, lo_off, hi_off)
+    while p != -1:
+        line += _count_nl(mm, last, p)
+        last = p
+        at_line_start = p == 0 or mm[p - 1:p] == b"\n"
+        at_line_end = block.endswith(b"\n") or p + len(block) == len(mm)
+        if at_line_start and at_line_end:
+            if best is None or abs(line - expected) < abs(best[0] - expected):
+                best = (line, p)
+            elif line > expected:
+                break
+        p = mm.find(block, p + 1, hi_off)
+    return best
+
+
+def locate_hunks(mm: mmap.mmap, hunks: List[Hunk], window: int,
+                 max_fuzz: int) -> Tuple[List[Span], List[Dict[str, int]]]:
+    """Byte-level counterpart of apply_patch._apply_hunks_to_text over a mapped file.
+
+    Same positioning rules (own header, offset search within `window` lines,
+    up to `max_fuzz` dropped context lines), but only the hunk windows are
+    read; the result is a list of byte spans to replace instead of new text.
+    Raises ValueError(hunk number, a_start) when a hunk cannot be placed.
+    """
+    spans: List[Span] = []
+    report: List[Dict[str, int]] = []
+    cur = LineCursor(mm)
+    carry = 0
+    for n, h in enumerate(hunks):
+        lines = [hl for hl in h.lines if hl]
+        a_start = h.a_start
+        expected = (a_start if h.a_count == 0 else a_start - 1) + carry
+        lead = next((k for k, hl in enumerate(lines) if hl[0] != " "), len(lines))
+        trail = next((k for k, hl in enumerate(reversed(lines)) if hl[0] != " "), len(lines))
+        found: Optional[Tuple[int, int]] = None
+        body = lines
+        prev = None
+        cut_lead = 0
+        for fuzz in range(max_fuzz + 1):
+            cut_lead, cut_trail = min(fuzz, lead), min(fuzz, trail)
+            if (cut_lead, cut_trail) == prev:
+                break
+            prev = (cut_lead, cut_trail)
+            body = lines[cut_lead:len(lines) - cut_trail] if (cut_lead or cut_trail) else lines
+            old = b"".join(_encode(hl[1:]) for hl in body if hl[0] != "+")
+            if not old:
+                target = max(expected + cut_lead, cur.line)
+                c = cur.clone()
+                off = c.seek(target)
+                found = (c.line, off)
+                break
+            found = _find_near(mm, old, cur, expected + cut_lead, window)
+            if found is not None:
+                break
+        if found is None:
+            raise ValueError(n + 1, a_start)
+        line, off = found
+        old_b = b"".join(_encode(hl[1:]) for hl in body if hl[0] != "+")
+        new_b = b"".join(_encode(hl[1:]) for hl in body if hl[0] != "-")
+        offset = line - (expected - carry) - cut_lead
+        carry = offset
+        spans.append((off, off + len(old_b), new_b))
+        cur = LineCursor(mm, line + sum(1 for hl in body if hl[0] != "+"), off + len(old_b))
+        report.append({"applied_at": line + 1, "offset": offset, "fuzz": fuzz})
+    return spans, report
+
+
+def stage_stream(path: Path, hunks: List[Hunk], window: int,
+                 max_fuzz: int) -> Tuple[Callable[[BinaryIO], None], List[Dict[str, int]]]:
+    """Locate hunks in a large file; returns a writer that streams the patched file and the hunk report."""
+    st = os.stat(path)
+    f, mm = _open_map(path)
+    try:
+        spans, report = locate_hunks(mm, hunks, window, max_fuzz)
+    finally:
+        mm.close()
+        f.close()
+
+    def write(out: BinaryIO) -> None:
+        now = os.stat(path)
+        if (now.st_size, now.st_mtime_ns) != (st.st_size, st.st_mtime_ns):
+            raise ValueError("file changed while applying")
+        src, m = _open_map(path)
+        try:
+            pos = 0
+            for start, end, repl in spans:
+                _copy(m, pos, start, out)
+                out.write(repl)
+                pos = end
+            _copy(m, pos, len(m), out)
+        finally:
+            m.close()
+            src.close()
+
+    return write, report
+
+
+# -- plan ---------------------------------------------------------------------
+
+def _shift_ranges(diff: str, a_off: int, b_off: int) -> str:
+    def repl(m: re.Match) -> str:
+        return f"@@ -{int(m.group(1)) + a_off}{m.group(2) or ''} +{int(m.group(3)) + b_off}{m.group(4) or ''} @@"
+    return _RE_RANGES.sub(repl, diff)
+
+
+def diff_spans(mm: mmap.mmap, spans: List[Span], fromfile: str, tofile: str, ctx: int = 3) -> str:
+    """Unified diff of the mapped file against itself with `spans` replaced.
+
+    Only windows of whole lines around the spans (plus `ctx` lines) are
+    decoded and diffed; windows closer than that are merged.
+    """
+    size = len(mm)
+    windows: List[List[Any]] = []  # [start, end, spans]
+    for s, e, repl in spans:
+        # whole lines around the span, plus ctx lines on each side
+        ws = mm.rfind(b"\n", 0, s) + 1
+        for _ in range(ctx):
+            if ws > 0:
+                ws = mm.rfind(b"\n", 0, ws - 1) + 1
+        we = e
+        if 0 < we < size and mm[we - 1:we] != b"\n":
+            nl = mm.find(b"\n", we)
+            we = size if nl == -1 else nl + 1
+        for _ in range(ctx):
+            if we < size:
+                nl = mm.find(b"\n", we)
+                we = size if nl == -1 else nl + 1
+        if windows and ws <= windows[-1][1]:
+            windows[-1][1] = max(windows[-1][1], we)
+            windows[-1][2].append((s, e, repl))
+        else:
+            windows.append([ws, we, [(s, e, repl)]])
+    hunks: List[str] = []
+    line = 0
+    last = 0
+    delta = 0
+    for ws, we, wspans in windows:
+        line += _count_nl(mm, last, ws)
+        last = ws
+        old_b = mm[ws:we]
+        parts: List[bytes] = []
+        pos = ws
+        for s, e, repl in wspans:
+            parts.append(mm[pos:s])
+            parts.append(repl)
+            pos = e
+        parts.append(mm[pos:we])
+        old = old_b.decode("utf-8", errors="surrogatepass")
+        new = b"".join(parts).decode("utf-8", errors="surrogatepass")
+        d = unified_diff_text(old, new, n=ctx)
+        if d:
+            body = d.split("\n", 2)[2]  # drop the ---/+++ lines
+            hunks.append(_shift_ranges(body, line, line + delta))
+        delta += len(new.splitlines()) - len(old.splitlines())
+    if not hunks:
+        return ""
+    return f"--- {fromfile}\n+++ {tofile}\n" + "".join(hunks)
+
+
+def _common_prefix(mm: mmap.mmap, data: bytes) -> int:
+    limit = min(len(mm), len(data))
+    off = 0
+    while off < limit:
+        end = min(off + COPY_CHUNK, limit)
+        a, b = mm[off:end], data[off:end]
+        if a != b:
+            return off + next(i for i in range(len(a)) if a[i] != b[i])
+        off = end
+    return limit
+
+
+def _common_suffix(mm: mmap.mmap, data: bytes, limit: int) -> int:
+    n = 0
+    while n < limit:
+        step = min(COPY_CHUNK, limit - n)
+        a = mm[len(mm) - n - step:len(mm) - n]
+        b = data[len(data) - n - step:len(data) - n]
+        if a != b:
+            return n + next(i for i in range(1, step + 1) if a[-i] != b[-i]) - 1
+        n += step
+    return limit
+
+
+def _check_text(mm: mmap.mmap) -> None:
+    if mm.find(b"\x00") != -1:
+        raise PlanError("binary file not supported")
+
+
+def plan_large(rel: str, path: Path, new_text: str, ctx: int = 3) -> Dict[str, Any]:
+    """plan_patch for files above STREAM_THRESHOLD: diff only the changed middle."""
+    new_b = _encode(new_text)
+    if b"\x00" in new_b:
+        raise PlanError("binary file not supported")
+    base_hash = hash_file(path)
+    if new_text == "":
+        # deletion: the diff is the whole file; refuse rather than materialize it
+        raise PlanError("deleting a large file is not supported by plan_patch; use FS.Delete")
+    f, mm = _open_map(path)
+    try:
+        _check_text(mm)
+        p = _common_prefix(mm, new_b)
+        if p == len(mm) == len(new_b):
+            return {"path": rel, "base_hash": base_hash, "diff": "", "no_changes": True, "streamed": True}
+        q = _common_suffix(mm, new_b, min(len(mm), len(new_b)) - p)
+        span = (p, len(mm) - q, new_b[p:len(new_b) - q])
+        diff = diff_spans(mm, [span], f"a/{rel}", f"b/{rel}", ctx)
+    finally:
+        mm.close()
+        f.close()
+    return {"path": rel, "base_hash": base_hash, "diff": diff, "no_changes": not diff, "streamed": True}
+
+
+def resolve_edits(mm: mmap.mmap, edits: List[Dict[str, Any]]) -> List[Span]:
+    """edit_ops semantics (positions refer to the original file) resolved on a mapped file."""
+    from .edit_ops import OPS, as_lines, normalize
+
+    first_nl = mm.find(b"\n")
+    nl = "\r\n" if first_nl > 0 and mm[first_nl - 1:first_nl] == b"\r" else "\n"
+    size = len(mm)
+
+    def line_of(off: int) -> int:
+        return _count_nl(mm, 0, off) + 1
+
+    spans: List[Tuple[int, int, bytes, int]] = []
+    for i, ed in enumerate(edits):
+        op = ed.get("op")
+        if op == "replace_lines":
+            try:
+                a, b = int(ed["start"]), int(ed.get("end", ed["start"]))
+            except (KeyError, TypeError, ValueError):
+                raise PlanError(f"edit {i}: replace_lines needs integer start/end")
+            if not 1 <= a <= b:
+                raise PlanError(f"edit {i}: bad line range {a}-{b}")
+            cur = LineCursor(mm)
+            s = cur.seek(a - 1)
+            e = cur.seek(b)
+            if cur.line < b:
+                raise PlanError(f"edit {i}: line range {a}-{b} outside file ({cur.line} lines)")
+            spans.append((s, e, _encode(as_lines(normalize(ed.get("text"), nl), nl)), i))
+        elif op == "search_replace":
+            search = _encode(normalize(ed.get("search"), nl))
+            if not search:
+                raise PlanError(f"edit {i}: empty search")
+            replace = _encode(normalize(ed.get("replace"), nl))
+            found = []
+            p = mm.find(search)
+            while p != -1:
+                found.append(p)
+                if len(found) > 1 and not ed.get("all"):
+                    break
+                p = mm.find(search, p + len(search))
+            if not found:
+                raise PlanError(f"edit {i}: search text not found")
+            if len(found) > 1 and not ed.get("all"):
+                where = ", ".join(str(line_of(p)) for p in found)
+                raise PlanError(f"edit {i}: search text matches more than once (lines {where}); add context or set all=true")
+            spans.extend((p, p + len(search), replace, i) for p in found)
+        elif op == "insert_after":
+            body = _encode(as_lines(normalize(ed.get("text"), nl), nl))
+            if "line" in ed:
+                try:
+                    ln = int(ed["line"])
+                except (TypeError, ValueError):
+                    raise PlanError(f"edit {i}: insert_after line must be an integer")
+                cur = LineCursor(mm)
+                at = cur.seek(max(ln, 0))
+                if ln < 0 or cur.line < ln:
+                    raise PlanError(f"edit {i}: line {ln} outside file ({cur.line} lines)")
+            else:
+                anchor = _encode(normalize(ed.get("anchor"), nl))
+                if not anchor:
+                    raise PlanError(f"edit {i}: insert_after needs anchor or line")
+                first = mm.find(anchor)
+                if first == -1:
+                    raise PlanError(f"edit {i}: anchor not found")
+                if mm.find(anchor, first + 1) != -1:
+                    raise PlanError(f"edit {i}: anchor is not unique; add context")
+                end_nl = mm.find(b"\n", first + len(anchor) - 1)
+                at = size if end_nl == -1 else end_nl + 1
+            if at == size and size and mm[size - 1:size] not in (b"\n", b"\r"):
+                body = _encode(nl) + body  # last line has no newline yet
+            spans.append((at, at, body, i))
+        else:
+            raise PlanError(f"edit {i}: unknown op {op!r} (expected one of {', '.join(OPS)})")
+    spans.sort(key=lambda s: (s[0], s[1], s[3]))
+    for prev, cur_span in zip(spans, spans[1:]):
+        if cur_span[0] < prev[1]:
+            raise PlanError(f"edits {prev[3]} and {cur_span[3]} overlap")
+    return [(s, e, r) for s, e, r, _ in spans]
+
+
+def plan_edits_large(rel: str, path: Path, edits: List[Dict[str, Any]], ctx: int = 3) -> Dict[str, Any]:
+    base_hash = hash_file(path)
+    f, mm = _open_map(path)
+    try:
+        _check_text(mm)
+        diff = diff_spans(mm, resolve_edits(mm, edits), f"a/{rel}", f"b/{rel}", ctx)
+    finally:
+        mm.close()
+        f.close()
+    return {"path": rel, "base_hash": base_hash, "diff": diff, "no_changes": not diff, "streamed": True}
@@ -1,7 +1,6 @@
 from __future__ import annotations
 
-import shlex
-import subprocess
+from .proc_runner import run_bounded, usage_text
 
 
 def run(prompt: str, timeout: int = 30) -> str:
@@ -12,16 +11,16 @@ def run(prompt: str, timeout: int = 30) -> str:
         # Expect a local `gemini` CLI available in PATH
         # Example: gemini -p "<prompt>"
         args = ["gemini", "-p", prompt]
-        proc = subprocess.run(args, capture_output=True, text=True, timeout=timeout)
-        out = proc.stdout.strip()
-        err = proc.stderr.strip()
-        if proc.returncode != 0:
-            return f"[gemini] returncode={proc.returncode}\n{err or out}"
-        return out or "[gemini] (no output)"
+        res = run_bounded(args, timeout=timeout, limit=None, tool="gemini")
     except FileNotFoundError:
         return "[gemini] CLI not found. Install a `gemini` CLI and ensure it is in PATH."
-    except subprocess.TimeoutExpired:
-        return f"[gemini] timeout after {timeout}s"
     except Exception as e:
         return f"[gemini] failed: {type(e).__name__}: {e}"
-
+    usage = f"[gemini] ({usage_text(res.usage())})"
+    if res.timed_out:
+        return f"[gemini] timeout after {timeout}s\n{usage}"
+    out = res.stdout.strip()
+    err = res.stderr.strip()
+    if res.returncode != 0:
+        return f"[gemini] returncode={res.returncode}\n{err or out}\n{usage}"
+    return f"{out or '[gemini] (no output)'}\n{usage}"
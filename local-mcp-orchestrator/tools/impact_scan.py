@@ -2,11 +2,19 @@ from __future__ import annotations
 
 import json
 import os
-import subprocess
 from collections import Counter, defaultdict
 from dataclasses import dataclass
 from pathlib import Path
-from typing import Any, Dict, List, Tuple
+from typing import Any, Dict, List, Optional, Tuple
+
+from .action_cache import enabled as action_cache_enabled, get_cache
+from .index.result_cache import RESULTS, CursorError
+from .index.imports import blast_radius, get_graph
+from .index.symbols import get_index
+from .index.workspace import FileHasher, fingerprint as workspace_fingerprint, iter_files
+from .lsp.diagnostics import parse_cli_output
+from .lsp.pyright_server import LspError, get_server
+from .proc_runner import run_bounded
 
 
 ROOT_DIR = Path(__file__).resolve().parents[1]
@@ -20,14 +28,24 @@ EXCLUDES = [
     "-g", "!build",
 ]
 
+# hits kept per search for cursor paging; beyond this the result set is capped
+MAX_CACHED_HITS = 5000
+# rg skips larger files (--max-filesize), and so does the action cache key
+MAX_FILE_BYTES = 2_000_000
+
 
 @dataclass
 class ScanInput:
     query: str
     limit: int = 100
-    mode: str = "literal"  # literal | regex | word
+    mode: str = "literal"  # literal | regex | word | symbol
     context: int = 2
     pyright: Dict[str, Any] | None = None  # optional env/options
+    format: str = "json"  # json | compact
+    token_budget: int = 2000  # compact only: approx. tokens for all snippets
+    cursor: Optional[str] = None  # continue a previous truncated search
+    kinds: Optional[List[str]] = None  # symbol only: e.g. ["function", "call", "import"]
+    graph: bool = True  # report transitive importers of matched .py files
 
 
 def _rg_mode_flags(mode: str) -> List[str]:
@@ -47,24 +65,63 @@ def _rg_search(inp: ScanInput) -> Tuple[List[Dict[str, Any]], Dict[str, Any]]:
     try:
         cmd = [
             "rg", "-n", "--no-heading", "--hidden",
+            "--max-filesize", str(MAX_FILE_BYTES),
             *_rg_mode_flags(inp.mode),
             *EXCLUDES,
             q, ".",
         ]
-        proc = subprocess.run(cmd, cwd=str(ROOT_DIR), capture_output=True, text=True, check=False)
+        proc = run_bounded(cmd, cwd=str(ROOT_DIR), timeout=None, limit=None, kill_after_bytes=0,
+                           tool="impact_scan.rg")
     except FileNotFoundError:
         return [], {"error": "ripgrep (rg) not installed", "installed": False}
 
     hits: List[Dict[str, Any]] = []
-    for line in (proc.stdout or "").splitlines():
+    for line in proc.stdout.splitlines():
         try:
             path, line_no, text = line.split(":", 2)
+            if path.startswith("./"):
+                path = path[2:]  # workspace-relative, like the symbol index and the import graph
             hits.append({"path": path, "line": int(line_no), "text": text.rstrip("\n")})
-            if len(hits) >= inp.limit:
+            if len(hits) >= MAX_CACHED_HITS:
                 break
         except ValueError:
             continue
-    return hits, {"installed": True, "mode": inp.mode, "context": inp.context}
+    return hits, {"installed": True, "mode": inp.mode, "context": inp.context, "resources": proc.usage()}
+
+
+def _read_lines(path: str) -> List[str]:
+    try:
+        with open(Path(ROOT_DIR) / path, "r", encoding="utf-8", errors="ignore", newline="") as f:
+            return f.read().splitlines()
+    except Exception:
+        return []
+
+
+def _symbol_search(inp: ScanInput) -> Tuple[List[Dict[str, Any]], Dict[str, Any]]:
+    q = (inp.query or "").strip()
+    if not q:
+        return [], {"error": "empty query"}
+    idx = get_index()
+    stats = idx.refresh()
+    rows = idx.lookup(q, inp.kinds)[:MAX_CACHED_HITS]
+    hits: List[Dict[str, Any]] = []
+    lines_by_file: Dict[str, List[str]] = {}
+    for r in rows:
+        if r["path"] not in lines_by_file:
+            lines_by_file[r["path"]] = _read_lines(r["path"])
+        lines = lines_by_file[r["path"]]
+        text = lines[r["line"] - 1] if 0 < r["line"] <= len(lines) else ""
+        hits.append({"path": r["path"], "line": r["line"], "text": text, "kind": r["kind"]})
+    return hits, {"mode": "symbol", "context": inp.context, "kinds": inp.kinds, "index": stats}
+
+
+def _search(inp: ScanInput) -> Tuple[List[Dict[str, Any]], Dict[str, Any]]:
+    """Run the search backend for `inp.mode`; returns (hits, {backend: used})."""
+    if inp.mode.lower() == "symbol":
+        hits, used = _symbol_search(inp)
+        return hits, {"symbols": used}
+    hits, used = _rg_search(inp)
+    return hits, {"ripgrep": used}
 
 
 def _add_context(hits: List[Dict[str, Any]], context: int) -> None:
@@ -75,11 +132,7 @@ def _add_context(hits: List[Dict[str, Any]], context: int) -> None:
     for h in hits:
         by_file[h["path"]].append(h)
     for path, items in by_file.items():
-        try:
-            with open(Path(ROOT_DIR) / path, "r", encoding="utf-8", errors="ignore", newline="") as f:
-                lines = f.read().splitlines()
-        except Exception:
-            lines = []
+        lines = _read_lines(path)
         n = len(lines)
         for h in items:
             ln = h.get("line", 0)
@@ -93,6 +146,70 @@ def _add_context(hits: List[Dict[str, Any]], context: int) -> None:
                 h["context_after"] = after
 
 
+def _estimate_tokens(text: str) -> int:
+    # rough heuristic for code: ~4 characters per token
+    return (len(text) + 3) // 4
+
+
+def _merge_ranges(line_nos: List[int], context: int, n: int) -> List[Tuple[int, int]]:
+    """Merge [ln-context, ln+context] windows (1-based, inclusive) that overlap or touch."""
+    ranges: List[Tuple[int, int]] = []
+    for ln in sorted(set(line_nos)):
+        a = max(1, ln - context) if n else ln
+        b = max(ln, min(n, ln + context))
+        if ranges and a <= ranges[-1][1] + 1:
+            ranges[-1] = (ranges[-1][0], max(ranges[-1][1], b))
+        else:
+            ranges.append((a, b))
+    return ranges
+
+
+def _compact_hits(hits: List[Dict[str, Any]], context: int, token_budget: int) -> Dict[str, Any]:
+    """Group hits per file and render merged, line-numbered snippets.
+
+    Hit lines are marked with `>` and context lines with `:`; disjoint blocks
+    are separated by `...`. Files are emitted in ranking order until the
+    approximate token budget is spent; the rest is reported as omitted.
+    """
+    by_file: Dict[str, Dict[int, str]] = defaultdict(dict)
+    for h in hits:
+        by_file[h["path"]][h["line"]] = h.get("text", "")
+    order = sorted(by_file, key=lambda p: (-len(by_file[p]), p))
+
+    files: List[Dict[str, Any]] = []
+    used = 0
+    omitted = 0
+    truncated = False
+    for path in order:
+        hit_text = by_file[path]
+        if truncated:
+            omitted += len(hit_text)
+            continue
+        lines = _read_lines(path)
+        n = len(lines)
+        blocks: List[str] = []
+        shown = 0
+        for a, b in _merge_ranges(list(hit_text), context, n):
+            width = len(str(b))
+            rows = []
+            for ln in range(a, b + 1):
+                text = lines[ln - 1] if ln <= n else hit_text.get(ln, "")
+                mark = ">" if ln in hit_text else ":"
+                rows.append(f"{ln:>{width}}{mark} {text}")
+            block = "\n".join(rows)
+            cost = _estimate_tokens(block) + (_estimate_tokens(path) if not blocks else 0)
+            if used + cost > token_budget:
+                truncated = True
+                break
+            used += cost
+            blocks.append(block)
+            shown += sum(1 for ln in hit_text if a <= ln <= b)
+        omitted += len(hit_text) - shown
+        if blocks:
+            files.append({"path": path, "hits": len(hit_text), "snippet": "\n...\n".join(blocks)})
+    return {"files": files, "tokens": used, "truncated": truncated, "omitted_hits": omitted}
+
+
 def _run_pyright_on(files: List[str], opts: Dict[str, Any] | None) -> Dict[str, Any]:
     # only consider python files
     py_files = [f for f in files if f.endswith(".py")]
@@ -102,60 +219,136 @@ def _run_pyright_on(files: List[str], opts: Dict[str, Any] | None) -> Dict[str,
         for k in ("pythonVersion", "venvPath", "venv"):
             if k in opts:
                 used[k] = opts[k]
+    if not py_files:
+        return {"used": used, "diagnostics": []}
+    # warm language server first: unchanged files come back from its cache
+    settings = {"python": {"venvPath": opts["venvPath"]}} if opts and opts.get("venvPath") else None
+    srv = get_server(ROOT_DIR, settings)
+    if srv is not None:
+        try:
+            res = srv.diagnostics(py_files)
+        except LspError:
+            pass
+        else:
+            used.update({"installed": True, "server": True, "cached": res["cached"], "changed": res["changed"]})
+            return {"used": used, "diagnostics": res["diagnostics"]}
     try:
-        if not py_files:
-            return {"used": used, "diagnostics": []}
         # If pyright not present, clean skip
-        proc = subprocess.run(["pyright", "--outputjson", *py_files], cwd=str(ROOT_DIR), capture_output=True, text=True)
+        proc = run_bounded(["pyright", "--outputjson", *py_files], cwd=str(ROOT_DIR), timeout=None, limit=None,
+                           kill_after_bytes=0, tool="impact_scan.pyright")
     except FileNotFoundError:
         used.update({"installed": False})
         return {"error": "pyright not installed", "used": used, "diagnostics": []}
-    used.update({"installed": True})
-    stdout = proc.stdout or ""
+    used.update({"installed": True, "resources": proc.usage()})
+    stdout = proc.stdout
     try:
         data = json.loads(stdout or "{}")
     except json.JSONDecodeError:
         return {"error": "pyright output parse error", "used": used, "stdout": stdout, "stderr": proc.stderr}
-    diags = []
-    for d in data.get("generalDiagnostics", []):
-        rng = d.get("range") or {}
-        start = (rng.get("start") or {})
-        diags.append({
-            "path": d.get("file"),
-            "line": start.get("line"),
-            "col": start.get("character"),
-            "severity": d.get("severity"),
-            "message": d.get("message"),
-            "rule": d.get("rule"),
-        })
-    return {"used": used, "diagnostics": diags}
+    return {"used": used, "diagnostics": parse_cli_output(data)}
+
+
+def _without_resources(out: Dict[str, Any]) -> Dict[str, Any]:
+    """`out` minus the per-run subprocess numbers under `used`, which a cache hit must not replay."""
+    used = {k: ({kk: vv for kk, vv in v.items() if kk != "resources"} if isinstance(v, dict) else v)
+            for k, v in (out.get("used") or {}).items()}
+    return {**out, "used": used}
+
+
+def _scan_digest(hasher: FileHasher) -> str:
+    """Content digest of the files a scan reads: no symlinks, nothing above MAX_FILE_BYTES."""
+    paths = []
+    for rel in iter_files(hasher.root):
+        try:
+            if os.path.getsize(hasher.root / rel) <= MAX_FILE_BYTES:
+                paths.append(rel)
+        except OSError:
+            pass
+    return hasher.digest(paths)
 
 
 def impact_scan(payload: Dict[str, Any]) -> Dict[str, Any]:
+    """Run a scan, answering from the persistent action cache when the tree is unchanged."""
+    use_cache = action_cache_enabled() and bool(payload.get("cache", True)) and not payload.get("cursor")
+    if not use_cache:
+        return _scan(payload)
+    cache = get_cache()
+    inputs = {k: v for k, v in payload.items() if k != "cache"}
+    key = cache.key("impact_scan", inputs, _scan_digest(cache.hasher))
+    out = cache.get(key)
+    if out is not None:
+        out.setdefault("used", {})["cache"] = cache.stats(hit=True)
+        return out
+    out = _scan(payload)
+    # paged results hold cursors into this process's result cache; don't persist them
+    if not out.get("error") and "page" not in out:
+        cache.put(key, "impact_scan", _without_resources(out))
+    out.setdefault("used", {})["cache"] = cache.stats(hit=False)
+    return out
+
+
+def _scan(payload: Dict[str, Any]) -> Dict[str, Any]:
     inp = ScanInput(
         query=(payload.get("query") or ""),
         limit=int(payload.get("limit", 100) or 100),
         mode=str(payload.get("mode", "literal") or "literal"),
         context=int(payload.get("context", 2) or 2),
         pyright=payload.get("pyright"),
+        format=str(payload.get("format", "json") or "json").lower(),
+        token_budget=int(payload.get("token_budget", 2000) or 2000),
+        cursor=payload.get("cursor") or None,
+        kinds=payload.get("kinds") or None,
+        graph=bool(payload.get("graph", True)),
     )
 
-    hits, rg_used = _rg_search(inp)
-    out: Dict[str, Any] = {"hits": hits, "files_ranked": [], "suggestions": [], "used": {"ripgrep": rg_used}}
-    if rg_used.get("error"):
-        out["error"] = rg_used["error"]
+    page: Dict[str, Any] | None = None
+    if inp.cursor:
+        # next page of a cached search; no rg run
+        try:
+            hits, _, page = RESULTS.page(inp.cursor, workspace_fingerprint(ROOT_DIR), inp.limit, tool="impact_scan")
+        except CursorError as e:
+            return {"error": str(e), "hits": [], "files_ranked": [], "suggestions": [], "used": {}}
+        used = page.pop("used")
+        page.pop("tool", None)
+    else:
+        all_hits, used = _search(inp)
+        hits = all_hits[:inp.limit]
+        if len(all_hits) > len(hits):
+            cursor = RESULTS.put(all_hits, workspace_fingerprint(ROOT_DIR), {"tool": "impact_scan", "used": used}, offset=len(hits))
+            page = {"offset": 0, "returned": len(hits), "total": len(all_hits), "next_cursor": cursor}
+    out: Dict[str, Any] = {"hits": hits, "files_ranked": [], "suggestions": [], "used": dict(used)}
+    if page is not None:
+        out["page"] = page
+        if page["total"] >= MAX_CACHED_HITS:
+            page["capped"] = True
+    search_used = next(iter(used.values()), {})
+    if search_used.get("error"):
+        out["error"] = search_used["error"]
         return out
 
-    # add context lines
-    _add_context(hits, inp.context)
+    if inp.format == "compact":
+        # snippets replace per-hit objects; overlapping context is emitted once
+        out["format"] = "compact"
+        out["compact"] = _compact_hits(hits, inp.context, inp.token_budget)
+        del out["hits"]
+    else:
+        # add context lines
+        _add_context(hits, inp.context)
 
     # rank files by frequency
     counts = Counter(h["path"] for h in hits)
     ranked = sorted(counts.items(), key=lambda kv: (-kv[1], kv[0]))
     out["files_ranked"] = [{"path": p, "score": c} for p, c in ranked]
 
+    # modules that import the matched files, nearest first
+    hit_py = [p for p, _ in ranked if p.endswith(".py")]
+    if inp.graph and hit_py:
+        graph = get_graph()
+        out["used"]["import_graph"] = graph.refresh()
+        out["blast_radius"] = blast_radius(graph, hit_py)
+
     # optional pyright on top-N python files
-    py_files = [p for p, _ in ranked if p.endswith(".py")][:20]
+    py_files = hit_py[:20]
     if py_files:
         pry = _run_pyright_on(py_files, inp.pyright or {})
         out["used"]["pyright"] = pry.get("used", {"installed": False})
@@ -169,6 +362,12 @@ def impact_scan(payload: Dict[str, Any]) -> Dict[str, Any]:
     if total:
         top = ", ".join(f"{p} ({c})" for p, c in ranked[:3])
         out["suggestions"].append(f"Found {total} matches across {nfiles} files. Top: {top}")
+    if out.get("blast_radius"):
+        near = ", ".join(f"{r['path']} (d={r['distance']})" for r in out["blast_radius"][:3])
+        out["suggestions"].append(f"{len(out['blast_radius'])} module(s) import the matched files (transitively). Nearest: {near}")
+    if page and page.get("next_cursor"):
+        rest = page["total"] - page["offset"] - page["returned"]
+        out["suggestions"].append(f"{rest} more matches; pass cursor={page['next_cursor']} to fetch the next page.")
     if out.get("pyright_diagnostics"):
         sev_counts = Counter(d.get("severity") for d in out["pyright_diagnostics"])
         sev_str = ", ".join(f"{k}:{v}" for k, v in sev_counts.items())
@@ -0,0 +1,261 @@
+from __future__ import annotations
+
+import threading
+import time
+from collections import deque
+from typing import Any, Dict, Iterable, List, Optional, Set
+
+from .symbols import SymbolIndex, get_index
+
+
+# directories whose contents are also importable without the prefix (src layout)
+SOURCE_ROOTS = ("src/",)
+
+
+def module_name(rel: str) -> str:
+    """Map a workspace path to its dotted module name ("pkg/__init__.py" -> "pkg")."""
+    mod = rel[:-3] if rel.endswith(".py") else rel
+    if mod.endswith("/__init__"):
+        mod = mod[: -len("/__init__")]
+    return mod.replace("/", ".")
+
+
+class ImportGraph:
+    """Module import graph of the workspace, derived from the symbol index.
+
+    Edges are resolved from the cached import rows of each file, so a
+    refresh only re-resolves files whose content hash changed (or all files
+    when modules were added/removed, since that changes resolution).
+    `dependents()` walks the reverse graph breadth-first; `centrality()` is
+    answered from counts computed for every module once per edge change.
+    """
+
+    def __init__(self, index: Optional[SymbolIndex] = None):
+        self.index = index if index is not None else get_index()
+        self._modules: Dict[str, str] = {}  # module name -> rel path
+        self._hashes: Dict[str, Optional[str]] = {}
+        self._deps: Dict[str, Set[str]] = {}  # rel -> imported rels
+        self._rdeps: Dict[str, Set[str]] = {}  # rel -> importing rels
+        self._centrality: Optional[Dict[str, int]] = None  # rel -> transitive dependents; None = stale
+        self._lock = threading.Lock()
+
+    def refresh(self) -> Dict[str, Any]:
+        t0 = time.perf_counter()
+        idx_stats = self.index.refresh()
+        with self._lock:
+            files = self.index.files()
+            layout_changed = set(files) != set(self._hashes)
+            if layout_changed:
+                self._modules = {}
+                for rel in files:
+                    self._modules.setdefault(module_name(rel), rel)
+                for root in SOURCE_ROOTS:
+                    for rel in files:
+                        if rel.startswith(root):
+                            self._modules.setdefault(module_name(rel[len(root):]), rel)
+            resolved = 0
+            for rel in files:
+                sha = self.index.file_hash(rel)
+                if not layout_changed and self._hashes.get(rel) == sha:
+                    continue
+                self._deps[rel] = self._resolve_file(rel)
+                self._hashes[rel] = sha
+                resolved += 1
+            current = set(files)
+            for rel in [r for r in self._hashes if r not in current]:
+                self._hashes.pop(rel, None)
+                self._deps.pop(rel, None)
+            if resolved or layout_changed:
+                rdeps: Dict[str, Set[str]] = {}
+                for src, targets in self._deps.items():
+                    for t in targets:
+                        rdeps.setdefault(t, set()).add(src)
+                self._rdeps = rdeps
+                self._centrality = None
+            edges = sum(len(v) for v in self._deps.values())
+        return {
+            "modules": len(files),
+            "edges": edges,
+            "resolved": resolved,
+            "index": idx_stats,
+            "ms": round((time.perf_counter() - t0) * 1000, 2),
+        }
+
+    def _resolve_file(self, rel: str) -> Set[str]:
+        own = module_name(rel)
+        package = own if rel.endswith("__init__.py") else own.rpartition(".")[0]
+        out: Set[str] = set()
+        for row in self.index.file_symbols(rel):
+            if row[1] != "import" or len(row) < 5:
+                continue
+            target = row[4]
+            floor = ""
+            if target.startswith("."):
+                level = len(target) - len(target.lstrip("."))
+                base = package.split(".") if package else []
+                if level - 1 > len(base):
+                    continue
+                base = base[: len(base) - (level - 1)]
+                floor = ".".join(base)
+                rest = target[level:]
+                target = ".".join([p for p in (floor, rest) if p])
+            dep = self._resolve_module(target, floor)
+            if dep and dep != rel:
+                out.add(dep)
+        return out
+
+    def _resolve_module(self, dotted: str, floor: str = "") -> Optional[str]:
+        # longest prefix that names a workspace module ("a.b.c" -> "a.b" for `from a.b import c`)
+        parts = dotted.split(".") if dotted else []
+        min_len = len(floor.split(".")) if floor else 1
+        for n in range(len(parts), min_len - 1, -1):
+            rel = self._modules.get(".".join(parts[:n]))
+            if rel:
+                return rel
+        return None
+
+    def resolve(self, target: str) -> Optional[str]:
+        """Accept a workspace path or a dotted module name; return the workspace path."""
+        target = (target or "").strip()
+        if target.startswith("./"):
+            target = target[2:]
+        with self._lock:
+            if target in self._hashes:
+                return target
+            return self._resolve_module(target) if target else None
+
+    def dependents(self, sources: Iterable[str], max_depth: Optional[int] = None) -> Dict[str, Dict[str, Any]]:
+        """Transitive importers of `sources` -> {rel: {distance, via}} (sources excluded)."""
+        return self._walk(sources, self._rdeps, max_depth)
+
+    def dependencies(self, sources: Iterable[str], max_depth: Optional[int] = None) -> Dict[str, Dict[str, Any]]:
+        """Transitive imports of `sources` -> {rel: {distance, via}} (sources excluded)."""
+        return self._walk(sources, self._deps, max_depth)
+
+    def centrality(self, rel: str) -> int:
+        """Number of transitive dependents of `rel`."""
+        with self._lock:
+            if self._centrality is None:
+                self._centrality = _dependent_counts(sorted(self._hashes), self._rdeps)
+            return self._centrality.get(rel, 0)
+
+    def _walk(self, sources: Iterable[str], edges: Dict[str, Set[str]], max_depth: Optional[int]) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            start = [s for s in sources if s in self._hashes]
+            seen: Dict[str, Dict[str, Any]] = {}
+            queue = deque((s, 0) for s in start)
+            visited = set(start)
+            while queue:
+                node, dist = queue.popleft()
+                if max_depth is not None and dist >= max_depth:
+                    continue
+                for nxt in sorted(edges.get(node, ())):
+                    if nxt in visited:
+                        continue
+                    visited.add(nxt)
+                    seen[nxt] = {"distance": dist + 1, "via": node}
+                    queue.append((nxt, dist + 1))
+            return seen
+
+
+def _dependent_counts(nodes: List[str], rdeps: Dict[str, Set[str]]) -> Dict[str, int]:
+    """Transitive dependent count of every node in one pass.
+
+    Import cycles are collapsed into strongly connected components (iterative
+    Tarjan). A component is emitted only after every component it reaches, so
+    its reach set (an int bitset over `nodes`) is the union of its successors'.
+    """
+    ids = {n: i for i, n in enumerate(nodes)}
+    order: Dict[str, int] = {}
+    low: Dict[str, int] = {}
+    stack: List[str] = []
+    on_stack: Set[str] = set()
+    comp_of: Dict[str, int] = {}
+    reach: List[int] = []
+    counts: Dict[str, int] = {}
+    for root in nodes:
+        if root in order:
+            continue
+        order[root] = low[root] = len(order)
+        stack.append(root)
+        on_stack.add(root)
+        work = [(root, iter(sorted(rdeps.get(root, ()))))]
+        while work:
+            node, edges = work[-1]
+            for nxt in edges:
+                if nxt not in ids:
+                    continue
+                if nxt not in order:
+                    order[nxt] = low[nxt] = len(order)
+                    stack.append(nxt)
+                    on_stack.add(nxt)
+                    work.append((nxt, iter(sorted(rdeps.get(nxt, ())))))
+                    break
+                if nxt in on_stack:
+                    low[node] = min(low[node], order[nxt])
+            else:
+                work.pop()
+                if work:
+                    parent = work[-1][0]
+                    low[parent] = min(low[parent], low[node])
+                if low[node] != order[node]:
+                    continue
+                members: List[str] = []
+                while True:
+                    m = stack.pop()
+                    on_stack.discard(m)
+                    members.append(m)
+                    if m == node:
+                        break
+                comp = len(reach)
+                bits = 0
+                for m in members:
+                    comp_of[m] = comp
+                    bits |= 1 << ids[m]
+                for m in members:
+                    for nxt in rdeps.get(m, ()):
+                        c = comp_of.get(nxt)
+                        if c is not None and c != comp:
+                            bits |= reach[c]
+                reach.append(bits)
+                n = bin(bits).count("1") - 1  # minus the module itself
+                for m in members:
+                    counts[m] = n
+    return counts
+
+
+_GRAPH: Optional[ImportGraph] = None
+
+
+def get_graph() -> ImportGraph:
+    """Process-wide graph over the shared symbol index; call `refresh()` before queries."""
+    global _GRAPH
+    if _GRAPH is None:
+        _GRAPH = ImportGraph()
+    return _GRAPH
+
+
+def blast_radius(graph: ImportGraph, sources: Iterable[str], limit: int = 50, max_depth: Optional[int] = None) -> List[Dict[str, Any]]:
+    """Dependents of `sources` ranked by import distance, then centrality."""
+    found = graph.dependents(sources, max_depth)
+    rows = [
+        {"path": rel, "distance": info["distance"], "via": info["via"], "centrality": graph.centrality(rel)}
+        for rel, info in found.items()
+    ]
+    rows.sort(key=lambda r: (r["distance"], -r["centrality"], r["path"]))
+    return rows[:limit]
+
+
+def dependents_report(target: str, max_depth: Optional[int] = None, limit: int = 200) -> Dict[str, Any]:
+    """Answer "who depends on X" for a workspace path or module name."""
+    graph = get_graph()
+    stats = graph.refresh()
+    rel = graph.resolve(target)
+    if rel is None:
+        return {"error": f"module not found in workspace: {target}", "used": {"import_graph": stats}}
+    return {
+        "target": rel,
+        "module": module_name(rel),
+        "dependents": blast_radius(graph, [rel], limit=limit, max_depth=max_depth),
+        "used": {"import_graph": stats},
+    }
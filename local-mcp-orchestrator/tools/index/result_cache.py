@@ -0,0 +1,99 @@
+from __future__ import annotations
+
+import base64
+import secrets
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+
+DEFAULT_TTL = 300.0  # seconds a cached result set stays pageable
+MAX_ENTRIES = 16
+
+
+class CursorError(Exception):
+    pass
+
+
+def _encode_cursor(key: str, offset: int) -> str:
+    return base64.urlsafe_b64encode(f"{key}:{offset}".encode()).decode().rstrip("=")
+
+
+def _decode_cursor(cursor: str) -> Tuple[str, int]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        key, offset = raw.rsplit(":", 1)
+        return key, int(offset)
+    except Exception:
+        raise CursorError("invalid cursor")
+
+
+class ResultCache:
+    """Short-lived, in-process store of full search results keyed by opaque cursors.
+
+    A search that gets truncated by `limit` stores all of its hits once;
+    follow-up calls page through them without re-running the search. An
+    entry is dropped when its TTL passes, when it is evicted (LRU), or when
+    the workspace fingerprint no longer matches the one it was stored with.
+    """
+
+    def __init__(self, ttl: float = DEFAULT_TTL, max_entries: int = MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def put(self, items: List[Any], fingerprint: str, meta: Dict[str, Any], offset: int) -> str:
+        """Store `items` and return the cursor for the page starting at `offset`."""
+        key = secrets.token_hex(8)
+        with self._lock:
+            self._purge(time.monotonic())
+            self._entries[key] = {
+                "items": items,
+                "fingerprint": fingerprint,
+                "meta": meta,
+                "created": time.monotonic(),
+            }
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return _encode_cursor(key, offset)
+
+    def page(self, cursor: str, fingerprint: str, limit: int, tool: str) -> Tuple[List[Any], Optional[str], Dict[str, Any]]:
+        """Return (items, next_cursor, page_info) for `cursor`.
+
+        Raises CursorError when the cursor is unknown, expired, issued by a
+        different tool, or the workspace changed since it was issued.
+        """
+        key, offset = _decode_cursor(cursor)
+        with self._lock:
+            self._purge(time.monotonic())
+            entry = self._entries.get(key)
+            if entry is None:
+                raise CursorError("cursor expired; rerun the search")
+            if entry["meta"].get("tool") != tool:
+                raise CursorError("cursor belongs to a different tool")
+            if entry["fingerprint"] != fingerprint:
+                del self._entries[key]
+                raise CursorError("workspace changed since cursor was issued; rerun the search")
+            self._entries.move_to_end(key)
+        items = entry["items"]
+        limit = max(1, limit)
+        chunk = items[offset: offset + limit]
+        end = offset + len(chunk)
+        next_cursor = _encode_cursor(key, end) if end < len(items) else None
+        info = {"offset": offset, "returned": len(chunk), "total": len(items), "next_cursor": next_cursor, **entry["meta"]}
+        return chunk, next_cursor, info
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def _purge(self, now: float) -> None:
+        stale = [k for k, e in self._entries.items() if now - e["created"] > self.ttl]
+        for k in stale:
+            del self._entries[k]
+
+
+# process-wide cache shared by the search tools
+RESULTS = ResultCache()
@@ -1,7 +1,11 @@
 from __future__ import annotations
 
-import subprocess
-from typing import Dict, Any
+import os
+from typing import Dict, Any, Optional
+
+from .result_cache import RESULTS, CursorError
+from .workspace import fingerprint
+from ..proc_runner import run_bounded
 
 EXCLUDES = [
     "-g", "!.git",
@@ -12,25 +16,40 @@ EXCLUDES = [
     "-g", "!build",
 ]
 
+# hits kept per search for cursor paging
+MAX_CACHED_HITS = 5000
+
+
+def search(q: str, limit: int = 200, cursor: Optional[str] = None) -> Dict[str, Any]:
+    if cursor:
+        try:
+            hits, next_cursor, page = RESULTS.page(cursor, fingerprint(os.getcwd()), limit, tool="ripgrep")
+        except CursorError as e:
+            return {"error": str(e)}
+        page.pop("tool", None)
+        return {"hits": hits, "tool": "ripgrep", "page": page}
 
-def search(q: str, limit: int = 200) -> Dict[str, Any]:
     q = (q or "").strip()
     if not q:
         return {"error": "empty query"}
     try:
         cmd = ["rg", "-n", "-S", "--no-heading", "--hidden", *EXCLUDES, q, "."]
-        proc = subprocess.run(cmd, capture_output=True, text=True, check=False)
+        proc = run_bounded(cmd, timeout=None, limit=None, kill_after_bytes=0, tool="ripgrep")
     except FileNotFoundError:
         return {"error": "ripgrep (rg) not installed"}
 
     hits = []
-    for line in (proc.stdout or "").splitlines():
+    for line in proc.stdout.splitlines():
         try:
             path, line_no, text = line.split(":", 2)
             hits.append({"path": path, "line": int(line_no), "text": text.strip()})
-            if len(hits) >= limit:
+            if len(hits) >= MAX_CACHED_HITS:
                 break
         except ValueError:
             continue
-    return {"hits": hits, "tool": "ripgrep"}
-
+    out: Dict[str, Any] = {"hits": hits[:limit], "tool": "ripgrep", "resources": proc.usage()}
+    if len(hits) > limit:
+        # keep the full result set so the next pages cost no search
+        next_cursor = RESULTS.put(hits, fingerprint(os.getcwd()), {"tool": "ripgrep"}, offset=limit)
+        out["page"] = {"offset": 0, "returned": limit, "total": len(hits), "next_cursor": next_cursor}
+    return out
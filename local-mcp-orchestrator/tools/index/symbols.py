@@ -0,0 +1,227 @@
+from __future__ import annotations
+
+import ast
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional
+
+from .workspace import CACHE_DIR, ROOT_DIR, iter_files
+
+
+INDEX_VERSION = 1
+
+# symbol kinds recorded per file
+KINDS = ("function", "class", "variable", "import", "call", "attribute", "reference")
+DEFINITION_KINDS = ("function", "class", "variable")
+
+
+class _Collector(ast.NodeVisitor):
+    """Collect [name, kind, line, col, target] rows for one module.
+
+    `target` is only set for imports: the imported module as written, with
+    leading dots for relative imports (e.g. ".calc" or "os.path").
+    """
+
+    def __init__(self) -> None:
+        self.rows: List[list] = []
+        self._depth = 0  # function nesting; module/class-level assigns are "variable"
+        self._callees: set[int] = set()
+
+    def _add(self, name: str, kind: str, node: ast.AST, target: Optional[str] = None) -> None:
+        row = [name, kind, getattr(node, "lineno", 0), getattr(node, "col_offset", 0)]
+        if target is not None:
+            row.append(target)
+        self.rows.append(row)
+
+    def _visit_function(self, node: ast.AST) -> None:
+        self._add(node.name, "function", node)  # type: ignore[attr-defined]
+        self._depth += 1
+        self.generic_visit(node)
+        self._depth -= 1
+
+    visit_FunctionDef = _visit_function
+    visit_AsyncFunctionDef = _visit_function
+
+    def visit_ClassDef(self, node: ast.ClassDef) -> None:
+        self._add(node.name, "class", node)
+        self.generic_visit(node)
+
+    def visit_Import(self, node: ast.Import) -> None:
+        for alias in node.names:
+            bound = alias.asname or alias.name.split(".")[0]
+            self._add(bound, "import", node, alias.name)
+
+    def visit_ImportFrom(self, node: ast.ImportFrom) -> None:
+        module = "." * (node.level or 0) + (node.module or "")
+        for alias in node.names:
+            if alias.name == "*":
+                self._add("*", "import", node, module)
+                continue
+            self._add(alias.asname or alias.name, "import", node, f"{module}.{alias.name}" if node.module else f"{module}{alias.name}")
+
+    def visit_Call(self, node: ast.Call) -> None:
+        func = node.func
+        if isinstance(func, ast.Name):
+            self._add(func.id, "call", func)
+            self._callees.add(id(func))
+        elif isinstance(func, ast.Attribute):
+            self._add(func.attr, "call", func)
+            self._callees.add(id(func))
+        self.generic_visit(node)
+
+    def visit_Attribute(self, node: ast.Attribute) -> None:
+        if id(node) not in self._callees:
+            self._add(node.attr, "attribute", node)
+        self.generic_visit(node)
+
+    def visit_Name(self, node: ast.Name) -> None:
+        if isinstance(node.ctx, ast.Store):
+            if self._depth == 0:
+                self._add(node.id, "variable", node)
+        elif id(node) not in self._callees:
+            self._add(node.id, "reference", node)
+
+
+def extract_symbols(source: bytes | str, filename: str = "<unknown>") -> List[list]:
+    tree = ast.parse(source, filename=filename)
+    col = _Collector()
+    col.visit(tree)
+    return col.rows
+
+
+class SymbolIndex:
+    """AST-based index of definitions, imports, calls and references in workspace `.py` files.
+
+    Per-file results are keyed by content hash and persisted under
+    CACHE_DIR, so `refresh()` only re-parses files whose bytes changed.
+    Unchanged files are detected by (mtime, size) first and by hash second.
+    """
+
+    def __init__(self, root: Path | str = ROOT_DIR, cache_path: Optional[Path] = None):
+        self.root = Path(root)
+        self.cache_path = cache_path if cache_path is not None else CACHE_DIR / "symbols.json"
+        self._files: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+        self._load()
+
+    def _load(self) -> None:
+        try:
+            data = json.loads(self.cache_path.read_text(encoding="utf-8"))
+        except Exception:
+            return
+        if data.get("version") == INDEX_VERSION and str(self.root) == data.get("root"):
+            self._files = data.get("files") or {}
+
+    def save(self) -> None:
+        try:
+            self.cache_path.parent.mkdir(parents=True, exist_ok=True)
+            data = {"version": INDEX_VERSION, "root": str(self.root), "files": self._files}
+            with tempfile.NamedTemporaryFile("w", encoding="utf-8", dir=str(self.cache_path.parent), delete=False) as tf:
+                json.dump(data, tf, ensure_ascii=False, separators=(",", ":"))
+                tmp_name = tf.name
+            os.replace(tmp_name, str(self.cache_path))
+        except OSError:
+            pass  # cache is best-effort
+
+    def refresh(self) -> Dict[str, Any]:
+        """Bring the index up to date with the workspace; returns update stats."""
+        t0 = time.perf_counter()
+        stats = {"files": 0, "parsed": 0, "reused": 0, "removed": 0}
+        with self._lock:
+            by_hash = {e["sha256"]: e for e in self._files.values()}
+            seen = set()
+            for rel in iter_files(self.root, (".py",)):
+                seen.add(rel)
+                stats["files"] += 1
+                try:
+                    st = os.stat(self.root / rel)
+                except OSError:
+                    continue
+                entry = self._files.get(rel)
+                if entry and entry["mtime_ns"] == st.st_mtime_ns and entry["size"] == st.st_size:
+                    continue
+                try:
+                    data = (self.root / rel).read_bytes()
+                except OSError:
+                    continue
+                sha = hashlib.sha256(data).hexdigest()
+                known = by_hash.get(sha)
+                if known is not None:
+                    rows, error = known["symbols"], known.get("error")
+                    stats["reused"] += 1
+                else:
+                    try:
+                        rows, error = extract_symbols(data, rel), None
+                    except (SyntaxError, ValueError) as e:
+                        rows, error = [], f"{type(e).__name__}: {e}"
+                    stats["parsed"] += 1
+                new_entry = {"mtime_ns": st.st_mtime_ns, "size": st.st_size, "sha256": sha, "symbols": rows}
+                if error:
+                    new_entry["error"] = error
+                self._files[rel] = new_entry
+                by_hash[sha] = new_entry
+            for rel in [r for r in self._files if r not in seen]:
+                del self._files[rel]
+                stats["removed"] += 1
+            if stats["parsed"] or stats["reused"] or stats["removed"]:
+                self.save()
+        stats["ms"] = round((time.perf_counter() - t0) * 1000, 2)
+        return stats
+
+    def lookup(self, name: str, kinds: Optional[Iterable[str]] = None) -> List[Dict[str, Any]]:
+        """Return symbol rows matching `name` (last component of a dotted name).
+
+        Imports also match when their target ends with the full dotted query,
+        e.g. "calc.divide" finds `from .calc import divide`.
+        """
+        query = (name or "").strip()
+        if not query:
+            return []
+        short = query.split(".")[-1]
+        wanted = set(kinds) if kinds else None
+        out: List[Dict[str, Any]] = []
+        with self._lock:
+            for rel in sorted(self._files):
+                for row in self._files[rel]["symbols"]:
+                    sym, kind, line, col = row[:4]
+                    if wanted is not None and kind not in wanted:
+                        continue
+                    target = row[4] if len(row) > 4 else None
+                    if sym != short and not (target and (target == query or target.endswith("." + query))):
+                        continue
+                    hit = {"path": rel, "line": line, "col": col, "kind": kind, "name": sym}
+                    if target is not None:
+                        hit["target"] = target
+                    out.append(hit)
+        out.sort(key=lambda h: (h["path"], h["line"], h["col"]))
+        return out
+
+    def file_symbols(self, rel: str) -> List[list]:
+        with self._lock:
+            entry = self._files.get(rel)
+            return list(entry["symbols"]) if entry else []
+
+    def file_hash(self, rel: str) -> Optional[str]:
+        with self._lock:
+            entry = self._files.get(rel)
+            return entry["sha256"] if entry else None
+
+    def files(self) -> List[str]:
+        with self._lock:
+            return sorted(self._files)
+
+
+_INDEX: Optional[SymbolIndex] = None
+
+
+def get_index() -> SymbolIndex:
+    """Process-wide index for ROOT_DIR; call `refresh()` before lookups."""
+    global _INDEX
+    if _INDEX is None:
+        _INDEX = SymbolIndex()
+    return _INDEX
@@ -0,0 +1,140 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+
+ROOT_DIR = Path(__file__).resolve().parents[2]
+
+# persistent tool caches (indexes etc.); never part of the scanned workspace
+CACHE_DIR = ROOT_DIR / ".gpt_code_cache"
+
+EXCLUDE_DIRS = {
+    ".git", "node_modules", ".venv", "__pycache__", "dist", "build",
+    ".pytest_cache", ".mypy_cache", ".ruff_cache", CACHE_DIR.name,
+}
+# per-session state files that would otherwise invalidate every cache
+EXCLUDE_FILES = {".gpt_code_history"}
+
+
+def iter_files(root: Path | str = ROOT_DIR, suffixes: Optional[Iterable[str]] = None) -> Iterator[str]:
+    """Yield workspace-relative (posix) paths of regular files, skipping EXCLUDE_DIRS and symlinks."""
+    root = str(root)
+    sfx = tuple(suffixes) if suffixes else None
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames[:] = sorted(d for d in dirnames if d not in EXCLUDE_DIRS)
+        rel_dir = os.path.relpath(dirpath, root)
+        for name in sorted(filenames):
+            if name in EXCLUDE_FILES or (sfx and not name.endswith(sfx)):
+                continue
+            if os.path.islink(os.path.join(dirpath, name)):
+                continue  # e.g. a model file linked in from elsewhere; may point outside the root
+            rel = name if rel_dir == "." else os.path.join(rel_dir, name)
+            yield rel.replace(os.sep, "/")
+
+
+def fingerprint(root: Path | str = ROOT_DIR) -> str:
+    """Cheap stat-based token that changes when files are edited, added, removed or renamed.
+
+    Combines file count, total size and the newest mtime of files and
+    directories (a rename or unlink bumps the parent directory's mtime).
+    """
+    root = str(root)
+    count = 0
+    size = 0
+    newest = 0
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames[:] = [d for d in dirnames if d not in EXCLUDE_DIRS]
+        try:
+            newest = max(newest, os.stat(dirpath).st_mtime_ns)
+        except OSError:
+            continue
+        for name in filenames:
+            if name in EXCLUDE_FILES:
+                continue
+            try:
+                st = os.stat(os.path.join(dirpath, name))
+            except OSError:
+                continue
+            count += 1
+            size += st.st_size
+            newest = max(newest, st.st_mtime_ns)
+    return f"{count}:{size}:{newest}"
+
+
+class FileHasher:
+    """sha256 of workspace files, memoized by (mtime_ns, size) and persisted.
+
+    Only files whose stat changed since the last call are read again, so
+    digesting an unchanged tree costs one stat per file.
+    """
+
+    def __init__(self, root: Path | str = ROOT_DIR, memo_path: Optional[Path] = None):
+        self.root = Path(root)
+        self.memo_path = memo_path if memo_path is not None else CACHE_DIR / "hashes.json"
+        self._memo: Dict[str, List[Any]] = {}
+        self._dirty = False
+        self._lock = threading.Lock()
+        try:
+            data = json.loads(self.memo_path.read_text(encoding="utf-8"))
+            if data.get("root") == str(self.root):
+                self._memo = data.get("files") or {}
+        except Exception:
+            pass
+
+    def file_hash(self, rel: str) -> Optional[str]:
+        p = self.root / rel
+        try:
+            st = os.stat(p)
+        except OSError:
+            return None
+        with self._lock:
+            m = self._memo.get(rel)
+            if m and m[0] == st.st_mtime_ns and m[1] == st.st_size:
+                return m[2]
+        h = hashlib.sha256()
+        try:
+            with open(p, "rb") as f:
+                for chunk in iter(lambda: f.read(1 << 20), b""):
+                    h.update(chunk)
+        except OSError:
+            return None
+        sha = h.hexdigest()
+        with self._lock:
+            self._memo[rel] = [st.st_mtime_ns, st.st_size, sha]
+            self._dirty = True
+        return sha
+
+    def digest(self, paths: Iterable[str]) -> str:
+        """Combined hash over (path, content hash) of `paths`; missing files count too."""
+        h = hashlib.sha256()
+        for rel in sorted(set(paths)):
+            h.update(f"{rel}\0{self.file_hash(rel) or '-'}\n".encode("utf-8", "surrogateescape"))
+        self.save()
+        return h.hexdigest()
+
+    def tree_digest(self, suffixes: Optional[Iterable[str]] = None, extra: Iterable[str] = ()) -> str:
+        """Digest of every workspace file (optionally by suffix) plus `extra` paths."""
+        return self.digest([*iter_files(self.root, suffixes), *extra])
+
+    def save(self) -> None:
+        with self._lock:
+            if not self._dirty:
+                return
+            live = {k: v for k, v in self._memo.items() if (self.root / k).exists()}
+            payload = {"root": str(self.root), "files": live}
+            self._memo = live
+            self._dirty = False
+        try:
+            self.memo_path.parent.mkdir(parents=True, exist_ok=True)
+            with tempfile.NamedTemporaryFile("w", encoding="utf-8", dir=str(self.memo_path.parent), delete=False) as tf:
+                json.dump(payload, tf, separators=(",", ":"))
+                tmp_name = tf.name
+            os.replace(tmp_name, str(self.memo_path))
+        except OSError:
+            pass  # memo is best-effort
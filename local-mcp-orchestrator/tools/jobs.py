@@ -0,0 +1,257 @@
+from __future__ import annotations
+
+import atexit
+import itertools
+import json
+import os
+import shlex
+import signal
+import subprocess
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from .index.workspace import CACHE_DIR
+from .proc_runner import capture_file, default_rlimits, record_metrics, rlimit_preexec, wait_with_usage
+from .tests import command_for, summarize
+
+ROOT_DIR = Path(__file__).resolve().parents[1]
+JOBS_DIR = CACHE_DIR / "jobs"
+
+MAX_RUNNING = 4
+MAX_KEPT = 50  # finished jobs remembered (with their logs) before the oldest are dropped
+JOB_TIMEOUT = 1800
+MAX_WAIT = 600
+OUTPUT_LIMIT = 4000
+TAIL_BYTES = 64 * 1024
+
+
+class Job:
+    """One background command; stdout and stderr go (interleaved) to a log file."""
+
+    def __init__(self, job_id: str, argv: List[str], kind: str, timeout: float, framework: str = ""):
+        self.id = job_id
+        self.argv = argv
+        self.kind = kind  # "shell" | "tests"
+        self.framework = framework
+        self.timeout = timeout
+        self.log_path = JOBS_DIR / f"{job_id}.log"
+        self.status = "starting"
+        self.returncode: Optional[int] = None
+        self.started = time.time()
+        self.ended: Optional[float] = None
+        self.proc: Optional[subprocess.Popen] = None
+        self.usage: Dict[str, Any] = {}
+        self.done = threading.Event()
+
+    def start(self) -> None:
+        JOBS_DIR.mkdir(parents=True, exist_ok=True)
+        with open(self.log_path, "wb") as log:
+            self.proc = subprocess.Popen(self.argv, cwd=str(ROOT_DIR), stdin=subprocess.DEVNULL, stdout=log,
+                                         stderr=subprocess.STDOUT, start_new_session=True,
+                                         preexec_fn=rlimit_preexec(default_rlimits()))
+        self.status = "running"
+        threading.Thread(target=self._watch, name=f"job-{self.id}", daemon=True).start()
+
+    def _watch(self) -> None:
+        assert self.proc is not None
+        try:
+            self.returncode, usage = wait_with_usage(self.proc, self.timeout)
+            if self.status == "running":
+                self.status = "done" if self.returncode == 0 else "failed"
+        except subprocess.TimeoutExpired:
+            self.status = "timeout"
+            self._kill()
+            self.returncode, usage = wait_with_usage(self.proc)
+        self.ended = time.time()
+        self.usage = {"wall_s": round(self.ended - self.started, 3), **usage, "output_bytes": self.output_bytes()}
+        record_metrics("jobs", {"job": self.id, "kind": self.kind, "argv0": os.path.basename(self.argv[0]),
+                                "status": self.status, "returncode": self.returncode, **self.usage})
+        self.done.set()
+
+    def _kill(self) -> None:
+        assert self.proc is not None
+        try:
+            os.killpg(self.proc.pid, signal.SIGKILL)  # the whole group: test runners spawn workers
+        except OSError:
+            pass
+
+    def cancel(self) -> bool:
+        if self.done.is_set() or self.proc is None:
+            return False
+        self.status = "cancelled"
+        self._kill()
+        self.done.wait(5)
+        return True
+
+    @property
+    def running(self) -> bool:
+        return not self.done.is_set()
+
+    def output_bytes(self) -> int:
+        try:
+            return self.log_path.stat().st_size
+        except OSError:
+            return 0
+
+    def tail(self, lines: int = 50) -> str:
+        try:
+            with open(self.log_path, "rb") as f:
+                size = os.fstat(f.fileno()).st_size
+                f.seek(max(0, size - TAIL_BYTES))
+                data = f.read()
+        except OSError:
+            return ""
+        text = data.decode("utf-8", errors="replace")
+        return "\n".join(text.splitlines()[-lines:]) if lines > 0 else ""
+
+    def info(self, with_output: bool = False) -> Dict[str, Any]:
+        data: Dict[str, Any] = {
+            "id": self.id,
+            "kind": self.kind,
+            "cmd": shlex.join(self.argv),
+            "status": self.status,
+            "returncode": self.returncode,
+            "elapsed_s": round((self.ended or time.time()) - self.started, 2),
+            "output_bytes": self.output_bytes(),
+            "log": str(self.log_path.relative_to(ROOT_DIR)),
+        }
+        if self.usage:
+            data["resources"] = self.usage
+        if with_output and not self.running:
+            out = capture_file(str(self.log_path), OUTPUT_LIMIT)
+            if self.kind == "tests" and self.returncode is not None:
+                # same shape as Tests.Run, output interleaved in stdout
+                data["tests"] = json.loads(summarize(self.framework, self.returncode, out, ""))
+            else:
+                data["output"] = out
+        return data
+
+
+_JOBS: Dict[str, Job] = {}
+_LOCK = threading.Lock()
+_IDS = itertools.count(1)
+
+
+def _prune() -> None:
+    finished = [j for j in _JOBS.values() if not j.running]
+    for job in sorted(finished, key=lambda j: j.started)[:max(0, len(finished) - MAX_KEPT)]:
+        del _JOBS[job.id]
+        try:
+            job.log_path.unlink()
+        except OSError:
+            pass
+
+
+def start(cmd: Optional[str] = None, tests: Optional[str] = None, timeout: float = JOB_TIMEOUT) -> Dict[str, Any]:
+    """Start a shell command (`cmd`) or the test suite (`tests`: auto|pytest|unittest) in the background."""
+    if bool(cmd) == bool(tests):
+        return {"error": "give exactly one of cmd or tests"}
+    framework = ""
+    if tests:
+        if tests not in {"auto", "pytest", "unittest"}:
+            return {"error": f"unknown tests kind: {tests}"}
+        framework, argv = command_for(tests)
+    else:
+        try:
+            argv = shlex.split(cmd or "")
+        except ValueError as e:
+            return {"error": f"parse error: {e}"}
+        if not argv:
+            return {"error": "empty command"}
+    with _LOCK:
+        if sum(j.running for j in _JOBS.values()) >= MAX_RUNNING:
+            return {"error": f"too many running jobs (max {MAX_RUNNING}); wait for or cancel one"}
+        _prune()
+        job = Job(f"job-{next(_IDS)}-{os.getpid()}", argv, "tests" if tests else "shell", timeout, framework)
+        try:
+            job.start()
+        except OSError as e:
+            return {"error": f"failed to start: {type(e).__name__}: {e}"}
+        _JOBS[job.id] = job
+    return job.info()
+
+
+def _get(job_id: str) -> Optional[Job]:
+    with _LOCK:
+        return _JOBS.get(job_id)
+
+
+def poll(job_id: Optional[str] = None) -> Dict[str, Any]:
+    """Status of one job (with its output once finished), or of all jobs."""
+    if not job_id:
+        with _LOCK:
+            jobs = list(_JOBS.values())
+        return {"jobs": [j.info() for j in jobs]}
+    job = _get(job_id)
+    if job is None:
+        return {"error": f"no such job: {job_id}"}
+    return job.info(with_output=True)
+
+
+def tail(job_id: str, lines: int = 50) -> Dict[str, Any]:
+    """The last `lines` lines of a job's log, also while it is still running."""
+    job = _get(job_id)
+    if job is None:
+        return {"error": f"no such job: {job_id}"}
+    data = job.info()
+    data["tail"] = job.tail(lines)
+    return data
+
+
+def wait(job_id: str, timeout: float = 60) -> Dict[str, Any]:
+    """Block until the job ends or `timeout` passes (the job keeps running then)."""
+    job = _get(job_id)
+    if job is None:
+        return {"error": f"no such job: {job_id}"}
+    job.done.wait(max(0.0, min(timeout, MAX_WAIT)))
+    return job.info(with_output=True)
+
+
+def cancel(job_id: str) -> Dict[str, Any]:
+    job = _get(job_id)
+    if job is None:
+        return {"error": f"no such job: {job_id}"}
+    job.cancel()
+    return job.info(with_output=True)
+
+
+@atexit.register
+def cancel_all() -> None:
+    with _LOCK:
+        jobs = list(_JOBS.values())
+    for job in jobs:
+        job.cancel()
+
+
+def run(action: str, input_str: str) -> str:
+    """JSON wrapper for the Jobs.* tools.
+
+    start:  {"cmd": str} | {"tests": "auto|pytest|unittest"}, "timeout"?  (plain text = cmd)
+    poll:   {"id"?}  (plain text = id; empty lists all jobs)
+    tail:   {"id", "lines"?=50}
+    wait:   {"id", "timeout"?=60}
+    cancel: {"id"}
+    """
+    text = (input_str or "").strip()
+    try:
+        args = json.loads(text) if text.startswith("{") else ({"cmd": text} if action == "start" else {"id": text})
+    except json.JSONDecodeError as e:
+        return json.dumps({"error": f"invalid JSON: {e}"})
+    try:
+        if action == "start":
+            res = start(args.get("cmd"), args.get("tests"), float(args.get("timeout", JOB_TIMEOUT)))
+        elif action == "poll":
+            res = poll(args.get("id"))
+        elif action == "tail":
+            res = tail(str(args.get("id", "")), int(args.get("lines", 50)))
+        elif action == "wait":
+            res = wait(str(args.get("id", "")), float(args.get("timeout", 60)))
+        elif action == "cancel":
+            res = cancel(str(args.get("id", "")))
+        else:
+            res = {"error": f"unknown action: {action}"}
+    except (TypeError, ValueError) as e:
+        res = {"error": f"invalid argument: {e}"}
+    return json.dumps(res, ensure_ascii=False)
@@ -1,20 +1,18 @@
 from __future__ import annotations
 
-import subprocess
+import shutil
 import json
-from typing import Dict, Any
+import time
+from pathlib import Path
+from typing import Dict, Any, List, Optional
 
+from ..action_cache import enabled as action_cache_enabled, get_cache
+from ..index.workspace import ROOT_DIR, iter_files
+from .pyright_server import LspError, get_server
+from ..proc_runner import run_bounded
 
-def python_pyright(project_root: str = ".") -> Dict[str, Any]:
-    try:
-        proc = subprocess.run(["pyright", "--outputjson"], cwd=project_root, capture_output=True, text=True, check=False)
-    except FileNotFoundError:
-        return {"error": "pyright not installed"}
-    stdout = proc.stdout or ""
-    try:
-        data = json.loads(stdout or "{}")
-    except json.JSONDecodeError:
-        return {"error": "pyright output parse error", "stdout": stdout, "stderr": proc.stderr}
+
+def parse_cli_output(data: Dict[str, Any]) -> List[Dict[str, Any]]:
     diags = []
     for d in data.get("generalDiagnostics", []):
         rng = d.get("range") or {}
@@ -27,5 +25,70 @@ def python_pyright(project_root: str = ".") -> Dict[str, Any]:
             "message": d.get("message"),
             "rule": d.get("rule"),
         })
-    return {"framework": "pyright", "diagnostics": diags}
+    return diags
+
+
+def python_pyright(project_root: str = ".", files: Optional[List[str]] = None, server: bool = True, cache: bool = True) -> Dict[str, Any]:
+    """Pyright diagnostics for `files` (default: every .py file under project_root).
 
+    Results for the workspace root are kept in the persistent action cache,
+    keyed by the content of all .py files and pyright config. On a miss the
+    shared pyright-langserver session is used when available, otherwise the
+    CLI runs cold. A server answer is only stored when every requested file
+    was re-published after the latest sync (no `pending` or `stale` files).
+    """
+    if not (cache and action_cache_enabled() and Path(project_root).resolve() == ROOT_DIR):
+        return _python_pyright(project_root, files, server)
+    ac = get_cache()
+    inputs = {
+        "files": sorted(files) if files is not None else None,
+        "pyright": shutil.which("pyright"),
+        "langserver": shutil.which("pyright-langserver"),
+    }
+    key = ac.key("lsp_python_pyright", inputs, ac.hasher.tree_digest((".py",), extra=["pyrightconfig.json", "pyproject.toml"]))
+    res = ac.get(key)
+    if res is not None:
+        res["cache"] = ac.stats(hit=True)
+        return res
+    res = _python_pyright(project_root, files, server)
+    srv_info = res.get("server") or {}
+    if not res.get("error") and not srv_info.get("pending") and not srv_info.get("stale"):
+        # resource numbers describe this run, not a replay
+        ac.put(key, "lsp_python_pyright", {k: v for k, v in res.items() if k != "resources"})
+    res["cache"] = ac.stats(hit=False)
+    return res
+
+
+def _python_pyright(project_root: str, files: Optional[List[str]], server: bool) -> Dict[str, Any]:
+    if server:
+        srv = get_server(project_root)
+        if srv is not None:
+            targets = files if files is not None else list(iter_files(project_root, (".py",)))
+            t0 = time.perf_counter()
+            try:
+                res = srv.diagnostics(targets)
+            except LspError:
+                pass  # fall back to the CLI below
+            else:
+                return {
+                    "framework": "pyright",
+                    "diagnostics": res["diagnostics"],
+                    "server": {
+                        "changed": res["changed"],
+                        "cached": res["cached"],
+                        "pending": res["pending"],
+                        "stale": res["stale"],
+                        "ms": round((time.perf_counter() - t0) * 1000, 2),
+                    },
+                }
+    try:
+        proc = run_bounded(["pyright", "--outputjson", *(files or [])], cwd=project_root, timeout=None, limit=None,
+                           kill_after_bytes=0, tool="pyright")
+    except FileNotFoundError:
+        return {"error": "pyright not installed"}
+    stdout = proc.stdout
+    try:
+        data = json.loads(stdout or "{}")
+    except json.JSONDecodeError:
+        return {"error": "pyright output parse error", "stdout": stdout, "stderr": proc.stderr}
+    return {"framework": "pyright", "diagnostics": parse_cli_output(data), "resources": proc.usage()}
@@ -0,0 +1,330 @@
+from __future__ import annotations
+
+import atexit
+import hashlib
+import json
+import os
+import shutil
+import subprocess
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from urllib.parse import unquote, urlparse
+
+
+SERVER_CMD = ["pyright-langserver", "--stdio"]
+
+# after an edit, other open documents count as settled once the server was quiet this long
+SETTLE_S = 0.5
+
+# LSP DiagnosticSeverity -> pyright CLI severity strings (hints are dropped, as in the CLI)
+_SEVERITY = {1: "error", 2: "warning", 3: "information"}
+
+
+class LspError(Exception):
+    pass
+
+
+def _uri_to_path(uri: str) -> str:
+    return unquote(urlparse(uri).path)
+
+
+class PyrightServer:
+    """Long-lived `pyright-langserver --stdio` session for one project root.
+
+    Files are synced with didOpen/didChange only when their content hash
+    changes; diagnostics are taken from the server's publishDiagnostics
+    notifications and cached per document version, so asking again about
+    unchanged files returns immediately. An edit can change the diagnostics
+    of files importing the edited one, so after a sync the other requested
+    documents are waited for until the server re-publishes them or goes
+    quiet; those not re-published since the latest sync are reported as
+    `stale`.
+    """
+
+    def __init__(self, root: Path | str, settings: Optional[Dict[str, Any]] = None, cmd: Optional[List[str]] = None):
+        self.root = Path(root).resolve()
+        self.settings = settings or {}
+        self.cmd = cmd or SERVER_CMD
+        self.proc: Optional[subprocess.Popen] = None
+        self._next_id = 0
+        self._write_lock = threading.Lock()
+        self._cond = threading.Condition()
+        self._responses: Dict[int, Dict[str, Any]] = {}
+        # uri -> {"version", "sha256"} for documents we opened
+        self._docs: Dict[str, Dict[str, Any]] = {}
+        # uri -> (version, diagnostics) from the latest publish
+        self._diags: Dict[str, Tuple[Optional[int], List[Dict[str, Any]]]] = {}
+        # publish sequence numbers: uri -> seq of its latest publish; seq at the latest sync that sent something
+        self._seq = 0
+        self._published_at: Dict[str, int] = {}
+        self._synced_at = 0
+        self._last_activity = 0.0
+
+    # -- process / transport -------------------------------------------------
+
+    def alive(self) -> bool:
+        return self.proc is not None and self.proc.poll() is None
+
+    def start(self, timeout: float = 30.0) -> None:
+        self.proc = subprocess.Popen(
+            self.cmd, cwd=str(self.root), stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+        )
+        threading.Thread(target=self._reader, name="pyright-lsp-reader", daemon=True).start()
+        root_uri = self.root.as_uri()
+        self.request("initialize", {
+            "processId": os.getpid(),
+            "rootUri": root_uri,
+            "workspaceFolders": [{"uri": root_uri, "name": self.root.name}],
+            "capabilities": {
+                "workspace": {"configuration": True, "workspaceFolders": True},
+                "textDocument": {"publishDiagnostics": {"versionSupport": True}},
+            },
+        }, timeout=timeout)
+        self.notify("initialized", {})
+
+    def _send(self, msg: Dict[str, Any]) -> None:
+        if not self.alive():
+            raise LspError("language server not running")
+        body = json.dumps(msg).encode("utf-8")
+        with self._write_lock:
+            assert self.proc is not None and self.proc.stdin is not None
+            self.proc.stdin.write(f"Content-Length: {len(body)}\r\n\r\n".encode("ascii") + body)
+            self.proc.stdin.flush()
+
+    def notify(self, method: str, params: Any) -> None:
+        self._send({"jsonrpc": "2.0", "method": method, "params": params})
+
+    def request(self, method: str, params: Any, timeout: float = 30.0) -> Any:
+        with self._cond:
+            self._next_id += 1
+            rid = self._next_id
+        self._send({"jsonrpc": "2.0", "id": rid, "method": method, "params": params})
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while rid not in self._responses:
+                left = deadline - time.monotonic()
+                if left <= 0 or not self.alive():
+                    raise LspError(f"{method}: no response")
+                self._cond.wait(left)
+            resp = self._responses.pop(rid)
+        if "error" in resp:
+            raise LspError(f"{method}: {resp['error'].get('message')}")
+        return resp.get("result")
+
+    def _reader(self) -> None:
+        assert self.proc is not None and self.proc.stdout is not None
+        stream = self.proc.stdout
+        while True:
+            length = None
+            while True:
+                line = stream.readline()
+                if not line:
+                    with self._cond:
+                        self._cond.notify_all()
+                    return
+                line = line.strip()
+                if not line:
+                    break
+                if line.lower().startswith(b"content-length:"):
+                    length = int(line.split(b":", 1)[1])
+            if length is None:
+                continue
+            try:
+                msg = json.loads(stream.read(length))
+            except json.JSONDecodeError:
+                continue
+            self._dispatch(msg)
+
+    def _dispatch(self, msg: Dict[str, Any]) -> None:
+        method = msg.get("method")
+        if method is None:
+            with self._cond:
+                self._responses[msg.get("id")] = msg
+                self._cond.notify_all()
+            return
+        if "id" in msg:
+            # server -> client request; only configuration needs a real answer
+            result: Any = None
+            if method == "workspace/configuration":
+                items = (msg.get("params") or {}).get("items") or []
+                result = [self._config_section(it.get("section")) for it in items]
+            try:
+                self._send({"jsonrpc": "2.0", "id": msg["id"], "result": result})
+            except (LspError, OSError):
+                pass
+            return
+        if method == "textDocument/publishDiagnostics":
+            params = msg.get("params") or {}
+            with self._cond:
+                self._seq += 1
+                self._diags[params.get("uri")] = (params.get("version"), params.get("diagnostics") or [])
+                self._published_at[params.get("uri")] = self._seq
+                self._last_activity = time.monotonic()
+                self._cond.notify_all()
+
+    def _config_section(self, section: Optional[str]) -> Any:
+        node: Any = self.settings
+        for part in (section or "").split("."):
+            if not part:
+                continue
+            if not isinstance(node, dict) or part not in node:
+                return None
+            node = node[part]
+        return node
+
+    def shutdown(self) -> None:
+        if not self.alive():
+            return
+        try:
+            self.request("shutdown", None, timeout=5.0)
+            self.notify("exit", None)
+            assert self.proc is not None
+            self.proc.wait(timeout=5)
+        except Exception:
+            if self.proc is not None:
+                self.proc.kill()
+
+    # -- documents / diagnostics ---------------------------------------------
+
+    def sync(self, paths: Iterable[str]) -> Dict[str, int]:
+        """didOpen/didChange `paths` (plus already-open docs) whose content changed.
+
+        Returns {uri: version} of the documents that were (re)sent.
+        """
+        wanted = {(self.root / p).resolve().as_uri(): (self.root / p).resolve() for p in paths}
+        for uri in list(self._docs):
+            wanted.setdefault(uri, Path(_uri_to_path(uri)))
+        sent: Dict[str, int] = {}
+        with self._cond:
+            # taken before anything is sent: the server may publish before this method returns
+            seq_before = self._seq
+        for uri, path in wanted.items():
+            doc = self._docs.get(uri)
+            try:
+                data = path.read_bytes()
+            except OSError:
+                if doc is not None:
+                    self.notify("textDocument/didClose", {"textDocument": {"uri": uri}})
+                    self._docs.pop(uri, None)
+                    with self._cond:
+                        self._diags.pop(uri, None)
+                        self._published_at.pop(uri, None)
+                continue
+            sha = hashlib.sha256(data).hexdigest()
+            if doc is not None and doc["sha256"] == sha:
+                continue
+            text = data.decode("utf-8", errors="replace")
+            if doc is None:
+                version = 1
+                self.notify("textDocument/didOpen", {
+                    "textDocument": {"uri": uri, "languageId": "python", "version": version, "text": text},
+                })
+            else:
+                version = doc["version"] + 1
+                self.notify("textDocument/didChange", {
+                    "textDocument": {"uri": uri, "version": version},
+                    "contentChanges": [{"text": text}],
+                })
+            self._docs[uri] = {"version": version, "sha256": sha}
+            sent[uri] = version
+        if sent:
+            with self._cond:
+                self._synced_at = seq_before
+                self._last_activity = time.monotonic()
+        return sent
+
+    def diagnostics(self, paths: Iterable[str], timeout: float = 60.0) -> Dict[str, Any]:
+        """Diagnostics for `paths` in the pyright CLI schema.
+
+        Waits for the documents re-sent by this call. Other documents are
+        answered from their last publish once the server re-published them
+        after the latest sync or was quiet for SETTLE_S (the edit did not
+        affect them); `stale` lists those not re-published since that sync.
+        """
+        paths = list(paths)
+        sent = self.sync(paths)
+        uris = [(self.root / p).resolve().as_uri() for p in paths]
+        deadline = time.monotonic() + timeout
+        pending: List[str] = []
+        stale: List[str] = []
+        with self._cond:
+            while True:
+                pending = [u for u in uris if not self._published(u, sent.get(u))]
+                stale = [u for u in uris if self._published_at.get(u, 0) <= self._synced_at]
+                now = time.monotonic()
+                left = deadline - now
+                quiet_left = self._last_activity + SETTLE_S - now
+                if (not pending and (not stale or quiet_left <= 0)) or left <= 0 or not self.alive():
+                    break
+                self._cond.wait(min(left, quiet_left) if not pending and quiet_left > 0 else left)
+            diags: List[Dict[str, Any]] = []
+            for uri in uris:
+                for d in (self._diags.get(uri) or (None, []))[1]:
+                    sev = _SEVERITY.get(d.get("severity") or 1)
+                    if sev is None:
+                        continue
+                    start = (d.get("range") or {}).get("start") or {}
+                    diags.append({
+                        "path": _uri_to_path(uri),
+                        "line": start.get("line"),
+                        "col": start.get("character"),
+                        "severity": sev,
+                        "message": d.get("message"),
+                        "rule": d.get("code"),
+                    })
+        return {
+            "diagnostics": diags,
+            "changed": len([u for u in uris if u in sent]),
+            "cached": len([u for u in uris if u not in sent]),
+            "pending": [_uri_to_path(u) for u in pending],
+            "stale": [_uri_to_path(u) for u in stale if u not in pending],
+        }
+
+    def _published(self, uri: str, sent_version: Optional[int]) -> bool:
+        got = self._diags.get(uri)
+        if got is None:
+            return False
+        if sent_version is None:
+            return True
+        # servers without versionSupport omit the version; any publish after the send counts
+        return got[0] is None or got[0] >= sent_version
+
+
+_SERVERS: Dict[Tuple[str, str], PyrightServer] = {}
+_SERVERS_LOCK = threading.Lock()
+
+
+def installed() -> bool:
+    return shutil.which(SERVER_CMD[0]) is not None
+
+
+def get_server(root: Path | str, settings: Optional[Dict[str, Any]] = None) -> Optional[PyrightServer]:
+    """Shared session for (root, settings); started on first use, restarted if it died.
+
+    Returns None when pyright-langserver is not installed or fails to start.
+    """
+    if not installed():
+        return None
+    key = (str(Path(root).resolve()), json.dumps(settings or {}, sort_keys=True))
+    with _SERVERS_LOCK:
+        srv = _SERVERS.get(key)
+        if srv is not None and srv.alive():
+            return srv
+        srv = PyrightServer(root, settings)
+        try:
+            srv.start()
+        except (OSError, LspError):
+            srv.shutdown()
+            return None
+        _SERVERS[key] = srv
+        return srv
+
+
+@atexit.register
+def shutdown_all() -> None:
+    with _SERVERS_LOCK:
+        for srv in _SERVERS.values():
+            srv.shutdown()
+        _SERVERS.clear()
@@ -0,0 +1,216 @@
+from __future__ import annotations
+
+import ast
+import builtins
+import os
+import symtable
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from ..index.workspace import ROOT_DIR, iter_files
+from .diagnostics import python_pyright
+
+
+# names every module has without binding them
+_MODULE_NAMES = {
+    "__name__", "__file__", "__doc__", "__package__", "__spec__", "__loader__",
+    "__builtins__", "__path__", "__cached__", "__annotations__", "__dict__", "__debug__",
+}
+_BUILTINS = set(dir(builtins)) | _MODULE_NAMES
+
+# (mtime_ns, size) per absolute path at the last check, for "changed files" defaults
+_LAST_SEEN: Dict[str, Tuple[int, int]] = {}
+
+
+def _diag(path: str, line: int, col: int, message: str, rule: str) -> Dict[str, Any]:
+    # same shape as pyright diagnostics (0-based line/col)
+    return {"path": path, "line": line, "col": col, "severity": "error", "message": message, "rule": rule, "source": "syntax"}
+
+
+def _walk_tables(table: symtable.SymbolTable):
+    yield table
+    for child in table.get_children():
+        yield from _walk_tables(child)
+
+
+_COMPREHENSIONS = {ast.ListComp: "listcomp", ast.SetComp: "setcomp", ast.DictComp: "dictcomp", ast.GeneratorExp: "genexpr"}
+
+
+def _child_table(node: ast.AST, table: symtable.SymbolTable) -> symtable.SymbolTable:
+    """The symbol table of the scope `node` opens (the enclosing one if symtable has none, e.g. inlined comprehensions)."""
+    if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+        name = node.name
+    elif isinstance(node, ast.Lambda):
+        name = "lambda"
+    else:
+        name = _COMPREHENSIONS[type(node)]
+    for child in table.get_children():
+        if child.get_name() == name and child.get_lineno() == node.lineno:
+            return child
+    return table
+
+
+def _name_loads(node: ast.AST, table: symtable.SymbolTable):
+    """(Name node, symbol table of the scope it is read in) for every name read under `node`."""
+    if isinstance(node, ast.Name):
+        if not isinstance(node.ctx, ast.Store):
+            yield node, table
+        return
+    if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef, ast.Lambda)):
+        inner: List[ast.AST] = node.body if isinstance(node.body, list) else [node.body]
+        outer = [n for n in ast.iter_child_nodes(node) if not any(n is i for i in inner)]
+    elif isinstance(node, tuple(_COMPREHENSIONS)):
+        # the first iterable is evaluated in the enclosing scope, everything else inside
+        first = node.generators[0]
+        outer = [first.iter]
+        inner = [n for n in ast.iter_child_nodes(node) if n is not first]
+        inner += [first.target, *first.ifs]
+    else:
+        inner = outer = []
+    if inner:
+        child = _child_table(node, table)
+        for n in outer:
+            yield from _name_loads(n, table)
+        for n in inner:
+            yield from _name_loads(n, child)
+        return
+    for n in ast.iter_child_nodes(node):
+        yield from _name_loads(n, table)
+
+
+def undefined_names(source: str, filename: str, tree: Optional[ast.AST] = None) -> List[Dict[str, Any]]:
+    """Names that are read as globals but never bound in the module nor builtins."""
+    tree = tree if tree is not None else ast.parse(source, filename)
+    for node in ast.walk(tree):
+        if isinstance(node, ast.ImportFrom) and any(a.name == "*" for a in node.names):
+            return []  # star import: bindings unknowable without importing
+    top = symtable.symtable(source, filename, "exec")
+    bound = set()
+    for sym in top.get_symbols():
+        if sym.is_assigned() or sym.is_imported() or sym.is_namespace():
+            bound.add(sym.get_name())
+    for table in _walk_tables(top):
+        for sym in table.get_symbols():
+            if sym.is_declared_global() and (sym.is_assigned() or sym.is_imported() or sym.is_namespace()):
+                bound.add(sym.get_name())
+    missing = set()
+    for table in _walk_tables(top):
+        is_top = table is top
+        for sym in table.get_symbols():
+            if not sym.is_referenced():
+                continue
+            name = sym.get_name()
+            # __class__ is the implicit cell behind zero-argument super()
+            if name in bound or name in _BUILTINS or name == "__class__":
+                continue
+            if is_top or sym.is_global():
+                missing.add(name)
+    if not missing:
+        return []
+    first: Dict[str, Tuple[int, int]] = {}
+    for node, table in _name_loads(tree, top):
+        if node.id not in missing:
+            continue
+        # only reads that resolve to the module namespace, not a local of the same name
+        if table is not top:
+            try:
+                if not table.lookup(node.id).is_global():
+                    continue
+            except KeyError:
+                continue
+        pos = (node.lineno, node.col_offset)
+        if node.id not in first or pos < first[node.id]:
+            first[node.id] = pos
+    out = []
+    for name in sorted(missing, key=lambda n: first.get(n, (0, 0))):
+        line, col = first.get(name, (1, 0))
+        out.append(_diag(filename, line - 1, col, f'"{name}" is not defined', "reportUndefinedVariable"))
+    return out
+
+
+def fast_check(path: Path) -> List[Dict[str, Any]]:
+    """Tier 1: compile + undefined-name check for one file, in-process."""
+    filename = str(path)
+    try:
+        source = path.read_text(encoding="utf-8")
+    except (OSError, UnicodeDecodeError) as e:
+        return [_diag(filename, 0, 0, f"cannot read file: {type(e).__name__}: {e}", "io")]
+    try:
+        tree = ast.parse(source, filename)
+        # compile catches what the parser accepts but the compiler rejects ('return' outside function, ...)
+        compile(tree, filename, "exec", dont_inherit=True)
+    except SyntaxError as e:
+        line = (e.lineno or 1) - 1
+        col = max((e.offset or 1) - 1, 0)
+        return [_diag(filename, line, col, e.msg, "syntax")]
+    except ValueError as e:  # e.g. source contains null bytes
+        return [_diag(filename, 0, 0, str(e), "syntax")]
+    return undefined_names(source, filename, tree)
+
+
+def _changed_files(root: Path) -> List[str]:
+    changed = []
+    for rel in iter_files(root, (".py",)):
+        p = str(root / rel)
+        try:
+            st = os.stat(p)
+        except OSError:
+            continue
+        key = (st.st_mtime_ns, st.st_size)
+        if _LAST_SEEN.get(p) != key:
+            changed.append(rel)
+    return changed
+
+
+def check(paths: Optional[List[str]] = None, pyright: str = "auto", project_root: Path | str = ROOT_DIR) -> Dict[str, Any]:
+    """Tiered Python diagnostics.
+
+    Tier 1 (always): in-process syntax and undefined-name check of `paths`
+    (default: .py files changed since the previous check in this process).
+    Tier 2: pyright on the same files; "auto" runs it only when tier 1 found
+    no errors, "always" runs it regardless, "never" skips it.
+    """
+    root = Path(project_root)
+    files = [p for p in (paths if paths is not None else _changed_files(root)) if p.endswith(".py")]
+    t0 = time.perf_counter()
+    diags: List[Dict[str, Any]] = []
+    for rel in files:
+        p = root / rel
+        diags.extend(fast_check(p))
+        try:
+            st = os.stat(p)
+            _LAST_SEEN[str(p)] = (st.st_mtime_ns, st.st_size)
+        except OSError:
+            pass
+    tier1_errors = sum(1 for d in diags if d["severity"] == "error")
+    tiers: Dict[str, Any] = {
+        "syntax": {"files": len(files), "errors": tier1_errors, "ms": round((time.perf_counter() - t0) * 1000, 2)},
+    }
+
+    mode = (pyright or "auto").lower()
+    if not files:
+        tiers["pyright"] = {"ran": False, "skipped": "no python files"}
+    elif mode == "never":
+        tiers["pyright"] = {"ran": False, "skipped": "disabled"}
+    elif mode == "auto" and tier1_errors:
+        tiers["pyright"] = {"ran": False, "skipped": "tier 1 errors; fix them first or pass pyright=always"}
+    else:
+        t1 = time.perf_counter()
+        res = python_pyright(str(root), files=files)
+        info: Dict[str, Any] = {"ran": True, "ms": round((time.perf_counter() - t1) * 1000, 2)}
+        if res.get("error"):
+            info.update({"ran": False, "error": res["error"]})
+        if res.get("server"):
+            info["server"] = res["server"]
+        tiers["pyright"] = info
+        # pyright also reports syntax/undefined names; keep one entry per (path, line, rule)
+        seen = {(os.path.realpath(d["path"]), d["line"], d["rule"]) for d in diags}
+        for d in res.get("diagnostics") or []:
+            key = (os.path.realpath(d.get("path") or ""), d.get("line"), d.get("rule"))
+            if key in seen:
+                continue
+            seen.add(key)
+            diags.append({**d, "source": "pyright"})
+
+    return {"framework": "tiered", "diagnostics": diags, "tiers": tiers}
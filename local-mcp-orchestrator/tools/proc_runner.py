@@ -0,0 +1,354 @@
+from __future__ import annotations
+
+import codecs
+import json
+import os
+import selectors
+import signal
+import subprocess
+import sys
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+try:
+    import resource
+except ImportError:  # pragma: no cover - not POSIX
+    resource = None  # type: ignore[assignment]
+
+if __package__:
+    from .index.workspace import CACHE_DIR
+else:  # imported by the PyExec template / session kernel, which run as scripts
+    from index.workspace import CACHE_DIR  # type: ignore
+
+
+METRICS_PATH = CACHE_DIR / "metrics.jsonl"
+METRICS_MAX_BYTES = 5 * 1024 * 1024  # then rotated to metrics.jsonl.1
+SESSION_ID = f"{int(time.time())}-{os.getpid()}"
+
+# name -> (env var, RLIMIT_* attribute, unit in bytes/seconds)
+RLIMIT_ENV = {
+    "cpu": ("GPT_CODE_RLIMIT_CPU_S", "RLIMIT_CPU", 1),
+    "as": ("GPT_CODE_RLIMIT_AS_MB", "RLIMIT_AS", 1024 * 1024),
+    "fsize": ("GPT_CODE_RLIMIT_FSIZE_MB", "RLIMIT_FSIZE", 1024 * 1024),
+    "nofile": ("GPT_CODE_RLIMIT_NOFILE", "RLIMIT_NOFILE", 1),
+}
+
+READ_CHUNK = 65536
+# after reading, let the pipes fill a little: unbuffered producers write line by
+# line, and one select+read per line dominates the cost of chatty commands
+COALESCE_S = 0.002
+
+# on_output(stream, text): called with each decoded chunk as it arrives ("stdout" / "stderr")
+OutputCallback = Callable[[str, str], None]
+
+
+def fatal_output_limit() -> int:
+    """Bytes of combined output after which a command is killed (GPT_CODE_OUTPUT_KILL_MB, 0 = never)."""
+    try:
+        mb = float(os.environ.get("GPT_CODE_OUTPUT_KILL_MB", "0"))
+    except ValueError:
+        return 0
+    return max(0, int(mb * 1024 * 1024))
+
+
+class BoundedCapture:
+    """Keeps the first `head` and the last `tail` characters of a stream.
+
+    Memory stays O(head + tail) however much is fed; text() joins both ends
+    with a marker saying how much was dropped in between, so the final errors
+    of a long build survive truncation.
+    """
+
+    def __init__(self, head: int, tail: int):
+        self.head_cap = head
+        self.tail_cap = tail
+        self._head: List[str] = []
+        self._head_len = 0
+        self._tail = ""
+        self.total = 0
+
+    def feed(self, text: str) -> None:
+        if not text:
+            return
+        self.total += len(text)
+        room = self.head_cap - self._head_len
+        if room > 0:
+            self._head.append(text[:room])
+            self._head_len += min(room, len(text))
+            text = text[room:]
+        if text and self.tail_cap > 0:
+            self._tail += text
+            if len(self._tail) > 2 * self.tail_cap:  # amortized trim
+                self._tail = self._tail[-self.tail_cap:]
+
+    @property
+    def omitted(self) -> int:
+        return max(0, self.total - self._head_len - min(len(self._tail), self.tail_cap))
+
+    def text(self) -> str:
+        head = "".join(self._head)
+        tail = self._tail[-self.tail_cap:] if self.tail_cap > 0 else ""
+        if self.omitted:
+            return f"{head}\n…({self.omitted} chars omitted)…\n{tail}"
+        return head + tail
+
+
+def split_budget(limit: int) -> Dict[str, int]:
+    """Head/tail sizes for one stream out of a `limit`-character budget (a third head, the rest tail)."""
+    head = limit // 3
+    return {"head": head, "tail": limit - head}
+
+
+def capture_file(path: str, limit: int) -> str:
+    """Bounded head/tail view of a captured output file, read without loading all of it."""
+    b = split_budget(limit)
+    cap = BoundedCapture(**b)
+    try:
+        with open(path, "rb") as f:
+            size = os.fstat(f.fileno()).st_size
+            if size <= 4 * limit:
+                cap.feed(f.read().decode("utf-8", errors="replace"))
+                return cap.text()
+            head = f.read(4 * b["head"]).decode("utf-8", errors="replace")[:b["head"]]
+            f.seek(size - 4 * b["tail"])
+            tail = f.read().decode("utf-8", errors="replace")[-b["tail"]:]
+    except OSError:
+        return ""
+    return f"{head}\n…(about {size - len(head) - len(tail)} bytes omitted)…\n{tail}"
+
+
+def metrics_enabled() -> bool:
+    return os.environ.get("GPT_CODE_METRICS", "1").lower() not in {"0", "false", "off", "no"}
+
+
+def default_rlimits() -> Dict[str, int]:
+    """Limits configured through GPT_CODE_RLIMIT_* (unset or 0 = no limit)."""
+    limits: Dict[str, int] = {}
+    for name, (var, _, unit) in RLIMIT_ENV.items():
+        try:
+            value = float(os.environ.get(var, "0"))
+        except ValueError:
+            continue
+        if value > 0:
+            limits[name] = int(value * unit)
+    return limits
+
+
+def rlimit_preexec(limits: Dict[str, int]) -> Optional[Callable[[], None]]:
+    if resource is None or not limits:
+        return None
+    pairs = [(getattr(resource, RLIMIT_ENV[name][1]), value) for name, value in limits.items()]
+
+    def apply() -> None:  # runs in the child between fork and exec
+        for which, value in pairs:
+            _, hard = resource.getrlimit(which)
+            if hard != resource.RLIM_INFINITY:
+                value = min(value, hard)
+            resource.setrlimit(which, (value, hard))
+
+    return apply
+
+
+def rusage_dict(ru: Any) -> Dict[str, Any]:
+    """user/sys CPU seconds and peak RSS (KB) from a struct_rusage."""
+    rss = ru.ru_maxrss // 1024 if sys.platform == "darwin" else ru.ru_maxrss  # bytes on macOS
+    return {"user_s": round(ru.ru_utime, 3), "sys_s": round(ru.ru_stime, 3), "max_rss_kb": int(rss)}
+
+
+def wait_with_usage(proc: subprocess.Popen, timeout: Optional[float] = None) -> Tuple[int, Dict[str, Any]]:
+    """proc.wait() that also returns the child's rusage (via wait4); raises subprocess.TimeoutExpired."""
+    deadline = None if timeout is None else time.monotonic() + timeout
+    delay = 0.0005
+    while True:
+        try:
+            pid, status, ru = os.wait4(proc.pid, 0 if deadline is None else os.WNOHANG)
+        except ChildProcessError:  # already reaped elsewhere
+            return proc.wait(), {}
+        if pid:
+            proc.returncode = os.waitstatus_to_exitcode(status)
+            return proc.returncode, rusage_dict(ru)
+        if deadline is not None and time.monotonic() >= deadline:
+            raise subprocess.TimeoutExpired(proc.args, timeout or 0)
+        time.sleep(delay)
+        delay = min(delay * 2, 0.05)
+
+
+_METRICS_LOCK = threading.Lock()
+
+
+def record_metrics(tool: str, entry: Dict[str, Any]) -> None:
+    """Append one line to the session metrics log (.gpt_code_cache/metrics.jsonl); never raises."""
+    if not metrics_enabled():
+        return
+    line = json.dumps({"ts": round(time.time(), 3), "session": SESSION_ID, "tool": tool, **entry}, ensure_ascii=False)
+    with _METRICS_LOCK:
+        try:
+            METRICS_PATH.parent.mkdir(parents=True, exist_ok=True)
+            if METRICS_PATH.exists() and METRICS_PATH.stat().st_size > METRICS_MAX_BYTES:
+                os.replace(METRICS_PATH, METRICS_PATH.with_name(METRICS_PATH.name + ".1"))
+            with open(METRICS_PATH, "a", encoding="utf-8") as f:
+                f.write(line + "\n")
+        except OSError:
+            pass
+
+
+def usage_text(usage: Dict[str, Any]) -> str:
+    """'wall 1.20s, cpu 0.80s user + 0.10s sys, peak rss 45.2MB, out 3.4KB' (missing fields left out)."""
+    parts = []
+    if "wall_s" in usage:
+        parts.append(f"wall {usage['wall_s']:.2f}s")
+    if "user_s" in usage:
+        parts.append(f"cpu {usage['user_s']:.2f}s user + {usage.get('sys_s', 0):.2f}s sys")
+    if usage.get("max_rss_kb"):
+        parts.append(f"peak rss {usage['max_rss_kb'] / 1024:.1f}MB")
+    out = usage.get("stdout_bytes", 0) + usage.get("stderr_bytes", 0)
+    if "stdout_bytes" in usage:
+        parts.append(f"out {out / 1024:.1f}KB" if out >= 1024 else f"out {out}B")
+    return ", ".join(parts)
+
+
+@dataclass
+class ProcResult:
+    returncode: Optional[int]  # None when the process was killed for a timeout or the output cap
+    stdout: str
+    stderr: str
+    timed_out: bool = False
+    output_limited: bool = False  # killed because the fatal output cap was hit
+    truncated: bool = False  # the middle of stdout or stderr was dropped
+    stdout_bytes: int = 0
+    stderr_bytes: int = 0
+    duration: float = 0.0
+    user_s: Optional[float] = None  # CPU time of the child (and the children it waited for)
+    sys_s: Optional[float] = None
+    max_rss_kb: Optional[int] = None
+
+    def usage(self) -> Dict[str, Any]:
+        data: Dict[str, Any] = {"wall_s": round(self.duration, 3)}
+        if self.user_s is not None:
+            data.update(user_s=self.user_s, sys_s=self.sys_s, max_rss_kb=self.max_rss_kb)
+        data.update(stdout_bytes=self.stdout_bytes, stderr_bytes=self.stderr_bytes)
+        return data
+
+
+def run_bounded(args: List[str], *, cwd: Optional[str] = None, timeout: Optional[float] = 20,
+                limit: Optional[int] = 6000, on_output: Optional[OutputCallback] = None,
+                kill_after_bytes: Optional[int] = None, env: Optional[Dict[str, str]] = None,
+                rlimits: Optional[Dict[str, int]] = None, tool: str = "") -> ProcResult:
+    """Run `args` reading stdout/stderr incrementally into bounded head/tail buffers.
+
+    This is the one place tools spawn short-lived subprocesses, so every call
+    gets the same accounting: wall time, user/sys CPU and peak RSS (wait4) and
+    output bytes land on the result and, when `tool` is given, in the
+    session metrics log.
+
+    Each stream keeps at most `limit` characters (see split_budget; None keeps
+    everything, for callers that parse the output). `on_output` sees every
+    chunk live. When the combined output exceeds `kill_after_bytes` (default:
+    fatal_output_limit()) the process group is killed early; callers that
+    parse the output pass 0 (never), as a cut-off result would look complete.
+    `rlimits` ({"cpu": s, "as": bytes, "fsize": bytes, "nofile": n}, default:
+    default_rlimits()) are applied in the child. `timeout` None waits forever.
+    Raises FileNotFoundError / OSError like subprocess.Popen.
+    """
+    kill_after = fatal_output_limit() if kill_after_bytes is None else kill_after_bytes
+    t0 = time.monotonic()
+    proc = subprocess.Popen(args, cwd=cwd, env=env, stdin=subprocess.DEVNULL, stdout=subprocess.PIPE,
+                            stderr=subprocess.PIPE, start_new_session=True,
+                            preexec_fn=rlimit_preexec(default_rlimits() if rlimits is None else rlimits))
+    assert proc.stdout is not None and proc.stderr is not None
+    budget = split_budget(limit) if limit is not None else {"head": sys.maxsize, "tail": 0}
+    caps = {"stdout": BoundedCapture(**budget), "stderr": BoundedCapture(**budget)}
+    counts = {"stdout": 0, "stderr": 0}
+    decoders = {name: codecs.getincrementaldecoder("utf-8")(errors="replace") for name in caps}
+    sel = selectors.DefaultSelector()
+    sel.register(proc.stdout, selectors.EVENT_READ, "stdout")
+    sel.register(proc.stderr, selectors.EVENT_READ, "stderr")
+    deadline = t0 + timeout if timeout is not None else None
+    timed_out = limited = drained = False
+    usage: Dict[str, Any] = {}
+
+    def emit(name: str, text: str) -> None:
+        caps[name].feed(text)
+        if on_output is not None and text:
+            on_output(name, text)
+
+    try:
+        while sel.get_map():
+            left = deadline - time.monotonic() if deadline is not None else None
+            if left is not None and left <= 0:
+                timed_out = True
+                break
+            events = sel.select(left)
+            for key, _ in events:
+                name = key.data
+                data = os.read(key.fd, READ_CHUNK)
+                if not data:
+                    sel.unregister(key.fileobj)
+                    emit(name, decoders[name].decode(b"", final=True))
+                    continue
+                counts[name] += len(data)
+                emit(name, decoders[name].decode(data))
+            if kill_after and counts["stdout"] + counts["stderr"] > kill_after:
+                limited = True
+                break
+            if events:
+                time.sleep(COALESCE_S)
+        else:
+            drained = True
+    finally:
+        sel.close()
+        if not drained:  # timeout, output cap, or an exception from on_output
+            try:
+                os.killpg(proc.pid, signal.SIGKILL)
+            except OSError:
+                pass
+        try:
+            _, usage = wait_with_usage(proc, max(0.1, deadline - time.monotonic()) if deadline is not None else None)
+        except subprocess.TimeoutExpired:
+            # pipes closed but the process lingers (e.g. it daemonized its output away)
+            timed_out = True
+            try:
+                os.killpg(proc.pid, signal.SIGKILL)
+            except OSError:
+                pass
+            _, usage = wait_with_usage(proc)
+        proc.stdout.close()
+        proc.stderr.close()
+    res = ProcResult(
+        returncode=None if (timed_out or limited) else proc.returncode,
+        stdout=caps["stdout"].text(), stderr=caps["stderr"].text(),
+        timed_out=timed_out, output_limited=limited,
+        truncated=any(c.omitted for c in caps.values()),
+        stdout_bytes=counts["stdout"], stderr_bytes=counts["stderr"],
+        duration=time.monotonic() - t0,
+        user_s=usage.get("user_s"), sys_s=usage.get("sys_s"), max_rss_kb=usage.get("max_rss_kb"),
+    )
+    if tool:
+        record_metrics(tool, {"argv0": os.path.basename(str(args[0])), "returncode": res.returncode,
+                              "timed_out": timed_out, **res.usage()})
+    return res
+
+
+def format_result(tag: str, res: ProcResult, timeout: float, limit: int) -> str:
+    """`[tag] returncode=…` plus the bounded stdout/stderr, shared by Shell and PyExec."""
+    if res.output_limited:
+        total = res.stdout_bytes + res.stderr_bytes
+        status = f"[{tag}] killed after {total} bytes of output (GPT_CODE_OUTPUT_KILL_MB)"
+    elif res.timed_out:
+        status = f"[{tag}] timeout after {timeout}s"
+    else:
+        status = f"[{tag}] returncode={res.returncode}"
+    status += f" ({usage_text(res.usage())})"
+    if res.truncated:
+        status += f" (output truncated: stdout {res.stdout_bytes}B, stderr {res.stderr_bytes}B; head and tail kept)"
+    combined = "".join([
+        status + "\n",
+        ("[stdout]\n" + res.stdout if res.stdout else ""),
+        ("[stderr]\n" + res.stderr if res.stderr else ""),
+    ]).strip()
+
+    if len(combined) > limit:
+        combined = combined[:limit] + "\n…(truncated)"
+    return combined
@@ -0,0 +1,397 @@
+from __future__ import annotations
+
+import atexit
+import json
+import os
+import re
+import signal
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+if __package__:
+    from .pyexec_pool import LineChannel, PoolError, exit_code, recv_capped, redirect_output
+    from .proc_runner import capture_file, fatal_output_limit, record_metrics, usage_text
+else:  # started as `python3 tools/py_session.py --kernel`
+    from pyexec_pool import LineChannel, PoolError, exit_code, recv_capped, redirect_output  # type: ignore
+    from proc_runner import capture_file, fatal_output_limit, record_metrics, usage_text  # type: ignore
+    # drop the top-level aliases so they cannot shadow workspace modules of the same name
+    for _name in [n for n in sys.modules if n.split(".")[0] in {"proc_runner", "pyexec_pool", "index"}]:
+        del sys.modules[_name]
+
+
+ROOT_DIR = Path(__file__).resolve().parents[1]
+
+MAX_OUTPUT = 4000
+STREAM_LIMIT = (MAX_OUTPUT - 300) // 2
+MAX_SESSIONS = 4
+STARTUP_TIMEOUT = 15.0
+# how long an interrupted snippet gets to unwind before the kernel is killed
+INTERRUPT_GRACE = 2.0
+NAME_RE = re.compile(r"[A-Za-z0-9_.-]{1,64}")
+
+
+def mem_limit_mb() -> int:
+    """Address-space limit per session kernel (GPT_CODE_PYSESSION_MEM_MB, 0 = unlimited)."""
+    try:
+        return max(0, int(os.environ.get("GPT_CODE_PYSESSION_MEM_MB", "1024")))
+    except ValueError:
+        return 1024
+
+
+class PySession:
+    """A named, long-lived Python kernel whose globals survive between calls.
+
+    The kernel (`python3 tools/py_session.py --kernel`) runs each snippet in
+    one persistent `__main__` namespace, so imports, loaded data and helper
+    functions stay around for the next call. A call that runs past its
+    timeout is interrupted with SIGINT (KeyboardInterrupt in the snippet, the
+    state survives); only a kernel that ignores the interrupt is killed, and
+    then its state is lost. Memory is capped with RLIMIT_AS, so a runaway
+    allocation raises MemoryError instead of taking the host down.
+    """
+
+    def __init__(self, name: str, mem_mb: Optional[int] = None):
+        self.name = name
+        self.mem_mb = mem_limit_mb() if mem_mb is None else mem_mb
+        self.proc: Optional[subprocess.Popen] = None
+        self.chan: Optional[LineChannel] = None
+        self.calls = 0
+        self.started_at = 0.0
+        self.last_used = 0.0
+        self._busy = False
+        self._lock = threading.Lock()
+
+    def alive(self) -> bool:
+        return self.proc is not None and self.proc.poll() is None
+
+    def start(self) -> None:
+        self.calls = 0
+        self.started_at = self.last_used = time.time()
+        self.proc = subprocess.Popen(
+            [sys.executable, "-u", str(Path(__file__).resolve()), "--kernel", str(self.mem_mb)],
+            cwd=str(ROOT_DIR), stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+            start_new_session=True,  # shutdown() also kills what the snippets spawned
+        )
+        self.chan = LineChannel(self.proc)
+        if self.chan.recv(time.monotonic() + STARTUP_TIMEOUT) != {"ready": True}:
+            self.shutdown()
+            raise PoolError("session kernel did not start")
+
+    def shutdown(self) -> None:
+        proc, self.proc = self.proc, None
+        if proc is None:
+            return
+        try:
+            os.killpg(proc.pid, signal.SIGKILL)
+        except OSError:
+            pass
+        proc.wait()
+
+    def interrupt(self) -> bool:
+        """Raise KeyboardInterrupt in the running snippet; False if nothing is running."""
+        proc = self.proc
+        if not self._busy or proc is None or proc.poll() is not None:
+            return False
+        try:
+            os.kill(proc.pid, signal.SIGINT)
+        except OSError:
+            return False
+        return True
+
+    def run(self, code: str, timeout: float, cap: int = STREAM_LIMIT) -> Dict[str, Any]:
+        """Run `code` in the session namespace.
+
+        Returns {rc (None on timeout), out, err, interrupted, restarted, call, usage};
+        `restarted` means the kernel had to be (re)started and earlier state is gone.
+        `usage` is this call's wall/CPU time, the kernel's peak RSS and output bytes.
+        Output past GPT_CODE_OUTPUT_KILL_MB interrupts the snippet like a timeout
+        and sets `output_limited`.
+        """
+        t0 = time.monotonic()
+        with self._lock:
+            restarted = False
+            if not self.alive():
+                restarted = self.started_at > 0
+                self.start()
+            assert self.chan is not None
+            self.calls += 1
+            self.last_used = time.time()
+            res: Dict[str, Any] = {"rc": None, "interrupted": False, "restarted": restarted, "call": self.calls}
+            with tempfile.TemporaryDirectory(prefix="pysession-") as td:
+                out_p, err_p = os.path.join(td, "out"), os.path.join(td, "err")
+                self._busy = True
+                try:
+                    self.chan.send({"code": code, "out": out_p, "err": err_p})
+                    done, limited = recv_capped(self.chan, time.monotonic() + timeout, (out_p, err_p),
+                                                fatal_output_limit())
+                    if done is None:
+                        self.interrupt()
+                        done = self.chan.recv(time.monotonic() + INTERRUPT_GRACE)
+                        res["output_limited" if limited else "timeout"] = True
+                except PoolError:
+                    done = None
+                finally:
+                    self._busy = False
+                if done is None:
+                    self.shutdown()  # unresponsive or crashed (e.g. a segfault): state is lost
+                    res["killed"] = True
+                else:
+                    res["rc"] = int(done["rc"])
+                    res["interrupted"] = bool(done.get("interrupted"))
+                usage: Dict[str, Any] = {"wall_s": round(time.monotonic() - t0, 3)}
+                usage.update({k: done[k] for k in ("user_s", "sys_s", "max_rss_kb") if done and k in done})
+                for key, path in (("stdout_bytes", out_p), ("stderr_bytes", err_p)):
+                    try:
+                        usage[key] = os.path.getsize(path)
+                    except OSError:
+                        usage[key] = 0
+                res["usage"] = usage
+                res["out"] = capture_file(out_p, cap)
+                res["err"] = capture_file(err_p, cap)
+            record_metrics("py_session", {"name": self.name, "returncode": None if res.get("output_limited") else res["rc"],
+                                          "timed_out": bool(res.get("timeout")), **usage})
+            return res
+
+
+_SESSIONS: "OrderedDict[str, PySession]" = OrderedDict()
+_SESSIONS_LOCK = threading.Lock()
+
+
+def get_session(name: str, mem_mb: Optional[int] = None) -> PySession:
+    """The session called `name`, created on first use; the least recently used one is closed past MAX_SESSIONS."""
+    with _SESSIONS_LOCK:
+        sess = _SESSIONS.get(name)
+        if sess is None:
+            sess = PySession(name, mem_mb)
+            _SESSIONS[name] = sess
+            while len(_SESSIONS) > MAX_SESSIONS:
+                _, old = _SESSIONS.popitem(last=False)
+                old.shutdown()
+        _SESSIONS.move_to_end(name)
+        return sess
+
+
+def close_session(name: str) -> bool:
+    with _SESSIONS_LOCK:
+        sess = _SESSIONS.pop(name, None)
+    if sess is None:
+        return False
+    sess.shutdown()
+    return True
+
+
+def list_sessions() -> List[Dict[str, Any]]:
+    with _SESSIONS_LOCK:
+        sessions = list(_SESSIONS.values())
+    return [{"name": s.name, "alive": s.alive(), "calls": s.calls, "mem_mb": s.mem_mb,
+             "idle_s": round(time.time() - s.last_used, 1) if s.last_used else None} for s in sessions]
+
+
+@atexit.register
+def shutdown_all() -> None:
+    with _SESSIONS_LOCK:
+        sessions = list(_SESSIONS.values())
+        _SESSIONS.clear()
+    for s in sessions:
+        s.shutdown()
+
+
+def _format(name: str, res: Dict[str, Any], timeout: float) -> str:
+    tag = f"[py_session:{name}]"
+    usage = res.get("usage") or {}
+    stopped = f"stopped after {usage.get('stdout_bytes', 0) + usage.get('stderr_bytes', 0)} bytes of output (GPT_CODE_OUTPUT_KILL_MB)"
+    if res.get("killed"):
+        if res.get("timeout"):
+            head = f"{tag} timeout after {timeout}s; kernel did not respond to the interrupt and was killed"
+        elif res.get("output_limited"):
+            head = f"{tag} {stopped}; kernel did not respond to the interrupt and was killed"
+        else:
+            head = f"{tag} kernel died"
+        head += " (session state lost)\n"
+    elif res.get("output_limited"):
+        head = f"{tag} {stopped}; interrupted (session state kept)\n"
+    elif res.get("timeout"):
+        head = f"{tag} timeout after {timeout}s; interrupted (session state kept)\n"
+    else:
+        head = f"{tag} returncode={res['rc']} (call {res['call']}; {usage_text(res.get('usage') or {})})\n"
+    if res.get("restarted"):
+        head += f"{tag} note: kernel was restarted, earlier state is gone\n"
+    out, err = res.get("out") or "", res.get("err") or ""
+    combined = "".join([
+        head,
+        ("[stdout]\n" + out if out else ""),
+        ("[stderr]\n" + err if err else ""),
+    ]).strip()
+    if len(combined) > MAX_OUTPUT:
+        combined = combined[:MAX_OUTPUT] + "\n…(truncated)"
+    return combined
+
+
+def run(input_str: str, timeout: float = 30) -> str:
+    """JSON: {"code": str, "session"?: str, "action"?: "run"|"reset"|"close"|"interrupt"|"list",
+    "timeout"?: float, "mem_mb"?: int}. Plain text is run in the "default" session.
+
+    `reset` restarts the kernel with empty globals; `mem_mb` only applies when
+    the session is created (or reset).
+    """
+    try:
+        args = json.loads(input_str) if input_str.strip().startswith("{") else {"code": input_str}
+    except json.JSONDecodeError as e:
+        return f"[py_session] invalid JSON: {e}"
+    name = str(args.get("session") or "default")
+    action = str(args.get("action") or "run")
+    if not NAME_RE.fullmatch(name):
+        return f"[py_session] invalid session name: {name!r}"
+    try:
+        timeout = float(args.get("timeout", timeout))
+        mem_mb = int(args["mem_mb"]) if args.get("mem_mb") is not None else None
+    except (TypeError, ValueError) as e:
+        return f"[py_session] invalid argument: {e}"
+
+    if action == "list":
+        return json.dumps({"sessions": list_sessions()}, ensure_ascii=False)
+    if action == "close":
+        return f"[py_session:{name}] " + ("closed" if close_session(name) else "no such session")
+    if action == "interrupt":
+        with _SESSIONS_LOCK:
+            sess = _SESSIONS.get(name)
+        return f"[py_session:{name}] " + ("interrupted" if sess and sess.interrupt() else "nothing running")
+    if action == "reset":
+        close_session(name)
+        sess = get_session(name, mem_mb)
+        try:
+            sess.start()
+        except (OSError, PoolError) as e:
+            return f"[py_session:{name}] failed to start: {e}"
+        return f"[py_session:{name}] reset (empty namespace)"
+    if action != "run":
+        return f"[py_session] unknown action: {action}"
+
+    code = str(args.get("code") or "").strip()
+    if not code:
+        return "[py_session] empty code"
+    sess = get_session(name, mem_mb)
+    try:
+        res = sess.run(code, timeout)
+    except (OSError, PoolError) as e:
+        close_session(name)
+        return f"[py_session:{name}] failed to start: {e}"
+    return _format(name, res, timeout)
+
+
+# -- kernel process -------------------------------------------------------------
+
+def _exec_cell(code: str, ns: Dict[str, Any]) -> None:
+    """Run `code` in `ns`; like a REPL, a trailing expression's repr() is printed and kept in `_`."""
+    import ast
+
+    tree = ast.parse(code, "<session>", "exec")
+    last = tree.body.pop() if tree.body and isinstance(tree.body[-1], ast.Expr) else None
+    exec(compile(tree, "<session>", "exec"), ns)
+    if last is not None:
+        value = eval(compile(ast.Expression(last.value), "<session>", "eval"), ns)
+        if value is not None:
+            ns["_"] = value
+            print(repr(value))
+
+
+def _print_exception() -> None:
+    """Print the current exception starting at the snippet's own frames."""
+    import traceback
+
+    etype, value, tb = sys.exc_info()
+    while tb is not None and tb.tb_frame.f_code.co_filename != "<session>":
+        tb = tb.tb_next
+    te = traceback.TracebackException(etype, value, tb)  # type: ignore[arg-type]
+    # the SIGINT handler's frame is ours, not the snippet's
+    te.stack = traceback.StackSummary.from_list([f for f in te.stack if f.filename != __file__])
+    sys.stderr.write("".join(te.format()))
+
+
+def _cpu() -> Dict[str, float]:
+    import resource
+
+    me, kids = resource.getrusage(resource.RUSAGE_SELF), resource.getrusage(resource.RUSAGE_CHILDREN)
+    return {"user_s": me.ru_utime + kids.ru_utime, "sys_s": me.ru_stime + kids.ru_stime,
+            "max_rss_kb": me.ru_maxrss // 1024 if sys.platform == "darwin" else me.ru_maxrss}
+
+
+def kernel(mem_mb: int) -> None:
+    import builtins
+    import types
+
+    # like `python3 -c` at the project root: workspace imports resolve from cwd
+    sys.path[0] = ""
+    if mem_mb > 0:
+        import resource
+
+        limit = mem_mb * 1024 * 1024
+        try:
+            resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+        except (ValueError, OSError):
+            pass
+    # private copies of the protocol pipes; snippets see /dev/null on stdin and
+    # their own capture files on stdout/stderr
+    inp = os.fdopen(os.dup(0), "r")
+    out = os.fdopen(os.dup(1), "w")
+    null = os.open(os.devnull, os.O_RDWR)
+    for fd in (0, 1):
+        os.dup2(null, fd)
+    sys.stdin = open(0, closefd=False)
+
+    running = False
+
+    def on_sigint(signum: int, frame: Any) -> None:
+        # an interrupt racing the end of a snippet must not kill the kernel loop
+        if running:
+            raise KeyboardInterrupt
+
+    signal.signal(signal.SIGINT, on_sigint)
+    sys.argv = ["-c"]
+    main = types.ModuleType("__main__")
+    main.__dict__["__builtins__"] = builtins
+    sys.modules["__main__"] = main
+    out.write(json.dumps({"ready": True}) + "\n")
+    out.flush()
+    for line in inp:
+        req = json.loads(line)
+        redirect_output(req["out"], req["err"])
+        rc, interrupted = 1, False
+        before = _cpu()
+        try:
+            running = True
+            try:
+                _exec_cell(req["code"], main.__dict__)
+                rc = 0
+            finally:
+                running = False
+        except SystemExit as e:
+            rc = exit_code(e)  # ends the snippet, not the session
+        except KeyboardInterrupt:
+            _print_exception()
+            interrupted = True
+        except BaseException:
+            _print_exception()
+        try:
+            sys.stdout.flush()
+            sys.stderr.flush()
+        except Exception:
+            pass
+        for fd in (1, 2):
+            os.dup2(null, fd)
+        after = _cpu()
+        usage = {"user_s": round(after["user_s"] - before["user_s"], 3),
+                 "sys_s": round(after["sys_s"] - before["sys_s"], 3), "max_rss_kb": int(after["max_rss_kb"])}
+        out.write(json.dumps({"rc": rc & 0xFF, "interrupted": interrupted, **usage}) + "\n")
+        out.flush()
+
+
+if __name__ == "__main__":
+    if len(sys.argv) == 3 and sys.argv[1] == "--kernel":
+        kernel(int(sys.argv[2]))
@@ -0,0 +1,374 @@
+from __future__ import annotations
+
+import atexit
+import json
+import os
+import select
+import signal
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+if __package__:
+    from .proc_runner import capture_file, default_rlimits, fatal_output_limit, rlimit_preexec, rusage_dict
+else:  # started as `python3 tools/pyexec_pool.py --serve`, or imported by the session kernel
+    from proc_runner import capture_file, default_rlimits, fatal_output_limit, rlimit_preexec, rusage_dict  # type: ignore
+    # drop the top-level aliases so they cannot shadow workspace modules of the same name
+    for _name in [n for n in sys.modules if n.split(".")[0] in {"proc_runner", "index"}]:
+        del sys.modules[_name]
+
+
+ROOT_DIR = Path(__file__).resolve().parents[1]
+# workspace package imported once in the template, so snippets importing it start warm
+SRC_DIR = ROOT_DIR / "src"
+
+# stdlib modules snippets commonly use, imported once in the template
+PRELOAD = (
+    "json", "re", "math", "collections", "itertools", "functools", "typing", "dataclasses", "pathlib",
+    "datetime", "random", "textwrap", "subprocess", "traceback", "unittest", "decimal", "statistics",
+)
+STARTUP_TIMEOUT = 15.0
+# how often the capture files are measured against GPT_CODE_OUTPUT_KILL_MB while a worker runs
+OUTPUT_POLL_S = 0.05
+
+
+def enabled() -> bool:
+    return os.environ.get("GPT_CODE_PYEXEC_POOL", "1").lower() not in {"0", "false", "off", "no"}
+
+
+class PoolError(Exception):
+    pass
+
+
+def _src_signature(src_dir: Path) -> Tuple[Tuple[str, int, int], ...]:
+    sig: List[Tuple[str, int, int]] = []
+    for dirpath, dirnames, filenames in os.walk(src_dir):
+        dirnames[:] = [d for d in dirnames if d != "__pycache__"]
+        for name in filenames:
+            if name.endswith(".py"):
+                p = os.path.join(dirpath, name)
+                try:
+                    st = os.stat(p)
+                except OSError:
+                    continue
+                sig.append((p, st.st_mtime_ns, st.st_size))
+    return tuple(sorted(sig))
+
+
+class LineChannel:
+    """JSON lines to a helper process's stdin, replies read from its stdout with deadlines."""
+
+    def __init__(self, proc: subprocess.Popen):
+        self.proc = proc
+        self._buf = b""
+
+    def send(self, obj: Dict[str, Any]) -> None:
+        assert self.proc.stdin is not None
+        try:
+            self.proc.stdin.write((json.dumps(obj) + "\n").encode("utf-8"))
+            self.proc.stdin.flush()
+        except OSError as e:
+            raise PoolError(f"helper process gone: {e}") from None
+
+    def recv(self, deadline: float) -> Optional[Dict[str, Any]]:
+        """Next reply, or None at the deadline."""
+        assert self.proc.stdout is not None
+        fd = self.proc.stdout.fileno()
+        while b"\n" not in self._buf:
+            left = deadline - time.monotonic()
+            if left <= 0 or not select.select([fd], [], [], left)[0]:
+                return None
+            chunk = os.read(fd, 4096)
+            if not chunk:
+                raise PoolError("helper process exited")
+            self._buf += chunk
+        line, self._buf = self._buf.split(b"\n", 1)
+        return json.loads(line)
+
+
+def recv_capped(chan: LineChannel, deadline: float, paths: Tuple[str, ...],
+                limit: int) -> Tuple[Optional[Dict[str, Any]], bool]:
+    """chan.recv(deadline) that gives up early once the files in `paths` hold more than `limit` bytes.
+
+    Returns (reply or None, over the cap). Workers write straight to files,
+    so this is where GPT_CODE_OUTPUT_KILL_MB is enforced for them.
+    """
+    if limit <= 0:
+        return chan.recv(deadline), False
+    while True:
+        reply = chan.recv(min(deadline, time.monotonic() + OUTPUT_POLL_S))
+        if reply is not None:
+            return reply, False
+        total = 0
+        for path in paths:
+            try:
+                total += os.path.getsize(path)
+            except OSError:
+                pass
+        if total > limit:
+            return None, True
+        if time.monotonic() >= deadline:
+            return None, False
+
+
+def redirect_output(out_path: str, err_path: str) -> None:
+    """Point fds 1/2 (and so print(), subprocesses, C extensions) at the given files."""
+    for fd, path in ((1, out_path), (2, err_path)):
+        f = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        os.dup2(f, fd)
+        os.close(f)
+
+
+def print_exception_from_snippet() -> None:
+    """Print the current exception without the runner's own frame, like `python3 -c`."""
+    import traceback
+
+    etype, value, tb = sys.exc_info()
+    traceback.print_exception(etype, value, tb.tb_next if tb else None)
+
+
+def exit_code(e: SystemExit) -> int:
+    if e.code is None:
+        return 0
+    if isinstance(e.code, int):
+        return e.code
+    print(e.code, file=sys.stderr)
+    return 1
+
+
+class ForkServer:
+    """A warm template interpreter that forks one fresh worker per snippet.
+
+    The template (`python3 tools/pyexec_pool.py --serve`) imports PRELOAD and
+    every module under `src_dir` once. Each run() forks it; the child takes
+    the snippet, runs it like `python3 -c` (its own `__main__`, argv, cwd,
+    stdout/stderr at the fd level) and exits, so no state leaks between
+    snippets. Editing a file under `src_dir` restarts the template so a
+    snippet never sees a stale preloaded module.
+    """
+
+    def __init__(self, src_dir: Path = SRC_DIR):
+        self.src_dir = Path(src_dir)
+        self.proc: Optional[subprocess.Popen] = None
+        self.chan: Optional[LineChannel] = None
+        self.sig: Tuple[Tuple[str, int, int], ...] = ()
+        self._lock = threading.Lock()
+
+    def alive(self) -> bool:
+        return self.proc is not None and self.proc.poll() is None
+
+    def start(self) -> None:
+        self.sig = _src_signature(self.src_dir)
+        self.proc = subprocess.Popen(
+            [sys.executable, "-u", str(Path(__file__).resolve()), "--serve", str(self.src_dir)],
+            cwd=str(ROOT_DIR), stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+        )
+        self.chan = LineChannel(self.proc)
+        if self.chan.recv(time.monotonic() + STARTUP_TIMEOUT) != {"ready": True}:
+            self.shutdown()
+            raise PoolError("template did not start")
+
+    def shutdown(self) -> None:
+        proc, self.proc = self.proc, None
+        if proc is None:
+            return
+        try:
+            if proc.stdin:
+                proc.stdin.close()
+            proc.wait(timeout=2)
+        except Exception:
+            proc.kill()
+            proc.wait()
+
+    def run(self, code: str, timeout: float, cwd: Optional[str] = None,
+            cap: int = 4000) -> Tuple[Optional[int], str, str, Dict[str, Any]]:
+        """(returncode or None on timeout, stdout, stderr, usage).
+
+        Each stream keeps its head and tail within `cap` characters; usage has
+        the worker's wall/CPU time and peak RSS (from the template's wait4)
+        and its output bytes. A worker whose output passes
+        GPT_CODE_OUTPUT_KILL_MB is killed like a timeout, with
+        usage["output_limited"] set.
+        """
+        t0 = time.monotonic()
+        with self._lock:
+            if not self.alive() or _src_signature(self.src_dir) != self.sig:
+                self.shutdown()
+                self.start()
+            assert self.chan is not None
+            with tempfile.TemporaryDirectory(prefix="pyexec-") as td:
+                out_p, err_p = os.path.join(td, "out"), os.path.join(td, "err")
+                try:
+                    self.chan.send({"code": code, "cwd": cwd or os.getcwd(), "out": out_p, "err": err_p,
+                                    "rlimits": default_rlimits()})
+                    started = self.chan.recv(time.monotonic() + STARTUP_TIMEOUT)
+                except PoolError:
+                    self.shutdown()
+                    raise
+                if not started or "pid" not in started:
+                    self.shutdown()
+                    raise PoolError("worker did not start")
+                done, limited = recv_capped(self.chan, time.monotonic() + timeout, (out_p, err_p),
+                                            fatal_output_limit())
+                rc: Optional[int]
+                if done is None:
+                    try:
+                        os.killpg(started["pid"], signal.SIGKILL)
+                    except OSError:
+                        pass
+                    done = self.chan.recv(time.monotonic() + STARTUP_TIMEOUT) or {}  # the template reaps it
+                    rc = None
+                else:
+                    rc = int(done["rc"])
+                usage: Dict[str, Any] = {"wall_s": round(time.monotonic() - t0, 3)}
+                usage.update({k: done[k] for k in ("user_s", "sys_s", "max_rss_kb") if k in done})
+                if limited:
+                    usage["output_limited"] = True
+                for name, path in (("stdout_bytes", out_p), ("stderr_bytes", err_p)):
+                    try:
+                        usage[name] = os.path.getsize(path)
+                    except OSError:
+                        usage[name] = 0
+                return rc, capture_file(out_p, cap), capture_file(err_p, cap), usage
+
+
+_SERVER: Optional[ForkServer] = None
+_SERVER_LOCK = threading.Lock()
+
+
+def get_server() -> Optional[ForkServer]:
+    """The shared fork server, started on first use; None if it cannot run here."""
+    global _SERVER
+    with _SERVER_LOCK:
+        if _SERVER is not None and _SERVER.alive():
+            return _SERVER
+        srv = ForkServer()
+        try:
+            srv.start()
+        except (OSError, PoolError):
+            srv.shutdown()
+            return None
+        _SERVER = srv
+        return srv
+
+
+@atexit.register
+def shutdown_all() -> None:
+    global _SERVER
+    with _SERVER_LOCK:
+        if _SERVER is not None:
+            _SERVER.shutdown()
+        _SERVER = None
+
+
+# -- template process -----------------------------------------------------------
+
+def _preload(src_dir: Path) -> List[str]:
+    import importlib
+
+    for name in PRELOAD:
+        try:
+            importlib.import_module(name)
+        except Exception:
+            pass
+    loaded: List[str] = []
+    try:
+        rel = src_dir.resolve().relative_to(ROOT_DIR)
+    except ValueError:
+        return loaded
+    for p in sorted(src_dir.rglob("*.py")):
+        if "__pycache__" in p.parts:
+            continue
+        parts = list(rel.parts) + list(p.relative_to(src_dir).with_suffix("").parts)
+        if parts[-1] == "__init__":
+            parts.pop()
+        name = ".".join(parts)
+        try:
+            importlib.import_module(name)
+        except BaseException:
+            continue  # broken or side-effecting modules are simply not warm
+        loaded.append(name)
+    return loaded
+
+
+def apply_rlimits(limits: Dict[str, int]) -> None:
+    """GPT_CODE_RLIMIT_* limits (sent by the parent) for a worker forked from a template."""
+    apply = rlimit_preexec(limits)
+    if apply is not None:
+        apply()
+
+
+def _child(req: Dict[str, Any], warm: List[str]) -> None:
+    import atexit as _atexit
+    import builtins
+    import types
+
+    rc = 1
+    try:
+        os.setpgid(0, 0)  # a timeout kills the snippet's own subprocesses too
+        null = os.open(os.devnull, os.O_RDONLY)
+        os.dup2(null, 0)
+        os.close(null)
+        redirect_output(req["out"], req["err"])
+        sys.stdin = open(0, closefd=False)
+        apply_rlimits(req.get("rlimits") or {})
+        os.chdir(req["cwd"])
+        if os.path.realpath(req["cwd"]) != str(ROOT_DIR):
+            # `python3 -c` elsewhere would not find the workspace package
+            prefixes = {name.split(".")[0] for name in warm}
+            for name in list(sys.modules):
+                if name.split(".")[0] in prefixes:
+                    del sys.modules[name]
+        sys.argv = ["-c"]
+        main = types.ModuleType("__main__")
+        main.__dict__["__builtins__"] = builtins
+        sys.modules["__main__"] = main
+        try:
+            exec(compile(req["code"], "<string>", "exec"), main.__dict__)
+            rc = 0
+        except SystemExit as e:
+            rc = exit_code(e)
+        except BaseException:
+            print_exception_from_snippet()
+            rc = 1
+        _atexit._run_exitfuncs()
+    finally:
+        try:
+            sys.stdout.flush()
+            sys.stderr.flush()
+        finally:
+            os._exit(rc & 0xFF)
+
+
+def serve(src_dir: Path) -> None:
+    # like `python3 -c`: imports resolve from the snippet's cwd, not from tools/
+    sys.path[0] = ""
+    # protocol replies go to a private copy of stdout; fd 1 itself is muted so
+    # preloaded modules that print cannot corrupt them
+    out = os.fdopen(os.dup(1), "w")
+    null = os.open(os.devnull, os.O_WRONLY)
+    os.dup2(null, 1)
+    os.close(null)
+    warm = _preload(src_dir)
+    out.write(json.dumps({"ready": True}) + "\n")
+    out.flush()
+    for line in sys.stdin:
+        req = json.loads(line)
+        pid = os.fork()
+        if pid == 0:
+            out.close()
+            _child(req, warm)
+        out.write(json.dumps({"pid": pid}) + "\n")
+        out.flush()
+        _, status, ru = os.wait4(pid, 0)
+        out.write(json.dumps({"rc": os.waitstatus_to_exitcode(status), **rusage_dict(ru)}) + "\n")
+        out.flush()
+
+
+if __name__ == "__main__":
+    if len(sys.argv) == 3 and sys.argv[1] == "--serve":
+        serve(Path(sys.argv[2]))
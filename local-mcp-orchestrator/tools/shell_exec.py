@@ -1,19 +1,27 @@
 from __future__ import annotations
 
 import shlex
-import subprocess
 from pathlib import Path
+from typing import Optional
+
+from .proc_runner import OutputCallback, format_result, run_bounded
 
 
 ROOT_DIR = Path(__file__).resolve().parents[1]
 
+MAX_OUTPUT = 6000
+# per stream, leaving room for the status line so the tail is never cut by MAX_OUTPUT
+STREAM_LIMIT = (MAX_OUTPUT - 300) // 2
+
 
-def run(cmd: str, timeout: int = 20) -> str:
+def run(cmd: str, timeout: int = 20, on_output: Optional[OutputCallback] = None) -> str:
     """Run a shell command safely within the workspace.
 
     - Executes with cwd at project root.
     - Uses shlex.split to avoid shell injection; no shell=True.
-    - Captures stdout/stderr; applies timeout and truncation.
+    - Reads stdout/stderr incrementally into bounded head/tail buffers
+      (tools/proc_runner); `on_output` receives chunks live.
+    - Applies timeout, and kills early past GPT_CODE_OUTPUT_KILL_MB of output.
     """
     cmd = (cmd or "").strip()
     if not cmd:
@@ -25,31 +33,11 @@ def run(cmd: str, timeout: int = 20) -> str:
         return f"[sh] parse error: {type(e).__name__}: {e}"
 
     try:
-        proc = subprocess.run(
-            args,
-            cwd=str(ROOT_DIR),
-            capture_output=True,
-            text=True,
-            timeout=timeout,
-        )
-    except subprocess.TimeoutExpired:
-        return f"[sh] timeout after {timeout}s"
+        res = run_bounded(args, cwd=str(ROOT_DIR), timeout=timeout, limit=STREAM_LIMIT, on_output=on_output,
+                          tool="shell")
     except FileNotFoundError:
         return f"[sh] command not found: {args[0]}"
     except Exception as e:
         return f"[sh] failed: {type(e).__name__}: {e}"
 
-    out = (proc.stdout or "")
-    err = (proc.stderr or "")
-    rc = proc.returncode
-
-    combined = "".join([
-        f"[sh] returncode={rc}\n",
-        ("[stdout]\n" + out if out else ""),
-        ("[stderr]\n" + err if err else ""),
-    ]).strip()
-
-    if len(combined) > 6000:
-        combined = combined[:6000] + "\n…(truncated)"
-    return combined
-
+    return format_result("sh", res, timeout, MAX_OUTPUT)
@@ -0,0 +1,217 @@
+from __future__ import annotations
+
+import hashlib
+import importlib.util
+import json
+import os
+import sys
+import tempfile
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from ..index.imports import ImportGraph, get_graph, module_name
+from ..index.symbols import SymbolIndex
+from ..index.workspace import CACHE_DIR, ROOT_DIR, iter_files
+
+STATE_DIR = CACHE_DIR / "tests"
+# files that change how every test runs; editing one forces a full run
+CONFIG_FILES = ("conftest.py", "pytest.ini", "setup.cfg", "tox.ini", "pyproject.toml", "requirements.txt")
+# non-.py files here are test data (fixtures, golden files) that any test may read; a change forces a full run
+TEST_DATA_DIR = "tests"
+REPORT_LIMIT = 50  # paths listed per category in the report
+
+
+def is_test_file(rel: str) -> bool:
+    name = rel.rsplit("/", 1)[-1]
+    return rel.startswith("tests/") and name.startswith("test") and name.endswith(".py")
+
+
+def test_file_lookup(tests: List[str]) -> Callable[[str], Optional[str]]:
+    """Map a dotted test name ("tests.test_calc.TestCalc.test_add") to the test file defining it."""
+    by_module = sorted(((module_name(t), t) for t in tests), key=lambda p: -len(p[0]))
+    stems = {module_name(t).rsplit(".", 1)[-1]: t for t in tests}
+
+    def lookup(dotted: str) -> Optional[str]:
+        for mod, rel in by_module:
+            if dotted == mod or dotted.startswith(mod + "."):
+                return rel
+        # `unittest discover -s tests` and pytest's rootdir insertion drop the package prefix
+        return stems.get(dotted.split(".", 1)[0])
+
+    return lookup
+
+
+def coverage_enabled() -> bool:
+    """Collect a per-test coverage map on full runs (GPT_CODE_TEST_COVERAGE=1 and `coverage` installed)."""
+    if os.environ.get("GPT_CODE_TEST_COVERAGE", "0").lower() in {"0", "false", "off", "no"}:
+        return False
+    return importlib.util.find_spec("coverage") is not None
+
+
+@dataclass
+class Selection:
+    mode: str  # "affected" | "full"
+    reason: str
+    changed: List[str]
+    selected: List[str]  # test files to run; every test file for a full run
+    skipped: List[str]
+    snapshot: Dict[str, str] = field(repr=False, default_factory=dict)
+    via: Dict[str, str] = field(default_factory=dict)  # selected test -> changed file that pulled it in
+
+    def report(self) -> Dict[str, Any]:
+        def cap(paths: List[str]) -> List[str]:
+            return paths[:REPORT_LIMIT] + ([f"… {len(paths) - REPORT_LIMIT} more"] if len(paths) > REPORT_LIMIT else [])
+
+        return {
+            "mode": self.mode,
+            "reason": self.reason,
+            "changed": cap(self.changed),
+            "selected": cap(self.selected),
+            "skipped": cap(self.skipped),
+            "counts": {"changed": len(self.changed), "selected": len(self.selected), "skipped": len(self.skipped)},
+            "via": {t: self.via[t] for t in self.selected[:REPORT_LIMIT] if t in self.via},
+        }
+
+
+class AffectedTests:
+    """Picks the test modules affected by files changed since the last green run.
+
+    A green run stores a snapshot (content hash of every workspace `.py` file,
+    the CONFIG_FILES and the data files under TEST_DATA_DIR). The next selection diffs the tree against it and keeps
+    the test files that changed themselves, that import a changed file
+    (transitively, via the import graph), or that covered it according to
+    the coverage map from the last full run with GPT_CODE_TEST_COVERAGE=1.
+    Anything the static view cannot answer safely (no baseline yet, a config
+    file, a test data file or a deleted module) falls back to a full run.
+    """
+
+    def __init__(self, root: Path | str = ROOT_DIR, state_dir: Path = STATE_DIR, graph: Optional[ImportGraph] = None):
+        self.root = Path(root)
+        self.state_dir = Path(state_dir)
+        if graph is None:
+            graph = get_graph() if self.root == ROOT_DIR else ImportGraph(SymbolIndex(self.root, self.state_dir / "symbols.json"))
+        self.graph = graph
+        self.baseline_path = self.state_dir / "baseline.json"
+        self.coverage_path = self.state_dir / "coverage_map.json"
+
+    def snapshot(self) -> Dict[str, str]:
+        self.graph.refresh()
+        index = self.graph.index
+        snap = {rel: index.file_hash(rel) or "" for rel in index.files()}
+        for name in CONFIG_FILES:
+            if name in snap:
+                continue
+            try:
+                snap[name] = hashlib.sha256((self.root / name).read_bytes()).hexdigest()
+            except OSError:
+                pass
+        for rel in iter_files(self.root / TEST_DATA_DIR):
+            if rel.endswith(".py"):
+                continue
+            try:
+                snap[f"{TEST_DATA_DIR}/{rel}"] = hashlib.sha256((self.root / TEST_DATA_DIR / rel).read_bytes()).hexdigest()
+            except OSError:
+                pass
+        return snap
+
+    def _load(self, path: Path) -> Optional[Dict[str, Any]]:
+        try:
+            return json.loads(path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return None
+
+    def _store(self, path: Path, data: Dict[str, Any]) -> None:
+        try:
+            self.state_dir.mkdir(parents=True, exist_ok=True)
+            with tempfile.NamedTemporaryFile("w", encoding="utf-8", dir=str(self.state_dir), delete=False) as tf:
+                json.dump(data, tf, separators=(",", ":"))
+                tmp_name = tf.name
+            os.replace(tmp_name, str(path))
+        except OSError:
+            pass  # selection state is best-effort; the next run is just a full one
+
+    def baseline(self) -> Optional[Dict[str, Any]]:
+        data = self._load(self.baseline_path)
+        return data if data and data.get("root") == str(self.root) else None
+
+    def record_green(self, snapshot: Dict[str, str]) -> None:
+        """Remember `snapshot` (taken before the run) as the last state with every test passing."""
+        self._store(self.baseline_path, {"root": str(self.root), "created": time.time(), "files": snapshot})
+
+    def coverage_map(self) -> Dict[str, List[str]]:
+        data = self._load(self.coverage_path)
+        return data.get("files", {}) if data and data.get("root") == str(self.root) else {}
+
+    def select(self, full: bool = False) -> Selection:
+        snap = self.snapshot()
+        tests = sorted(rel for rel in snap if is_test_file(rel))
+        base = self.baseline()
+        if full or base is None:
+            return Selection("full", "requested" if full else "no green baseline yet", [], tests, [], snap)
+        old: Dict[str, str] = base.get("files") or {}
+        changed = sorted(rel for rel in set(snap) | set(old) if snap.get(rel) != old.get(rel))
+        config = [rel for rel in changed if rel.rsplit("/", 1)[-1] in CONFIG_FILES]
+        if config:
+            return Selection("full", f"config changed: {', '.join(config)}", changed, tests, [], snap)
+        # which tests read a data file is not visible statically
+        data = [rel for rel in changed if not rel.endswith(".py")]
+        if data:
+            return Selection("full", f"test data changed: {', '.join(data[:5])}", changed, tests, [], snap)
+        # a removed module's importers are no longer known to the graph
+        deleted = [rel for rel in changed if rel not in snap and not is_test_file(rel)]
+        if deleted:
+            return Selection("full", f"module removed: {', '.join(deleted[:5])}", changed, tests, [], snap)
+
+        via: Dict[str, str] = {}
+        present = [rel for rel in changed if rel in snap]
+        for rel in present:
+            if is_test_file(rel):
+                via[rel] = rel
+        deps = self.graph.dependents(present)
+        for rel in deps:
+            if is_test_file(rel) and rel not in via:
+                # walk the import chain back to the changed file that started it
+                src = deps[rel]["via"]
+                while src in deps:
+                    src = deps[src]["via"]
+                via[rel] = src
+        cov = self.coverage_map()
+        for rel in present:
+            for test in cov.get(rel, ()):
+                if test in snap and test not in via:
+                    via[test] = rel
+        selected = sorted(via)
+        skipped = [t for t in tests if t not in via]
+        reason = f"{len(changed)} file(s) changed since the last green run" if changed else "no changes since the last green run"
+        return Selection("affected", reason, changed, selected, skipped, snap, via)
+
+    # -- coverage (optional) ---------------------------------------------------
+
+    def coverage_command(self, argv: List[str]) -> Tuple[List[str], Path]:
+        """Wrap a test command so it records which test touched which file; returns (argv, rcfile)."""
+        rc = self.state_dir / "coveragerc"
+        self.state_dir.mkdir(parents=True, exist_ok=True)
+        rc.write_text(
+            "[run]\ndynamic_context = test_function\n"
+            f"data_file = {self.state_dir / '.coverage'}\nsource = .\n",
+            encoding="utf-8",
+        )
+        mod = argv[2:] if argv[:2] == ["python3", "-m"] else argv
+        return [sys.executable, "-m", "coverage", "run", f"--rcfile={rc}", "-m", *mod], rc
+
+    def store_coverage(self, json_report: Dict[str, Any], tests: List[str]) -> int:
+        """Turn `coverage json --show-contexts` output into {source file: [test files]}; returns #files mapped."""
+        test_of = test_file_lookup(tests)
+        mapping: Dict[str, List[str]] = {}
+        for path, info in (json_report.get("files") or {}).items():
+            rel = os.path.relpath(os.path.join(self.root, path), self.root).replace(os.sep, "/")
+            if rel.startswith("..") or is_test_file(rel):
+                continue
+            owners = {test_of(ctx) for ctxs in (info.get("contexts") or {}).values() for ctx in ctxs if ctx}
+            owners.discard(None)
+            if owners:
+                mapping[rel] = sorted(o for o in owners if o)
+        self._store(self.coverage_path, {"root": str(self.root), "created": time.time(), "files": mapping})
+        return len(mapping)
@@ -0,0 +1,334 @@
+from __future__ import annotations
+
+import atexit
+import importlib
+import json
+import os
+import shutil
+import signal
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+if __package__:
+    from ..index.imports import SOURCE_ROOTS, ImportGraph, module_name
+    from ..index.workspace import ROOT_DIR
+    from ..proc_runner import ProcResult, default_rlimits, record_metrics, rusage_dict
+    from ..pyexec_pool import LineChannel, PoolError, apply_rlimits, redirect_output
+    from .affected import CONFIG_FILES, test_file_lookup
+    from .runner import RecordingResult, flatten, prioritize
+    from .shard import Shard, TestHistory
+else:  # started as `python3 tools/testing/resident.py --serve`
+    sys.path.insert(1, str(Path(__file__).resolve().parents[1]))
+    from proc_runner import rusage_dict  # type: ignore
+    from pyexec_pool import apply_rlimits, redirect_output  # type: ignore
+    from runner import RecordingResult, flatten, prioritize  # type: ignore
+    del sys.path[1]
+    # drop the top-level aliases so they cannot shadow workspace modules of the same name
+    for _name in [n for n in sys.modules if n.split(".")[0] in {"proc_runner", "pyexec_pool", "runner", "index"}]:
+        del sys.modules[_name]
+    ROOT_DIR = Path(__file__).resolve().parents[2]
+
+STARTUP_TIMEOUT = 15.0
+MAX_RUNS = 50  # the template is recycled after this many runs
+
+
+def enabled() -> bool:
+    return os.environ.get("GPT_CODE_TEST_RESIDENT", "1").lower() not in {"0", "false", "off", "no"}
+
+
+def module_names(rel: str) -> List[str]:
+    """Names a workspace file can be imported under ("src/calc.py" -> src.calc and calc)."""
+    names = [module_name(rel)]
+    for root in SOURCE_ROOTS:
+        if rel.startswith(root):
+            names.append(module_name(rel[len(root):]))
+    return names
+
+
+class ResidentTests:
+    """A warm unittest template that forks one fresh child per run.
+
+    The template (`python3 tools/testing/resident.py --serve`) keeps the
+    test framework, the project and the test modules imported. Before a run
+    it drops the modules whose files changed, plus everything importing them
+    (from the import graph), and re-imports them, so only the edited part of
+    the project is reloaded. Each run then forks a child that executes the
+    tests with tools/testing/runner.py's collector and exits, so test state
+    never carries over between runs. A change that purging cannot express
+    safely (a config file, a removed module, a loaded module that changed
+    without being purged, e.g. behind a dynamic import) or a template
+    recycled after MAX_RUNS starts a fresh template instead.
+    """
+
+    def __init__(self, root: Path = ROOT_DIR):
+        self.root = Path(root)
+        self.proc: Optional[subprocess.Popen] = None
+        self.chan: Optional[LineChannel] = None
+        self.snapshot: Dict[str, str] = {}  # workspace state the template's modules were imported from
+        self.runs = 0
+        self._lock = threading.Lock()
+
+    def alive(self) -> bool:
+        return self.proc is not None and self.proc.poll() is None
+
+    def start(self, snapshot: Dict[str, str]) -> None:
+        self.proc = subprocess.Popen(
+            [sys.executable, "-u", str(Path(__file__).resolve()), "--serve"],
+            cwd=str(self.root), stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+        )
+        self.chan = LineChannel(self.proc)
+        if self.chan.recv(time.monotonic() + STARTUP_TIMEOUT) != {"ready": True}:
+            self.shutdown()
+            raise PoolError("test template did not start")
+        self.snapshot = dict(snapshot)
+        self.runs = 0
+
+    def shutdown(self) -> None:
+        proc, self.proc = self.proc, None
+        if proc is None:
+            return
+        try:
+            if proc.stdin:
+                proc.stdin.close()
+            proc.wait(timeout=2)
+        except Exception:
+            proc.kill()
+            proc.wait()
+
+    def plan(self, snapshot: Dict[str, str], graph: ImportGraph) -> Tuple[Optional[str], List[str]]:
+        """(reason to start a fresh template or None, modules to purge) for moving to `snapshot`."""
+        if not self.alive():
+            return "started", []
+        if self.runs >= MAX_RUNS:
+            return f"recycled after {self.runs} runs", []
+        changed = sorted(rel for rel in set(snapshot) | set(self.snapshot)
+                         if snapshot.get(rel) != self.snapshot.get(rel))
+        for rel in changed:
+            if rel.rsplit("/", 1)[-1] in CONFIG_FILES:
+                return f"config changed: {rel}", []
+            if rel not in snapshot:
+                return f"module removed: {rel}", []
+        changed = [rel for rel in changed if rel.endswith(".py")]  # test data is re-read by every run
+        stale = set(changed) | set(graph.dependents(changed))
+        return None, sorted(name for rel in stale for name in module_names(rel))
+
+    def run(self, modules: List[str], timeout: float, snapshot: Dict[str, str], graph: ImportGraph,
+            priority: Optional[Dict[str, Any]] = None) -> Tuple[ProcResult, List[Dict[str, Any]], Dict[str, Any]]:
+        """Run test `modules` (dotted names) in a fork of the template; returns (result, records, info)."""
+        t0 = time.monotonic()
+        with self._lock:
+            reason, purge = self.plan(snapshot, graph)
+            for attempt in range(2):
+                if reason is not None:
+                    self.shutdown()
+                    self.start(snapshot)
+                    purge = []
+                assert self.chan is not None
+                info: Dict[str, Any] = {"fresh": reason is not None, "reason": reason or "reused",
+                                        "purged": len(purge), "run": self.runs + 1}
+                td = tempfile.mkdtemp(prefix="resident-")
+                paths = {k: os.path.join(td, k) for k in ("out", "err", "report")}
+                try:
+                    self.chan.send({"purge": purge, "modules": modules, "priority": priority or {},
+                                    "rlimits": default_rlimits(), **paths})
+                    started = self.chan.recv(time.monotonic() + STARTUP_TIMEOUT + len(modules))
+                except PoolError:
+                    shutil.rmtree(td, ignore_errors=True)
+                    self.shutdown()
+                    raise
+                if started and "stale" in started and attempt == 0:
+                    shutil.rmtree(td, ignore_errors=True)
+                    reason = f"stale module: {', '.join(started['stale'])}"
+                    continue
+                break
+            if not started or "pid" not in started:
+                shutil.rmtree(td, ignore_errors=True)
+                self.shutdown()
+                raise PoolError("test worker did not start")
+            try:
+                self.snapshot = dict(snapshot)
+                self.runs += 1
+                done = self.chan.recv(time.monotonic() + timeout)
+                timed_out = done is None
+                if timed_out:
+                    try:
+                        os.killpg(started["pid"], signal.SIGKILL)
+                    except OSError:
+                        pass
+                    done = self.chan.recv(time.monotonic() + STARTUP_TIMEOUT) or {}  # the template reaps it
+                out, err = (_read(paths[k]) for k in ("out", "err"))
+                try:
+                    records = [] if timed_out else json.loads(Path(paths["report"]).read_text(encoding="utf-8"))["tests"]
+                except (OSError, ValueError, KeyError):
+                    records = []  # the child died before writing its report
+            finally:
+                shutil.rmtree(td, ignore_errors=True)
+            res = ProcResult(
+                None if timed_out else int(done["rc"]), out, err, timed_out=timed_out,
+                stdout_bytes=len(out.encode("utf-8")), stderr_bytes=len(err.encode("utf-8")),
+                duration=time.monotonic() - t0,
+                user_s=done.get("user_s"), sys_s=done.get("sys_s"), max_rss_kb=done.get("max_rss_kb"),
+            )
+            return res, records, info
+
+
+def _read(path: str) -> str:
+    try:
+        with open(path, "rb") as f:
+            return f.read().decode("utf-8", errors="replace")
+    except OSError:
+        return ""
+
+
+_RESIDENT: Optional[ResidentTests] = None
+_RESIDENT_LOCK = threading.Lock()
+
+
+def get_resident() -> ResidentTests:
+    global _RESIDENT
+    with _RESIDENT_LOCK:
+        if _RESIDENT is None:
+            _RESIDENT = ResidentTests()
+        return _RESIDENT
+
+
+@atexit.register
+def shutdown_all() -> None:
+    with _RESIDENT_LOCK:
+        if _RESIDENT is not None:
+            _RESIDENT.shutdown()
+
+
+def run_tests(files: List[str], timeout: float, snapshot: Dict[str, str], graph: ImportGraph,
+              history: Optional[TestHistory] = None) -> Tuple[List[Shard], ProcResult, Dict[str, Any]]:
+    """Run test `files` in the resident template; same (shards, result) shape as shard.run_shards plus info.
+
+    Raises PoolError/OSError when the template cannot be used; callers fall back to fresh processes.
+    """
+    history = history if history is not None else TestHistory()
+    files = sorted(files, key=history.rank)
+    res, records, info = get_resident().run([module_name(f) for f in files], timeout, snapshot, graph,
+                                            history.priorities(files))
+    record_metrics("tests", {"argv0": "resident", "returncode": res.returncode, "timed_out": res.timed_out,
+                             "fresh": info["fresh"], **res.usage()})
+    shard = Shard(files, sum(history.estimate(f) for f in files), res)
+    if records:
+        lookup = test_file_lookup(files)
+        for rec in records:
+            rec["file"] = lookup(rec["id"]) or (files[0] if len(files) == 1 else None)
+        shard.results = records
+        history.update(records, files)
+    return [shard], res, info
+
+
+# -- template process -----------------------------------------------------------
+
+def _warm(modules: List[str]) -> None:
+    for name in modules:
+        try:
+            importlib.import_module(name)
+        except BaseException:
+            continue  # the child imports it again and reports the error
+
+
+def _child(req: Dict[str, Any]) -> None:
+    import unittest
+
+    rc = 1
+    try:
+        os.setpgid(0, 0)  # a timeout kills the tests' own subprocesses too
+        null = os.open(os.devnull, os.O_RDONLY)
+        os.dup2(null, 0)
+        os.close(null)
+        redirect_output(req["out"], req["err"])
+        sys.stdin = open(0, closefd=False)
+        apply_rlimits(req.get("rlimits") or {})
+        suite = unittest.defaultTestLoader.loadTestsFromNames(req["modules"])
+        if req.get("priority"):
+            suite = prioritize(flatten(suite), req["priority"])
+        result = unittest.TextTestRunner(verbosity=2, resultclass=RecordingResult).run(suite)
+        with open(req["report"], "w", encoding="utf-8") as f:
+            json.dump({"tests": result.records}, f)
+        rc = 0 if result.wasSuccessful() else 1
+    except BaseException:
+        import traceback
+
+        traceback.print_exc()
+    finally:
+        try:
+            sys.stdout.flush()
+            sys.stderr.flush()
+        finally:
+            os._exit(rc)
+
+
+def _purge(names: set) -> None:
+    for name in [n for n in sys.modules if n in names]:
+        mod = sys.modules.pop(name)
+        parent, _, attr = name.rpartition(".")
+        # `from pkg import mod` would otherwise keep returning the old module
+        if parent in sys.modules and getattr(sys.modules[parent], attr, None) is mod:
+            delattr(sys.modules[parent], attr)
+
+
+def _workspace_modules(root: str) -> Dict[str, Tuple[int, int]]:
+    """{module name: (mtime_ns, size) of its file} for loaded modules under `root`."""
+    found: Dict[str, Tuple[int, int]] = {}
+    for name, mod in list(sys.modules.items()):
+        path = getattr(mod, "__file__", None)
+        if not path or not path.startswith(root):
+            continue
+        try:
+            st = os.stat(path)
+        except OSError:
+            found[name] = (-1, -1)
+            continue
+        found[name] = (st.st_mtime_ns, st.st_size)
+    return found
+
+
+def serve() -> None:
+    # like `python3 -m unittest`: import from the workspace root, not from tools/testing
+    root = os.getcwd()
+    sys.path[0] = root
+    out = os.fdopen(os.dup(1), "w")
+    null = os.open(os.devnull, os.O_WRONLY)
+    os.dup2(null, 1)
+    os.close(null)
+    import unittest.mock  # noqa: F401  (warm for the children)
+
+    seen: Dict[str, Tuple[int, int]] = {}
+    out.write(json.dumps({"ready": True}) + "\n")
+    out.flush()
+    for line in sys.stdin:
+        req = json.loads(line)
+        _purge(set(req.get("purge") or ()))
+        now = _workspace_modules(root + os.sep)
+        stale = sorted(n for n, key in now.items() if n in seen and seen[n] != key)
+        if stale:
+            # changed behind the import graph's back (e.g. a dynamic import): only a fresh template is safe
+            out.write(json.dumps({"stale": stale[:5]}) + "\n")
+            out.flush()
+            continue
+        importlib.invalidate_caches()
+        _warm(req["modules"])
+        seen = _workspace_modules(root + os.sep)
+        pid = os.fork()
+        if pid == 0:
+            out.close()
+            _child(req)
+        out.write(json.dumps({"pid": pid}) + "\n")
+        out.flush()
+        _, status, ru = os.wait4(pid, 0)
+        out.write(json.dumps({"rc": os.waitstatus_to_exitcode(status), **rusage_dict(ru)}) + "\n")
+        out.flush()
+
+
+if __name__ == "__main__":
+    if len(sys.argv) == 2 and sys.argv[1] == "--serve":
+        serve()
@@ -0,0 +1,146 @@
+"""unittest entry point for one test shard: `python tools/testing/runner.py --report OUT.json MODULE...`.
+
+Behaves like `python -m unittest -v MODULE...` (same output, exit status 0
+when every test passed) and also writes one record per test to OUT.json:
+id, status (passed|failed|error|skipped), seconds and, for failures, the
+end of the traceback. With `--priority P.json` ({test id: sort key}) tests
+run in key order; a module's and a class's tests stay together so module
+and class fixtures run once. Stdlib only: it runs in the child process
+before anything from the project is imported.
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import re
+import sys
+import time
+import unittest
+from typing import Any, Dict, List
+
+EXCERPT_LINES = 15
+EXCERPT_CHARS = 1200
+FAILED_IMPORT = "unittest.loader._FailedTest."
+FIXTURE_RE = re.compile(r"^(\w+) \((.+)\)$")
+
+
+def excerpt(text: str) -> str:
+    """The last lines of a traceback, where the assertion or exception is."""
+    tail = "\n".join(text.rstrip().splitlines()[-EXCERPT_LINES:])
+    return tail if len(tail) <= EXCERPT_CHARS else "…" + tail[-EXCERPT_CHARS:]
+
+
+def test_id(test: unittest.TestCase) -> str:
+    tid = test.id()
+    # a module that failed to import is reported as unittest.loader._FailedTest.<module>
+    if tid.startswith(FAILED_IMPORT):
+        return tid[len(FAILED_IMPORT):]
+    # fixture errors: "setUpClass (tests.test_x.T)" -> "tests.test_x.T.setUpClass"
+    m = FIXTURE_RE.match(tid)
+    return f"{m.group(2)}.{m.group(1)}" if m else tid
+
+
+class RecordingResult(unittest.TextTestResult):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.records: List[Dict[str, Any]] = []
+        self._t0 = 0.0
+        self._current: Dict[str, Any] = {}
+
+    def startTest(self, test):
+        self._t0 = time.perf_counter()
+        self._current = {"id": test_id(test), "status": "passed"}
+        super().startTest(test)
+
+    def stopTest(self, test):
+        super().stopTest(test)
+        self._current["time"] = round(time.perf_counter() - self._t0, 4)
+        self.records.append(self._current)
+
+    def _mark(self, test, status: str, message: str = "") -> None:
+        rec = self._current if self._current.get("id") == test_id(test) else {"id": test_id(test), "time": 0.0}
+        if rec is not self._current:
+            self.records.append(rec)  # class/module fixture errors arrive outside start/stopTest
+        if rec.get("status") in {"failed", "error"} and status == "skipped":
+            return
+        rec["status"] = status
+        if message:
+            rec["message"] = excerpt(message)
+
+    def addFailure(self, test, err):
+        super().addFailure(test, err)
+        self._mark(test, "failed", self.failures[-1][1])
+
+    def addError(self, test, err):
+        super().addError(test, err)
+        self._mark(test, "error", self.errors[-1][1])
+
+    def addSubTest(self, test, subtest, err):
+        super().addSubTest(test, subtest, err)
+        if err is not None:
+            failed = issubclass(err[0], test.failureException)
+            text = (self.failures if failed else self.errors)[-1][1]
+            self._mark(test, "failed" if failed else "error", f"{subtest.id()}\n{text}")
+
+    def addSkip(self, test, reason):
+        super().addSkip(test, reason)
+        self._mark(test, "skipped", reason)
+
+    def addUnexpectedSuccess(self, test):
+        super().addUnexpectedSuccess(test)
+        self._mark(test, "failed", "unexpected success")
+
+
+def flatten(suite: unittest.TestSuite) -> List[unittest.TestCase]:
+    out: List[unittest.TestCase] = []
+    for item in suite:
+        if isinstance(item, unittest.TestSuite):
+            out.extend(flatten(item))
+        else:
+            out.append(item)
+    return out
+
+
+def prioritize(tests: List[unittest.TestCase], priority: Dict[str, Any]) -> unittest.TestSuite:
+    """Order tests by `priority` keys, keeping each module's and each class's tests contiguous."""
+    keys = {id(t): priority.get(test_id(t), [1, 0.0]) for t in tests}
+    classes: Dict[Any, List[unittest.TestCase]] = {}
+    for t in tests:
+        classes.setdefault(type(t), []).append(t)
+    modules: Dict[str, List[List[unittest.TestCase]]] = {}
+    for group in classes.values():
+        group.sort(key=lambda t: keys[id(t)])
+        modules.setdefault(type(group[0]).__module__, []).append(group)
+    for groups in modules.values():
+        groups.sort(key=lambda g: keys[id(g[0])])
+    ordered = sorted(modules.values(), key=lambda gs: keys[id(gs[0][0])])
+    return unittest.TestSuite(t for groups in ordered for group in groups for t in group)
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(prog="runner.py")
+    ap.add_argument("--report", required=True)
+    ap.add_argument("--priority")
+    ap.add_argument("modules", nargs="+")
+    args = ap.parse_args(argv)
+    # like `python -m unittest`: import from the working directory, not from this file's directory
+    sys.path[0] = os.getcwd()
+    t0 = time.perf_counter()
+    suite = unittest.defaultTestLoader.loadTestsFromNames(args.modules)
+    if args.priority:
+        try:
+            with open(args.priority, encoding="utf-8") as f:
+                suite = prioritize(flatten(suite), json.load(f))
+        except (OSError, ValueError):
+            pass  # default order
+    load_s = time.perf_counter() - t0
+    runner = unittest.TextTestRunner(verbosity=2, resultclass=RecordingResult)
+    result = runner.run(suite)
+    with open(args.report, "w", encoding="utf-8") as f:
+        json.dump({"tests": result.records, "load_s": round(load_s, 4)}, f)
+    return 0 if result.wasSuccessful() else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,257 @@
+from __future__ import annotations
+
+import heapq
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+import xml.etree.ElementTree as ET
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from ..index.imports import module_name
+from ..index.workspace import ROOT_DIR
+from ..proc_runner import ProcResult, run_bounded
+from .affected import STATE_DIR, test_file_lookup
+from .runner import excerpt
+
+RUNNER = Path(__file__).resolve().with_name("runner.py")
+HISTORY_PATH = STATE_DIR / "history.json"
+DEFAULT_COST = 1.0  # seconds assumed for a test file that was never timed
+SMOOTHING = 0.5  # weight of the newest measurement in the running average
+FAILING = ("failed", "error")
+# run order: tests that failed last time, then tests never run, then the rest (fastest first)
+RANK_FAILED, RANK_NEW, RANK_PASSED = 0, 1, 2
+
+
+def worker_count(n_tests: int) -> int:
+    """Shards to use: GPT_CODE_TEST_WORKERS, else the usable CPU cores; never more than test files."""
+    env = os.environ.get("GPT_CODE_TEST_WORKERS", "").strip()
+    try:
+        n = int(env) if env else len(os.sched_getaffinity(0))
+    except (ValueError, AttributeError):
+        n = os.cpu_count() or 1
+    return max(1, min(n, n_tests))
+
+
+class TestHistory:
+    """Per-test durations (running average) and outcomes, persisted next to the green baseline.
+
+    Shards are balanced with the per-file totals (`estimate`); `rank` and
+    `priorities` put tests that failed last time first, then new tests,
+    then the rest fastest first, so a failure shows up early in the run.
+    """
+
+    def __init__(self, path: Path = HISTORY_PATH, root: Path = ROOT_DIR):
+        self.path = Path(path)
+        self.root = Path(root)
+        self.files: Dict[str, float] = {}  # test file -> seconds
+        self.tests: Dict[str, Dict[str, Any]] = {}  # test id -> {file, time, status, runs, fails}
+        try:
+            data = json.loads(self.path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return
+        if data.get("root") == str(self.root):
+            self.files = data.get("files") or {}
+            self.tests = data.get("tests") or {}
+
+    def estimate(self, rel: str) -> float:
+        if rel in self.files:
+            return self.files[rel]
+        known = list(self.files.values())
+        return sum(known) / len(known) if known else DEFAULT_COST
+
+    def rank(self, rel: str) -> Tuple[int, float]:
+        if rel not in self.files:
+            return RANK_NEW, self.estimate(rel)
+        failed = any(t["file"] == rel and t["status"] in FAILING for t in self.tests.values())
+        return (RANK_FAILED if failed else RANK_PASSED), self.files[rel]
+
+    def priorities(self, files: List[str]) -> Dict[str, List[float]]:
+        """{test id: [rank, seconds]} for the known tests of `files` (the runner's --priority input)."""
+        wanted = set(files)
+        return {
+            tid: [RANK_FAILED if t["status"] in FAILING else RANK_PASSED, t["time"]]
+            for tid, t in self.tests.items() if t["file"] in wanted
+        }
+
+    def update(self, records: List[Dict[str, Any]], files: List[str]) -> None:
+        """Fold in the results of a complete run of `files`; their tests not in `records` are forgotten."""
+        if not files:
+            return
+        ran = set(files)
+        old = {tid: t for tid, t in self.tests.items() if t["file"] in ran}
+        self.tests = {tid: t for tid, t in self.tests.items() if tid not in old}
+        totals: Dict[str, float] = {}
+        for rec in records:
+            rel = rec.get("file")
+            if rel not in ran:
+                continue
+            prev = old.get(rec["id"], {})
+            secs = float(rec.get("time") or 0)
+            totals[rel] = totals.get(rel, 0.0) + secs
+            self.tests[rec["id"]] = {
+                "file": rel,
+                "time": round(secs if "time" not in prev else SMOOTHING * secs + (1 - SMOOTHING) * prev["time"], 4),
+                "status": rec["status"],
+                "runs": prev.get("runs", 0) + 1,
+                "fails": prev.get("fails", 0) + (rec["status"] in FAILING),
+            }
+        for rel, secs in totals.items():
+            prev_s = self.files.get(rel)
+            self.files[rel] = round(secs if prev_s is None else SMOOTHING * secs + (1 - SMOOTHING) * prev_s, 4)
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            with tempfile.NamedTemporaryFile("w", encoding="utf-8", dir=str(self.path.parent), delete=False) as tf:
+                json.dump({"root": str(self.root), "files": self.files, "tests": self.tests}, tf, separators=(",", ":"))
+                tmp_name = tf.name
+            os.replace(tmp_name, str(self.path))
+        except OSError:
+            pass  # history is best-effort; shards just balance and order worse next time
+
+
+def plan_shards(tests: List[str], cost: Callable[[str], float], n: int) -> List[List[str]]:
+    """Split `tests` into at most `n` shards of similar total cost (longest first onto the lightest shard)."""
+    heap: List[Tuple[float, int]] = [(0.0, i) for i in range(max(1, n))]
+    shards: List[List[str]] = [[] for _ in heap]
+    for rel in sorted(tests, key=lambda t: (-cost(t), t)):
+        load, i = heapq.heappop(heap)
+        shards[i].append(rel)
+        heapq.heappush(heap, (load + cost(rel), i))
+    return [sorted(s) for s in shards if s]
+
+
+@dataclass
+class Shard:
+    files: List[str]
+    estimate_s: float
+    result: Optional[ProcResult] = None
+    results: List[Dict[str, Any]] = field(default_factory=list)  # one record per test, see read_report
+
+    def info(self) -> Dict[str, object]:
+        res = self.result
+        return {
+            "files": len(self.files),
+            "estimate_s": round(self.estimate_s, 2),
+            "wall_s": round(res.duration, 2) if res else None,
+            "returncode": res.returncode if res else None,
+            "failed": sum(r["status"] in FAILING for r in self.results),
+        }
+
+
+def shard_command(framework: str, files: List[str], report: Path, priority: Optional[Path] = None) -> List[str]:
+    if framework == "pytest":
+        # the cache plugin's files would be written by every shard at once
+        return ["pytest", "-q", "-p", "no:cacheprovider", f"--junitxml={report}", *files]
+    extra = ["--priority", str(priority)] if priority is not None else []
+    return [sys.executable, str(RUNNER), "--report", str(report), *extra, *(module_name(f) for f in files)]
+
+
+def read_report(framework: str, report: Path, files: List[str]) -> List[Dict[str, Any]]:
+    """Per-test records {id, file, status, time, message?} from a shard's JUnit XML (pytest) or runner.py JSON."""
+    try:
+        if framework == "pytest":
+            records = []
+            for case in ET.parse(report).getroot().iter("testcase"):
+                cls, name = case.get("classname", ""), case.get("name", "")
+                rec: Dict[str, Any] = {"id": f"{cls}.{name}" if cls else name, "status": "passed",
+                                       "time": round(float(case.get("time") or 0), 4)}
+                for tag, status in (("failure", "failed"), ("error", "error"), ("skipped", "skipped")):
+                    el = case.find(tag)
+                    if el is not None:
+                        rec["status"] = status
+                        text = el.text or el.get("message") or ""
+                        if text:
+                            rec["message"] = excerpt(text)
+                        break
+                records.append(rec)
+        else:
+            records = json.loads(report.read_text(encoding="utf-8")).get("tests", [])
+    except (OSError, ValueError, ET.ParseError):
+        return []
+    lookup = test_file_lookup(files)
+    for rec in records:
+        rec["file"] = lookup(rec["id"]) or (files[0] if len(files) == 1 else None)
+    return records
+
+
+def merge_results(shards: List[Shard], wall: float) -> ProcResult:
+    """One ProcResult for all shards; each shard's output is introduced by a `[shard i/n]` line."""
+    results = [s.result for s in shards if s.result is not None]
+    if len(shards) == 1 and results:
+        return results[0]
+    outs: List[str] = []
+    errs: List[str] = []
+    for i, shard in enumerate(shards, 1):
+        res = shard.result
+        if res is None:
+            continue
+        head = f"[shard {i}/{len(shards)}] {' '.join(shard.files)}\n"
+        if res.stdout:
+            outs.append(head + res.stdout)
+        if res.stderr:
+            errs.append(head + res.stderr)
+    failed = [r.returncode for r in results if r.returncode]
+    if failed:
+        rc: Optional[int] = failed[0]
+    elif any(r.returncode is None for r in results):
+        rc = None
+    else:
+        rc = 0
+    timed = [r for r in results if r.user_s is not None]
+    return ProcResult(
+        rc, "\n".join(outs), "\n".join(errs),
+        timed_out=any(r.timed_out for r in results),
+        output_limited=any(r.output_limited for r in results),
+        truncated=any(r.truncated for r in results),
+        stdout_bytes=sum(r.stdout_bytes for r in results),
+        stderr_bytes=sum(r.stderr_bytes for r in results),
+        duration=wall,
+        user_s=round(sum(r.user_s or 0 for r in timed), 3) if timed else None,
+        sys_s=round(sum(r.sys_s or 0 for r in timed), 3) if timed else None,
+        max_rss_kb=max((r.max_rss_kb or 0 for r in timed), default=0) if timed else None,
+    )
+
+
+def run_shards(framework: str, tests: List[str], timeout: float, workers: Optional[int] = None,
+               history: Optional[TestHistory] = None, cwd: Path = ROOT_DIR) -> Tuple[List[Shard], ProcResult]:
+    """Run `tests` (workspace-relative test files) in parallel shards balanced by past durations.
+
+    Every shard is its own process (own interpreter, own process group) with
+    the full `timeout`; the shards run concurrently, so the wall time is that
+    of the slowest shard. Within a shard, files (and for unittest, tests) run
+    in history order. Results of shards that finished feed the history.
+    """
+    history = history if history is not None else TestHistory()
+    n = workers if workers is not None else worker_count(len(tests))
+    shards = [Shard(sorted(files, key=history.rank), sum(history.estimate(f) for f in files))
+              for files in plan_shards(tests, history.estimate, n)]
+    STATE_DIR.mkdir(parents=True, exist_ok=True)
+    tmp = Path(tempfile.mkdtemp(prefix="shards-", dir=str(STATE_DIR)))
+    priority = None
+    if framework != "pytest":
+        priority = tmp / "priority.json"
+        priority.write_text(json.dumps(history.priorities(tests)), encoding="utf-8")
+
+    def run_one(i: int) -> None:
+        shard = shards[i]
+        report = tmp / f"shard-{i}.{'xml' if framework == 'pytest' else 'json'}"
+        shard.result = run_bounded(shard_command(framework, shard.files, report, priority), cwd=str(cwd),
+                                   timeout=timeout, limit=None, tool="tests")
+        if not shard.result.timed_out:
+            shard.results = read_report(framework, report, shard.files)
+
+    t0 = time.perf_counter()
+    try:
+        with ThreadPoolExecutor(max_workers=max(1, len(shards))) as ex:
+            list(ex.map(run_one, range(len(shards))))
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+    wall = time.perf_counter() - t0
+    done = [s for s in shards if s.results]
+    history.update([r for s in done for r in s.results], [f for s in done for f in s.files])
+    return shards, merge_results(shards, wall)
@@ -1,75 +1,207 @@
 from __future__ import annotations
 
+import hashlib
 import shutil
-import subprocess
+import sys
 from pathlib import Path
 import json
 import re
+from typing import Any, Dict, List, Optional, Tuple
+
+from .action_cache import enabled as action_cache_enabled, get_cache
+from .index.imports import module_name
+from .proc_runner import BoundedCapture, run_bounded, split_budget
+from .testing.affected import AffectedTests, Selection, coverage_enabled
+from .pyexec_pool import PoolError
+from .testing.resident import enabled as resident_enabled, run_tests as run_resident
+from .testing.shard import Shard, run_shards
 
 ROOT_DIR = Path(__file__).resolve().parents[1]
 
 
-def _summarize(framework: str, rc: int, out: str, err: str) -> str:
-    data = {
+MAX_FAILURES = 20  # failure records returned in full; the rest are only counted
+SLOWEST = 5
+RAW_LIMIT = 3000  # characters of raw stdout/stderr kept when per-test results exist
+PYTEST_COUNT_RE = re.compile(r"(\d+) (passed|failed|skipped|errors?|xfailed|xpassed)\b")
+PYTEST_TOTAL_RE = re.compile(r"^[=\s]*(\d+ \w+(?:, \d+ \w+)*) in ([0-9.]+)s")
+
+
+def _clip(text: str, limit: int) -> str:
+    cap = BoundedCapture(**split_budget(limit))
+    cap.feed(text)
+    return cap.text()
+
+
+def summarize(framework: str, rc: Optional[int], out: str, err: str,
+              results: Optional[List[Dict[str, Any]]] = None) -> str:
+    """Tests.Run JSON: counts in "summary", plus per-test "failures" and "slowest" when `results` are given.
+
+    `results` are per-test records {id, file, status, time, message?} (see
+    tools/testing/shard.py). Without them the counts are parsed from the
+    runner's final lines and the raw output is the only detail.
+    """
+    data: Dict[str, Any] = {
         "framework": framework,
         "returncode": rc,
         "summary": {},
         "stdout": out,
         "stderr": err,
     }
-    text = out + "\n" + err
-    # naive parses
-    if framework == "pytest":
-        m = re.findall(r"(\d+) passed| (\d+) failed| (\d+) skipped| (\d+) error", text)
-        # not robust; keep raw output too
+    if results:
+        counts = {"passed": 0, "failed": 0, "error": 0, "skipped": 0}
+        for r in results:
+            counts[r["status"]] = counts.get(r["status"], 0) + 1
+        data["summary"] = {
+            "collected": len(results),
+            "passed": counts["passed"],
+            "failed": counts["failed"],
+            "errors": counts["error"],
+            "skipped": counts["skipped"],
+            "duration_sec": round(sum(r.get("time") or 0 for r in results), 3),
+        }
+        failing = [r for r in results if r["status"] in ("failed", "error")]
+        data["failures"] = [{k: r[k] for k in ("id", "file", "status", "time", "message") if k in r}
+                            for r in failing[:MAX_FAILURES]]
+        data["slowest"] = [{"id": r["id"], "time": r["time"]}
+                           for r in sorted(results, key=lambda r: -(r.get("time") or 0))[:SLOWEST]]
+        # the records carry what matters; keep only the ends of the raw log
+        data["stdout"] = _clip(out, RAW_LIMIT)
+        data["stderr"] = _clip(err, RAW_LIMIT)
+    elif framework == "pytest":
+        # "4 failed, 86 passed in 6.11s" (one line per shard)
+        collected = 0
+        durations = []
+        for line in (out + "\n" + err).splitlines():
+            m = PYTEST_TOTAL_RE.match(line)
+            if not m:
+                continue
+            durations.append(float(m.group(2)))
+            for n, word in PYTEST_COUNT_RE.findall(m.group(1)):
+                key = "errors" if word.startswith("error") else word
+                data["summary"][key] = data["summary"].get(key, 0) + int(n)
+                collected += int(n)
+        if durations:
+            data["summary"]["collected"] = collected
+            data["summary"]["duration_sec"] = max(durations)
     else:
-        m = re.search(r"Ran (\d+) tests? in ([0-9\.]+)s", text)
-        if m:
-            data["summary"]["collected"] = int(m.group(1))
-            data["summary"]["duration_sec"] = float(m.group(2))
-        data["summary"]["ok"] = (rc == 0)
+        # one "Ran ..." line per shard; the shards ran concurrently
+        runs = re.findall(r"Ran (\d+) tests? in ([0-9\.]+)s", out + "\n" + err)
+        if runs:
+            data["summary"]["collected"] = sum(int(n) for n, _ in runs)
+            data["summary"]["duration_sec"] = max(float(d) for _, d in runs)
+    data["summary"]["ok"] = (rc == 0)
     return json.dumps(data, ensure_ascii=False)
 
 
-def run(kind: str = "auto", timeout: int = 60) -> str:
+def run(kind: str = "auto", timeout: int = 60, cache: bool = True, mode: str = "affected",
+        resident: Optional[bool] = None) -> str:
     """Run project tests and return combined output.
 
     - kind="pytest" forces pytest; kind="unittest" forces unittest; kind="auto" tries pytest then unittest.
+    - mode="affected" runs only the test modules affected by files changed since the last green run
+      (see tools/testing/affected.py); mode="full" runs everything. The "selection" key reports what
+      was run and what was skipped.
+    - Affected unittest runs go to a warm resident template (tools/testing/resident.py) that reloads only
+      changed modules; resident=False (or GPT_CODE_TEST_RESIDENT=0) uses fresh processes.
+    - Results are reused from the persistent action cache while the selection snapshot (.py files, config
+      and test data) is unchanged; the key also holds kind, timeout, mode and the selected tests. Timed-out
+      runs are not stored.
     """
-    def _run(cmd):
+    if mode not in {"affected", "full"}:
+        return json.dumps({"error": f"unknown mode: {mode}"})
+    tracker = AffectedTests()
+    selection = tracker.select(full=(mode == "full"))
+    if not (cache and action_cache_enabled()):
+        return _run_tests(kind, timeout, tracker, selection, resident)
+    ac = get_cache()
+    params = {"kind": kind, "pytest": shutil.which("pytest"), "timeout": timeout, "mode": selection.mode,
+              "tests": selection.selected}
+    snapshot = json.dumps(selection.snapshot, sort_keys=True, separators=(",", ":"))
+    key = ac.key("tests.run", params, hashlib.sha256(snapshot.encode("utf-8")).hexdigest())
+    data = ac.get(key)
+    if data is None:
+        res = _run_tests(kind, timeout, tracker, selection, resident)
         try:
-            proc = subprocess.run(cmd, cwd=str(ROOT_DIR), capture_output=True, text=True, timeout=timeout)
-        except subprocess.TimeoutExpired:
-            return f"[tests] timeout after {timeout}s"
-        out = proc.stdout or ""
-        err = proc.stderr or ""
-        return f"[tests] returncode={proc.returncode}\n" + ("[stdout]\n" + out if out else "") + ("[stderr]\n" + err if err else "")
+            data = json.loads(res)
+        except json.JSONDecodeError:
+            return res
+        if not data.get("timed_out"):
+            # resource numbers describe this run, not a replay
+            ac.put(key, "tests.run", {k: v for k, v in data.items() if k != "resources"})
+        data["cache"] = ac.stats(hit=False)
+    else:
+        data["cache"] = ac.stats(hit=True)
+    return json.dumps(data, ensure_ascii=False)
+
 
+def command_for(kind: str, targets: Optional[List[str]] = None) -> Tuple[str, List[str]]:
+    """(framework, argv) for `kind` ("auto" prefers pytest when installed).
+
+    `targets` are workspace-relative test files; None runs the whole suite.
+    """
     if kind == "pytest" or (kind == "auto" and shutil.which("pytest")):
-        res = _run(["pytest", "-q"])
-        # parse header: first line includes returncode
-        lines = res.splitlines()
-        rc = 0
-        if lines and lines[0].startswith('[tests] returncode='):
+        return "pytest", ["pytest", "-q", *(targets or [])]
+    if targets:
+        return "unittest", ["python3", "-m", "unittest", "-v", *(module_name(t) for t in targets)]
+    return "unittest", ["python3", "-m", "unittest", "discover", "-s", "tests", "-p", "test*.py", "-v"]  # verbose
+
+
+def _run_tests(kind: str, timeout: int, tracker: AffectedTests, selection: Selection,
+               resident: Optional[bool] = None) -> str:
+    if selection.mode == "affected" and not selection.selected:
+        framework, _ = command_for(kind)
+        data = json.loads(summarize(framework, 0, "[tests] no tests affected by the changes\n", ""))
+        data["selection"] = selection.report()
+        return json.dumps(data, ensure_ascii=False)
+    rcfile = None
+    shards: List[Shard] = []
+    resident_info: Optional[Dict[str, Any]] = None
+    if selection.mode == "full" and coverage_enabled():
+        # coverage contexts need every test in one process, so no sharding here
+        framework, cmd = command_for(kind)
+        cmd, rcfile = tracker.coverage_command(cmd)
+        res = run_bounded(cmd, cwd=str(ROOT_DIR), timeout=timeout, limit=None, tool="tests")
+    else:
+        framework, _ = command_for(kind)
+        use_resident = resident_enabled() if resident is None else resident
+        if framework == "unittest" and selection.mode == "affected" and use_resident:
             try:
-                rc = int(lines[0].split('=')[1])
-            except Exception:
-                rc = 1
-        out = res.split('[stdout]\n',1)[1] if '[stdout]\n' in res else ''
-        err = res.split('[stderr]\n',1)[1] if '[stderr]\n' in res else ''
-        return _summarize("pytest", rc, out, err)
-    # fallback to unittest
-    res = _run(["python3", "-m", "unittest", "discover", "-s", "tests", "-p", "test*.py", "-v"])  # verbose
-    lines = res.splitlines()
-    rc = 0
-    if lines and lines[0].startswith('[tests] returncode='):
-        try:
-            rc = int(lines[0].split('=')[1])
-        except Exception:
-            rc = 1
-    out = res.split('[stdout]\n',1)[1] if '[stdout]\n' in res else ''
-    err = res.split('[stderr]\n',1)[1] if '[stderr]\n' in res else ''
-    return _summarize("unittest", rc, out, err)
+                shards, res, resident_info = run_resident(selection.selected, timeout, selection.snapshot, tracker.graph)
+            except (OSError, PoolError) as e:
+                resident_info = {"error": f"{type(e).__name__}: {e}; ran in fresh processes"}
+        if not shards:
+            shards, res = run_shards(framework, selection.selected, timeout)
+    results = [r for shard in shards for r in shard.results]
+    data = json.loads(summarize(framework, res.returncode, res.stdout, res.stderr, results))
+    if results and not all(shard.results for shard in shards):
+        data["summary"]["partial"] = True  # a shard timed out or died before writing its report
+    if res.timed_out:
+        data["timed_out"] = True
+        data["stderr"] = (data["stderr"] + f"\n[tests] timeout after {timeout}s").lstrip("\n")
+    elif res.returncode == 0:
+        tracker.record_green(selection.snapshot)
+    if rcfile is not None and not res.timed_out:
+        data["coverage_map"] = _collect_coverage(tracker, rcfile, selection.selected, timeout)
+    data["selection"] = selection.report()
+    if len(shards) > 1:
+        data["shards"] = [shard.info() for shard in shards]
+    if resident_info is not None:
+        data["resident"] = resident_info
+    data["resources"] = res.usage()
+    return json.dumps(data, ensure_ascii=False)
+
+
+def _collect_coverage(tracker: AffectedTests, rcfile: Path, tests: List[str], timeout: int) -> str:
+    report = tracker.state_dir / "coverage.json"
+    cmd = [sys.executable, "-m", "coverage", "json", f"--rcfile={rcfile}", "--show-contexts", "-o", str(report)]
+    res = run_bounded(cmd, cwd=str(ROOT_DIR), timeout=timeout, limit=4000, tool="tests")
+    if res.timed_out or res.returncode != 0:
+        return f"not updated: coverage json returncode={res.returncode}"
+    try:
+        mapped = tracker.store_coverage(json.loads(report.read_text(encoding="utf-8")), tests)
+    except (OSError, ValueError) as e:
+        return f"not updated: {type(e).__name__}: {e}"
+    return f"updated ({mapped} files)"
 
 
 if __name__ == "__main__":